@@ -0,0 +1,45 @@
+"""Bundled static assets: the theme stylesheet.
+
+static/theme.css is read once per process and injected with `st.html` as a
+style-only element, which Streamlit places in the main document's event
+container (no iframe, no layout space). It is sent on every run, not once
+per session: at the end of a run the frontend drops every element, event
+container included, that the run did not emit, so skipping it would unstyle
+the page. An unchanged element keeps its DOM node, so the browser does not
+re-parse the stylesheet, and the resend is under 2 KB.
+
+No font files are bundled and nothing is fetched from the network: the
+stylesheet names Inter first, so a locally installed Inter is used, and
+everyone else gets the system font stack (system-ui, -apple-system,
+Segoe UI, Roboto, ...).
+"""
+import os
+import threading
+
+import streamlit as st
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+THEME_CSS_PATH = os.path.join(STATIC_DIR, "theme.css")
+
+_theme_css = None
+_theme_lock = threading.Lock()
+
+
+def theme_css():
+    """The theme stylesheet (read from disk once per process)."""
+    global _theme_css
+    with _theme_lock:
+        if _theme_css is None:
+            try:
+                with open(THEME_CSS_PATH, encoding="utf-8") as f:
+                    _theme_css = f.read()
+            except Exception:
+                _theme_css = ""
+        return _theme_css
+
+
+def inject_theme():
+    """Apply the theme to the page. Call once near the top of every run."""
+    css = theme_css()
+    if css:
+        st.html(f"<style>\n{css}\n</style>")
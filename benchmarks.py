@@ -0,0 +1,339 @@
+"""Benchmark suite for the grade, suggestion, parsing and persistence hot paths.
+
+    python benchmarks.py [--sizes 10,1000,100000,1000000] [--cases engine,cookie]
+                         [--output benchmark_results.json] [--compare old.json]
+
+Every case runs on synthetic courses generated from a fixed seed (about four
+components per course), at each size given in courses. A case is timed
+`--repeat` times, or fewer once its runs exceed `--budget` seconds, and the
+median and fastest run are recorded with a per-item throughput. Results are
+written as JSON together with the interpreter, library versions and git
+commit, so two files can be diffed with `--compare`.
+
+Cases:
+
+- engine:      grade_summary on the store's columns, a full DerivedCourseData
+               build and an incremental refresh after one course changed
+- suggestions: the Dashboard shortfall and allocate_deficit per objective
+- projection:  simulate_gpa with a +/-0.3 range on every grade, up to the
+               size limit below
+- parsing:     parse_breakdown_lines per course and parse_breakdowns in bulk
+- cookie:      encode_data_for_cookie / decode_data_from_cookie
+- json_import: the streaming JSON importer on an exported file
+- rerun:       full-script runs of each page through Streamlit's AppTest
+               (first run of a session and a rerun), up to the size limits
+               below; larger sizes are recorded as skipped
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from functools import cached_property
+
+import numpy as np
+
+from breakdown import MAX_GRADE, parse_breakdown_lines, parse_breakdowns, synthetic_breakdowns
+from course_store import CourseStore, DerivedCourseData
+from grade_engine import ALLOCATION_OBJECTIVES, PROJECTION_SAMPLES, allocate_deficit, grade_summary, simulate_gpa
+from persistence import decode_data_from_cookie, encode_data_for_cookie
+
+DEFAULT_SIZES = (10, 1_000, 100_000, 1_000_000)
+DEFAULT_REPEAT = 5
+DEFAULT_BUDGET = 10.0
+COMPONENTS_PER_COURSE = 4
+# Full-script runs stop at these sizes: AppTest polls the run's event list every
+# millisecond, so its own overhead grows with the widget count (Edit Courses
+# renders an editor per course).
+APPTEST_MAX_COURSES = 1_000
+APPTEST_PAGE_MAX_COURSES = {"Edit Courses": 100}
+# simulate_gpa draws scenarios x grades random values
+PROJECTION_MAX_COURSES = 10_000
+PAGES = ("Dashboard", "Edit Courses", "Deep Dive", "Cohort", "Settings")
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+def synthetic_store(n_courses, components_per_course=COMPONENTS_PER_COURSE, seed=0):
+    """A CourseStore with `n_courses` courses and on average `components_per_course` components each."""
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(0, 2 * components_per_course + 1, n_courses)
+    m = int(counts.sum())
+    data = {
+        "courses": {
+            "name": [f"Course {i}" for i in range(n_courses)],
+            "credits": rng.integers(1, 6, n_courses).tolist(),
+            "grade": np.round(rng.uniform(0.0, MAX_GRADE, n_courses), 2).tolist(),
+            "breakdown_raw": [""] * n_courses,
+        },
+        "components": {
+            "course": np.repeat(np.arange(n_courses), counts).tolist(),
+            "name": [f"Part {k}" for k in range(m)],
+            "weight": rng.integers(1, 41, m).astype(float).tolist(),
+            "grade": np.round(rng.uniform(0.0, MAX_GRADE, m), 2).tolist(),
+        },
+    }
+    return CourseStore.from_dict(data)
+
+
+class SyntheticData:
+    """Inputs for one size, each built on first use."""
+
+    def __init__(self, n_courses, seed=0):
+        self.n = n_courses
+        self.seed = seed
+
+    @cached_property
+    def store(self):
+        return synthetic_store(self.n, seed=self.seed)
+
+    @cached_property
+    def records(self):
+        return self.store.to_records()
+
+    @cached_property
+    def raws(self):
+        return synthetic_breakdowns(self.n * COMPONENTS_PER_COURSE, lines_per_course=COMPONENTS_PER_COURSE, seed=self.seed)
+
+    @cached_property
+    def cookie(self):
+        return encode_data_for_cookie({"courses": self.records})
+
+    @cached_property
+    def json_bytes(self):
+        from exporter import export_bytes
+        return export_bytes(self.store, "json").getvalue()
+
+    @property
+    def components(self):
+        return len(self.store.components["course"])
+
+
+def _time(fn, repeat, budget):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+        if sum(times) >= budget:
+            break
+    return times
+
+
+# Each case yields (name, fn, items): fn is timed, items is what throughput is
+# counted in. A skipped benchmark is yielded as (name, None, reason).
+
+def case_engine(data):
+    s = data.store
+    grades = np.asarray(s.courses["grade"], dtype=np.float64)
+    credits = np.asarray(s.courses["credits"], dtype=np.float64)
+    yield "grade_summary", lambda: grade_summary(grades, credits, *s.component_arrays()), data.components
+    yield "derived_full", lambda: DerivedCourseData().refresh(s).summary, data.n
+    derived = DerivedCourseData().refresh(s)
+
+    def one_change():
+        s.set_field(0, "grade", 4.0 - s.courses["grade"][0])
+        derived.refresh(s)
+
+    yield "derived_one_change", one_change, 1
+
+
+def case_suggestions(data):
+    s = data.store
+    summary = s.derived().summary
+    eff = summary["effective_grade"]
+    credits = np.asarray(s.courses["credits"], dtype=np.float64)
+    difficulty = np.random.default_rng(data.seed).uniform(0.5, 3.0, data.n)
+    # aim for a target that needs part of the available headroom, like a Dashboard shortfall
+    headroom = float((credits * np.clip(MAX_GRADE - eff, 0, None)).sum())
+    target = (summary["total_quality_points"] + 0.3 * headroom) / summary["total_credits"]
+
+    def shortfall(objective):
+        deficit = target * summary["total_credits"] - summary["total_quality_points"]
+        return allocate_deficit(eff, credits, deficit, objective=objective, difficulty=difficulty)
+
+    for objective in ALLOCATION_OBJECTIVES:
+        yield f"allocate_{objective}", lambda o=objective: shortfall(o), data.n
+
+
+def case_projection(data):
+    if data.n > PROJECTION_MAX_COURSES:
+        yield "simulate_gpa", None, f"projections are limited to {PROJECTION_MAX_COURSES:,} courses"
+        return
+    s = data.store
+    grades = np.asarray(s.courses["grade"], dtype=np.float64)
+    credits = np.asarray(s.courses["credits"], dtype=np.float64)
+    yield "simulate_gpa", lambda: simulate_gpa(grades, credits, *s.component_arrays(), 0.3, 0.3), PROJECTION_SAMPLES
+
+
+def case_parsing(data):
+    raws = data.raws
+    lines = data.n * COMPONENTS_PER_COURSE
+    yield "parse_breakdown_lines", lambda: [parse_breakdown_lines(r) for r in raws], lines
+    yield "parse_breakdowns_bulk", lambda: parse_breakdowns(raws), lines
+
+
+def case_cookie(data):
+    records = data.records
+    token = data.cookie
+    yield "cookie_encode", lambda: encode_data_for_cookie({"courses": records}), data.n
+    yield "cookie_decode", lambda: decode_data_from_cookie(token), data.n
+
+
+def case_json_import(data):
+    from course_import import import_courses
+    payload = data.json_bytes
+    yield "json_import", lambda: import_courses(io.BytesIO(payload)), data.n
+
+
+def case_rerun(data):
+    from streamlit.testing.v1 import AppTest
+    # bare-mode AppTest runs log "missing ScriptRunContext" on every run
+    logging.disable(logging.WARNING)
+    snapshot = data.store.to_dict()
+
+    def session(page):
+        at = AppTest.from_file(APP_PATH, default_timeout=600)
+        at.session_state["page"] = page
+        at.session_state["course_store"] = CourseStore.from_dict(snapshot)
+        return at
+
+    def first_run(page):
+        at = session(page)
+        at.run()
+        if at.exception:
+            raise RuntimeError(f"{page} raised: {at.exception[0].value}")
+
+    for page in PAGES:
+        slug = page.lower().replace(" ", "_")
+        limit = APPTEST_PAGE_MAX_COURSES.get(page, APPTEST_MAX_COURSES)
+        if data.n > limit:
+            reason = f"AppTest runs are limited to {limit:,} courses on this page"
+            yield f"first_run_{slug}", None, reason
+            yield f"rerun_{slug}", None, reason
+            continue
+        yield f"first_run_{slug}", lambda p=page: first_run(p), 1
+        at = session(page)
+        at.run()
+        yield f"rerun_{slug}", at.run, 1
+
+
+CASES = {
+    "engine": case_engine,
+    "suggestions": case_suggestions,
+    "projection": case_projection,
+    "parsing": case_parsing,
+    "cookie": case_cookie,
+    "json_import": case_json_import,
+    "rerun": case_rerun,
+}
+
+
+def environment():
+    versions = {}
+    for name in ("numpy", "pandas", "pyarrow", "streamlit"):
+        try:
+            versions[name] = __import__(name).__version__
+        except Exception:
+            versions[name] = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(APP_PATH),
+            capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "versions": versions,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_suite(sizes=DEFAULT_SIZES, cases=tuple(CASES), repeat=DEFAULT_REPEAT, budget=DEFAULT_BUDGET, log=None):
+    """Run `cases` at every size. Returns {"environment", "results": [...]}."""
+    results = []
+    for n in sizes:
+        data = SyntheticData(n)
+        for case in cases:
+            try:
+                for name, fn, items in CASES[case](data):
+                    if fn is None:
+                        row = {"case": case, "name": name, "size": n, "skipped": items}
+                        results.append(row)
+                        if log is not None:
+                            log(row)
+                        continue
+                    times = _time(fn, repeat, budget)
+                    median = statistics.median(times)
+                    row = {
+                        "case": case,
+                        "name": name,
+                        "size": n,
+                        "components": data.components,
+                        "runs": len(times),
+                        "median_s": median,
+                        "min_s": min(times),
+                        "items_per_s": items / median if median > 0 else None,
+                    }
+                    results.append(row)
+                    if log is not None:
+                        log(row)
+            except Exception as e:
+                row = {"case": case, "name": case, "size": n, "error": str(e)}
+                results.append(row)
+                if log is not None:
+                    log(row)
+    return {"environment": environment(), "results": results}
+
+
+def compare(old, new):
+    """Rows of (case name, size, old median, new median, new / old) for results present in both."""
+    before = {(r["name"], r["size"]): r for r in old["results"] if "median_s" in r}
+    rows = []
+    for r in new["results"]:
+        prev = before.get((r["name"], r["size"]))
+        if prev is not None and "median_s" in r:
+            rows.append((r["name"], r["size"], prev["median_s"], r["median_s"], r["median_s"] / prev["median_s"]))
+    return rows
+
+
+def _print_row(row):
+    if "error" in row:
+        print(f"{row['name']:<28} {row['size']:>9,}  ERROR {row['error']}", file=sys.stderr)
+    elif "skipped" in row:
+        print(f"{row['name']:<28} {row['size']:>9,}  skipped: {row['skipped']}")
+    else:
+        print(f"{row['name']:<28} {row['size']:>9,}  {row['median_s'] * 1000:>11.3f} ms  ({row['runs']} runs)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated course counts")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma-separated subset of {', '.join(CASES)}")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="stop repeating a benchmark after this many seconds")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    result = run_suite(sizes, cases, repeat=args.repeat, budget=args.budget, log=_print_row)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {len(result['results'])} results to {args.output}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        for name, size, before, after, ratio in compare(old, result):
+            print(f"{name:<28} {size:>9,}  {before * 1000:>11.3f} -> {after * 1000:>11.3f} ms  x{ratio:.2f}")
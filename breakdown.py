@@ -0,0 +1,284 @@
+"""Parsing of free-text grade breakdowns ("label: weight, grade" per line).
+
+Fields are separated by ':', ';' or ','. The weight may carry a '%' sign
+(weights are normalised later, so "30%" and "30" mean the same). The grade is
+either a number on the GPA scale, a percentage (mapped linearly onto 0-4.33)
+or a letter grade (A+ ... F). Fields after the grade are ignored.
+
+`parse_breakdowns` parses many courses' raw text in one call with a single
+precompiled pattern and returns columnar components plus the rejected lines
+with a reason for each, instead of silently dropping them.
+
+    python breakdown.py --benchmark [--lines 1000000]
+"""
+import argparse
+import json
+import math
+import re
+import time
+from itertools import compress
+
+import numpy as np
+
+MAX_GRADE = 4.33
+LETTER_POINTS = {
+    "A+": 4.33, "A": 4.0, "A-": 3.67,
+    "B+": 3.33, "B": 3.0, "B-": 2.67,
+    "C+": 2.33, "C": 2.0, "C-": 1.67,
+    "D+": 1.33, "D": 1.0, "D-": 0.67,
+    "F": 0.0,
+}
+
+# One match per non-blank line. A component line fills groups 1-4: label
+# (trailing blanks included), weight, grade and the grade's '%'; anything
+# after a third separator is ignored. Any other line lands whole in group 5.
+# Possessive quantifiers keep the scan linear, and blanks and '%' signs are
+# consumed by the pattern so the number columns convert with plain float().
+_LINE_RE = re.compile(
+    r"""^[ \t]*+(?:
+        ([^:;,\n]*+)[:;,][ \t]*+
+        ([^:;,\s%]++)[ \t]*+%?+[ \t]*+[:;,][ \t]*+
+        ([^:;,\s%]++)[ \t]*+(%?+)[ \t]*+
+        (?:[:;,][^\n]*+)?
+      |([^\n]*?\S[^\n]*+)
+    )$""",
+    re.M | re.X,
+)
+_LETTER_RE = re.compile(r"[A-Za-z][+-]?")
+_LETTERS = dict(LETTER_POINTS, **{k.lower(): v for k, v in LETTER_POINTS.items()})
+_PERCENT_TO_POINTS = MAX_GRADE / 100.0
+
+
+def _floats(values, letters=False):
+    """Column of number strings -> float64 array, NaN where a value is invalid.
+
+    One map(float) for the common all-numeric column; letter grades (when
+    `letters`) are looked up in their own whole-column pass.
+    """
+    points = None
+    if letters:
+        points = list(map(_LETTERS.get, values))
+        if points.count(None) != len(points):
+            values = [v if p is None else "nan" for v, p in zip(values, points)]
+        else:
+            points = None
+    try:
+        out = np.array(list(map(float, values)), dtype=np.float64)
+    except ValueError:
+        out = np.array([_float_or_nan(v) for v in values], dtype=np.float64)
+    out[~np.isfinite(out)] = np.nan
+    if points is not None:
+        # None -> NaN, so only the letter rows carry a value here
+        points = np.array(points, dtype=np.float64)
+        has_letter = ~np.isnan(points)
+        out[has_letter] = points[has_letter]
+    return out
+
+
+def _float_or_nan(s):
+    try:
+        return float(s)
+    except ValueError:
+        return math.nan
+
+
+def _grade_points(grades, percent):
+    """Grade strings and their '%' flags -> GPA points, NaN where invalid."""
+    points = _floats(grades, letters=True)
+    if any(percent):
+        pct = np.array(list(map(bool, percent)))
+        points[pct] = np.clip(points[pct] * _PERCENT_TO_POINTS, 0.0, MAX_GRADE)
+    return points
+
+
+def _reject_reason(line):
+    """Why `line` is not a valid component line, or None if it is."""
+    m = _LINE_RE.fullmatch(line.strip())
+    if m is None or m.group(5) is not None:
+        return "expected 'label: weight, grade' (weight and grade are single numbers or a letter grade)"
+    weight, grade = m.group(2), m.group(3)
+    if np.isnan(_floats([weight])[0]):
+        return f"weight {weight!r} is not a number"
+    if not np.isnan(_floats([grade], letters=True)[0]):
+        return None
+    if _LETTER_RE.fullmatch(grade):
+        return f"unknown letter grade {grade!r}"
+    return f"grade {grade!r} is not a number, percentage or letter grade"
+
+
+def parse_breakdowns(raws):
+    """Parse the raw breakdown text of many courses at once.
+
+    `raws` is a sequence of strings (None or "" for courses without one).
+    Returns (components, rejected): components is a dict of equal-length lists
+    course (index into `raws`), name, weight and grade; rejected is a list of
+    {"course", "line" (1-based), "text", "reason"} dicts.
+    """
+    components = {"course": [], "name": [], "weight": [], "grade": []}
+    rejected = []
+    counts = np.zeros(len(raws), dtype=np.int64)
+    # one column list per field: findall's per-row tuples die per course instead of
+    # piling up (millions of live tuples would keep triggering full GC passes)
+    names, weights, grades, grade_pct, other = [], [], [], [], []
+    findall = _LINE_RE.findall
+    for i, raw in enumerate(raws):
+        if not raw:
+            continue
+        if "\r" in raw:
+            raw = raw.replace("\r\n", "\n").replace("\r", "\n")
+        found = findall(raw)
+        if not found:
+            continue
+        n, w, g, p, o = zip(*found)
+        names += n
+        weights += w
+        grades += g
+        grade_pct += p
+        other += o
+        counts[i] = len(found)
+    if not names:
+        return components, rejected
+    malformed = any(other)
+    if malformed:
+        # those rows have empty number fields; keep the columns float()-able
+        weights = [w or "nan" for w in weights]
+        grades = [g or "nan" for g in grades]
+    course = np.repeat(np.arange(len(raws), dtype=np.int64), counts)
+    weight = _floats(weights)
+    grade = _grade_points(grades, grade_pct)
+    bad = np.isnan(weight) | np.isnan(grade)
+    if malformed:
+        bad |= np.array(list(map(bool, other)))
+    if bad.any():
+        rejected = _rejected_lines(raws, course, np.flatnonzero(bad))
+        keep = ~bad
+        names = list(compress(names, keep.tolist()))
+        course, weight, grade = course[keep], weight[keep], grade[keep]
+    components["course"] = course.tolist()
+    components["name"] = list(map(str.rstrip, names))
+    components["weight"] = weight.tolist()
+    components["grade"] = grade.tolist()
+    return components, rejected
+
+
+def _rejected_lines(raws, course, bad):
+    """Line numbers and reasons for the rows `bad` (row indices into `course`)."""
+    # a course's rows are its non-blank lines in order
+    starts = np.searchsorted(course, course[bad])
+    by_course = {}
+    for i, ordinal in zip(course[bad].tolist(), (bad - starts).tolist()):
+        by_course.setdefault(i, set()).add(ordinal)
+    rejected = []
+    for i, ordinals in by_course.items():
+        j = 0
+        raw = raws[i]
+        if "\r" in raw:
+            raw = raw.replace("\r\n", "\n").replace("\r", "\n")
+        # split like the grammar does: str.splitlines() also breaks on \x0b, \x0c, \x85, \u2028, ...
+        for n, line in enumerate(raw.split("\n"), 1):
+            if not line.strip():
+                continue
+            if j in ordinals:
+                rejected.append({"course": i, "line": n, "text": line.strip(), "reason": _reject_reason(line)})
+            j += 1
+    return rejected
+
+
+def components_by_course(components, n_courses):
+    """Split parse_breakdowns output into one [{"name", "weight", "grade"}, ...] list per course."""
+    out = [[] for _ in range(n_courses)]
+    for i, n, w, g in zip(components["course"], components["name"], components["weight"], components["grade"]):
+        out[i].append({"name": n, "weight": w, "grade": g})
+    return out
+
+
+def parse_breakdown_lines(raw):
+    """Components of one course's raw breakdown as [{"name", "weight", "grade"}, ...]."""
+    comps, _ = parse_breakdowns([raw])
+    return components_by_course(comps, 1)[0]
+
+
+def _legacy_parse(raw):
+    # the previous per-line re.split parser, kept for the benchmark
+    comps = []
+    for line in (raw or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        parts = re.split(r'[:;,]', line)
+        if len(parts) >= 3:
+            try:
+                comps.append({"name": parts[0].strip(), "weight": float(parts[1].strip()), "grade": float(parts[2].strip())})
+            except Exception:
+                continue
+    return comps
+
+
+def synthetic_breakdowns(n_lines, lines_per_course=10, bad_every=1000, mixed=True, seed=0):
+    """Raw breakdown texts totalling `n_lines` lines, every `bad_every`-th line malformed.
+
+    `mixed` cycles through GPA numbers, percentages and letter grades;
+    otherwise every line is "label: weight, grade" with plain numbers.
+    """
+    import random
+
+    rng = random.Random(seed)
+    letters = list(LETTER_POINTS)
+    raws, lines = [], []
+    for k in range(n_lines):
+        kind = k % 4 if mixed else 0
+        if bad_every and k % bad_every == bad_every - 1:
+            lines.append(f"Item {k} weight {rng.randint(1, 40)}")
+        elif kind == 0:
+            lines.append(f"Homework {k}: {rng.randint(1, 40)}, {rng.uniform(0, 4.33):.2f}")
+        elif kind == 1:
+            lines.append(f"Quiz {k}; {rng.randint(1, 40)}%; {rng.uniform(50, 100):.1f}%")
+        elif kind == 2:
+            lines.append(f"  Exam {k} : {rng.uniform(0.05, 0.5):.2f} , {rng.choice(letters)}")
+        else:
+            lines.append(f"Lab {k},{rng.randint(1, 40)},{rng.uniform(0, 4):.2f}")
+        if len(lines) == lines_per_course:
+            raws.append("\n".join(lines))
+            lines = []
+    if lines:
+        raws.append("\n".join(lines))
+    return raws
+
+
+def benchmark(n_lines=1_000_000, lines_per_course=10):
+    """Time parse_breakdowns against the old per-course parser on `n_lines` synthetic lines.
+
+    "numeric" input only uses the format the old parser understood; on
+    "mixed" input it drops the percentage and letter-grade lines.
+    """
+    result = {"lines": n_lines, "lines_per_course": lines_per_course}
+    for label, mixed in (("numeric", False), ("mixed", True)):
+        raws = synthetic_breakdowns(n_lines, lines_per_course, mixed=mixed)
+        start = time.perf_counter()
+        comps, rejected = parse_breakdowns(raws)
+        bulk = time.perf_counter() - start
+        start = time.perf_counter()
+        legacy = [_legacy_parse(r) for r in raws]
+        legacy_s = time.perf_counter() - start
+        result[label] = {
+            "bulk_seconds": round(bulk, 3),
+            "bulk_lines_per_second": round(n_lines / bulk),
+            "legacy_seconds": round(legacy_s, 3),
+            "legacy_lines_per_second": round(n_lines / legacy_s),
+            "components": len(comps["name"]),
+            "rejected": len(rejected),
+            "legacy_components": sum(len(c) for c in legacy),
+        }
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--benchmark", action="store_true", help="time the bulk parser on synthetic breakdowns")
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--lines-per-course", type=int, default=10)
+    args = parser.parse_args()
+    if args.benchmark:
+        print(json.dumps(benchmark(args.lines, args.lines_per_course), indent=2))
+    else:
+        parser.print_help()
@@ -0,0 +1,145 @@
+"""Cohort mode: GPA analytics for many students loaded from CSV or Parquet.
+
+Input is one long table with a row per course component (or a single row per
+course when it has no breakdown):
+
+    student_id, course, credits, grade[, weight, component_grade][, target_gpa]
+
+Course-level columns are repeated on each component row. Files are read in
+chunks and reduced to per-course partial sums as they stream in, so memory
+grows with the number of distinct courses rather than the number of rows.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from grade_engine import effective_from_sums
+
+REQUIRED_COLUMNS = ["student_id", "course", "credits", "grade"]
+OPTIONAL_COLUMNS = ["weight", "component_grade", "target_gpa"]
+DEFAULT_CHUNK_ROWS = 250_000
+# chunk aggregates buffered before they are merged into one frame
+COMPACT_EVERY = 8
+
+
+def _is_parquet(name):
+    return str(name).lower().endswith((".parquet", ".pq"))
+
+
+def iter_cohort_chunks(source, name=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield DataFrame chunks from a CSV or Parquet path or file-like object."""
+    name = name or (source if isinstance(source, str) else getattr(source, "name", ""))
+    wanted = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+    if _is_parquet(name):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(source)
+        cols = [c for c in wanted if c in pf.schema_arrow.names]
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=cols):
+            yield batch.to_pandas()
+    else:
+        reader = pd.read_csv(
+            source,
+            chunksize=chunk_rows,
+            usecols=lambda c: c in wanted,
+            dtype={"student_id": str, "course": str},
+        )
+        for chunk in reader:
+            yield chunk
+
+
+def _numeric(df, col):
+    if col not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[col], errors="coerce")
+
+
+def _reduce_chunk(df):
+    """Collapse component rows to per-(student, course) partial sums."""
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Cohort file is missing required columns: {', '.join(missing)}")
+    w = _numeric(df, "weight").fillna(0.0)
+    g = _numeric(df, "component_grade").fillna(0.0)
+    part = pd.DataFrame({
+        "student_id": df["student_id"].astype(str),
+        "course": df["course"].astype(str),
+        "credits": _numeric(df, "credits").fillna(0.0),
+        "grade": _numeric(df, "grade").fillna(0.0),
+        "abs_w": w.abs(),
+        "wg": w * g,
+        "target_gpa": _numeric(df, "target_gpa"),
+    })
+    return _merge([part])
+
+
+def _merge(parts):
+    frame = pd.concat(parts) if len(parts) > 1 else parts[0]
+    keys = ["student_id", "course"]
+    if isinstance(frame.index, pd.MultiIndex):
+        frame = frame.reset_index()
+    return frame.groupby(keys, sort=False).agg(
+        credits=("credits", "first"),
+        grade=("grade", "first"),
+        abs_w=("abs_w", "sum"),
+        wg=("wg", "sum"),
+        target_gpa=("target_gpa", "first"),
+    )
+
+
+def summarize_cohort(courses, default_target=3.0):
+    """Per-student GPA, distance to target and high-risk counts.
+
+    `courses` has one row per (student_id, course) with credits, grade, abs_w
+    and wg columns. Returns (students, courses) DataFrames; `courses` gains
+    effective_grade, quality_points and high_risk columns.
+    """
+    courses = courses.copy()
+    courses["effective_grade"] = effective_from_sums(courses["grade"], courses["abs_w"], courses["wg"])
+    courses["quality_points"] = courses["credits"] * courses["effective_grade"]
+    g = courses.groupby("student_id", sort=False)
+    students = pd.DataFrame({
+        "courses": g.size(),
+        "credits": g["credits"].sum(),
+        "quality_points": g["quality_points"].sum(),
+        "target_gpa": g["target_gpa"].first().fillna(default_target),
+    })
+    with np.errstate(divide="ignore", invalid="ignore"):
+        students["gpa"] = np.where(students["credits"] > 0, students["quality_points"] / students["credits"], np.nan)
+    students["distance_to_target"] = students["gpa"] - students["target_gpa"]
+    students["deficit_qp"] = (students["target_gpa"] * students["credits"] - students["quality_points"]).clip(lower=0)
+
+    # Dashboard rule: credits at or above the student's 66th percentile (0 with a
+    # single course) and course-level grade below the target GPA.
+    threshold = g["credits"].quantile(0.66)
+    threshold[students["courses"] <= 1] = 0
+    course_threshold = courses["student_id"].map(threshold)
+    course_target = courses["student_id"].map(students["target_gpa"])
+    courses["high_risk"] = (courses["credits"] >= course_threshold) & (courses["grade"] < course_target)
+    students["high_risk_courses"] = courses.groupby("student_id", sort=False)["high_risk"].sum().astype(int)
+    students = students.reset_index()
+    return students, courses.drop(columns=["abs_w", "wg"])
+
+
+def analyze_cohort(source, name=None, default_target=3.0, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """Stream a cohort file and compute per-student analytics.
+
+    `progress`, if given, is called with the number of rows read so far after
+    each chunk. Returns (students, courses, stats).
+    """
+    start = time.perf_counter()
+    parts = []
+    rows = 0
+    for chunk in iter_cohort_chunks(source, name=name, chunk_rows=chunk_rows):
+        parts.append(_reduce_chunk(chunk))
+        rows += len(chunk)
+        if len(parts) >= COMPACT_EVERY:
+            parts = [_merge(parts)]
+        if progress is not None:
+            progress(rows)
+    if not parts:
+        raise ValueError("Cohort file contains no rows")
+    courses = _merge(parts).reset_index()
+    students, courses = summarize_cohort(courses, default_target=default_target)
+    stats = {"rows": rows, "students": len(students), "courses": len(courses), "seconds": time.perf_counter() - start}
+    return students, courses, stats
@@ -0,0 +1,311 @@
+"""Streaming course import from JSON and NDJSON files.
+
+Accepted layouts:
+
+- the Export format, {"courses": [...]} (other top-level keys are ignored)
+- a bare JSON array of course objects
+- NDJSON / JSON Lines: one course object per line
+
+The file is decoded incrementally and records are parsed one at a time with
+the C JSON decoder, so memory holds a read buffer and the current record
+rather than the whole document tree. Each record is validated against the
+ranges the course editor accepts; invalid records are skipped and reported.
+Valid records are written into a fresh CourseStore in batches (breakdowns are
+parsed per batch), which the caller swaps in only when the import succeeded.
+"""
+import codecs
+import json
+import math
+import os
+import re
+import time
+
+from breakdown import MAX_GRADE
+from course_store import CourseStore
+
+READ_BYTES = 1024 * 1024
+BATCH_RECORDS = 10_000
+MAX_REPORTED_ERRORS = 1000
+# ranges of the Edit Courses inputs; values outside them could not be edited
+MAX_CREDITS = 10
+MAX_WEIGHT = 1000.0
+
+_WS = re.compile(r"[ \t\n\r]*")
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+_NUMBER_TYPES = (int, float)
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Incrementally decoded text with a cursor, refilled from a binary file."""
+
+    def __init__(self, fileobj, read_bytes=READ_BYTES):
+        self.file = fileobj
+        self.read_bytes = read_bytes
+        self.decode = codecs.getincrementaldecoder("utf-8-sig")().decode
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, min_bytes=0):
+        """Append at least one more chunk (or `min_bytes`); drops consumed text."""
+        data = self.file.read(max(self.read_bytes, min_bytes))
+        if not data:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + self.decode(data, final=not data)
+        self.pos = 0
+
+    def peek(self):
+        """Next non-whitespace character ("" at end of input), without consuming it."""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self.fill()
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"expected {char!r} but found {found or 'end of file'!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next JSON value, reading more input until it is complete."""
+        self.peek()
+        need = 0
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+                # a number running up to the buffer end ("3" or "3.") may continue in the next chunk
+                if self.eof or not _NUMBER_TAIL.fullmatch(self.buf, end):
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # values larger than a chunk: grow the read so re-decoding stays linear
+            need = max(need * 2, len(self.buf) - self.pos)
+            self.fill(need)
+
+    def lines(self):
+        """Remaining input line by line."""
+        while True:
+            nl = self.buf.find("\n", self.pos)
+            if nl >= 0:
+                line, self.pos = self.buf[self.pos:nl], nl + 1
+                yield line
+            elif self.eof:
+                if self.pos < len(self.buf):
+                    line, self.pos = self.buf[self.pos:], len(self.buf)
+                    yield line
+                return
+            else:
+                self.fill()
+
+
+def _iter_array(reader):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value(), None
+        sep = reader.peek()
+        reader.pos += 1
+        if sep == "]":
+            return
+        if sep != ",":
+            raise ValueError(f"expected ',' or ']' between courses but found {sep or 'end of file'!r}")
+
+
+def _iter_ndjson(reader):
+    for line in reader.lines():
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line), None
+            except ValueError as e:
+                yield None, f"invalid JSON: {e}"
+
+
+def iter_course_objects(fileobj, read_bytes=READ_BYTES, layout=None):
+    """Yield (course_object, error) per record of a JSON or NDJSON file.
+
+    `error` is set (and the object None) for an NDJSON line that is not valid
+    JSON; a syntax error inside a JSON document raises ValueError instead,
+    since the rest of the document cannot be read. `layout`, if given, is set
+    to "export", "array" or "ndjson" once known.
+    """
+    layout = layout if layout is not None else {}
+    reader = _Reader(fileobj, read_bytes)
+    first = reader.peek()
+    if first == "[":
+        layout["format"] = "array"
+        yield from _iter_array(reader)
+        if reader.peek():
+            raise ValueError("unexpected data after the course array")
+        return
+    if first != "{":
+        raise ValueError("expected a JSON object or array" if first else "the file is empty")
+    # read the first object key by key so a {"courses": [...]} export streams
+    reader.pos += 1
+    head = {}
+    streamed = False
+    if reader.peek() == "}":
+        reader.pos += 1
+    else:
+        while True:
+            key = reader.value()
+            reader.expect(":")
+            if key == "courses" and reader.peek() == "[":
+                layout["format"] = "export"
+                yield from _iter_array(reader)
+                streamed = True
+            else:
+                head[key] = reader.value()
+            sep = reader.peek()
+            reader.pos += 1
+            if sep == "}":
+                break
+            if sep != ",":
+                raise ValueError(f"expected ',' or '}}' but found {sep or 'end of file'!r}")
+    if streamed:
+        if reader.peek():
+            raise ValueError("unexpected data after the export object")
+        return
+    if "courses" in head:
+        raise ValueError("`courses` must be a list")
+    # not an export wrapper: one course object per line
+    layout["format"] = "ndjson"
+    yield head, None
+    yield from _iter_ndjson(reader)
+
+
+def _number(value, field, lo, hi, default):
+    if value is None:
+        return default
+    if type(value) is float or type(value) is int:
+        # the common case; NaN and infinities fail the comparison
+        if lo <= value <= hi:
+            return float(value)
+    elif not isinstance(value, str):
+        raise ValueError(f"{field} must be a number")
+    try:
+        v = float(value)
+    except ValueError:
+        raise ValueError(f"{field} {value!r} is not a number") from None
+    if not math.isfinite(v) or v < lo or v > hi:
+        raise ValueError(f"{field} {value!r} is outside {lo:g}-{hi:g}")
+    return v
+
+
+def _text(value, field):
+    if type(value) is str:
+        return value
+    if value is None:
+        return ""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f"{field} must be text")
+    return str(value)
+
+
+def _component(comp, j):
+    if not isinstance(comp, dict):
+        raise ValueError(f"components[{j}] must be an object")
+    return {
+        "name": _text(comp.get("name"), f"components[{j}].name"),
+        "weight": _number(comp.get("weight"), f"components[{j}].weight", 0.0, MAX_WEIGHT, 0.0),
+        "grade": _number(comp.get("grade"), f"components[{j}].grade", 0.0, MAX_GRADE, 0.0),
+    }
+
+
+def validate_course(obj):
+    """Check one imported course object. Returns (record, error_message)."""
+    if not isinstance(obj, dict):
+        return None, f"expected a course object, got {type(obj).__name__}"
+    try:
+        credits = _number(obj.get("credits"), "credits", 0, MAX_CREDITS, 0)
+        if credits != int(credits):
+            raise ValueError(f"credits {obj.get('credits')!r} is not a whole number")
+        comps = obj.get("components") or []
+        if not isinstance(comps, list):
+            raise ValueError("components must be a list")
+        components = []
+        for j, comp in enumerate(comps):
+            # exported components already have the right types; check those inline
+            if type(comp) is dict and len(comp) == 3:
+                name, weight, grade = comp.get("name"), comp.get("weight"), comp.get("grade")
+                if (type(name) is str and type(weight) in _NUMBER_TYPES and type(grade) in _NUMBER_TYPES
+                        and 0.0 <= weight <= MAX_WEIGHT and 0.0 <= grade <= MAX_GRADE):
+                    components.append(comp)
+                    continue
+            components.append(_component(comp, j))
+        record = {
+            "name": _text(obj.get("name"), "name"),
+            "credits": int(credits),
+            "grade": _number(obj.get("grade"), "grade", 0.0, MAX_GRADE, 0.0),
+            "breakdown_raw": _text(obj.get("breakdown_raw"), "breakdown_raw"),
+            "components": components,
+        }
+    except ValueError as e:
+        return None, str(e)
+    return record, None
+
+
+def import_courses(source, progress=None, batch_records=BATCH_RECORDS, read_bytes=READ_BYTES, max_errors=MAX_REPORTED_ERRORS):
+    """Stream courses from a path or binary file object into a new CourseStore.
+
+    `progress`, if given, is called as progress(bytes_read, records_seen)
+    after each batch. Returns (store, stats); stats has format, records,
+    imported, error_count, errors (the first `max_errors` as
+    {"record", "error"} dicts, records numbered from 1), bytes and seconds.
+    Raises ValueError when the file is not readable JSON.
+    """
+    start = time.perf_counter()
+    store = CourseStore()
+    layout = {}
+    errors = []
+    error_count = 0
+    seen = 0
+    batch = []
+    fileobj = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+    try:
+        try:
+            for obj, error in iter_course_objects(fileobj, read_bytes=read_bytes, layout=layout):
+                seen += 1
+                record = None
+                if error is None:
+                    record, error = validate_course(obj)
+                if error is not None:
+                    error_count += 1
+                    if len(errors) < max_errors:
+                        errors.append({"record": seen, "error": error})
+                    continue
+                batch.append(record)
+                if len(batch) >= batch_records:
+                    # the batch's dicts are freed here; the store keeps flat columns only
+                    store.extend(batch)
+                    batch = []
+                    if progress is not None:
+                        progress(fileobj.tell(), seen)
+        except ValueError as e:
+            where = f" after record {seen}" if seen else ""
+            raise ValueError(f"Invalid JSON{where}: {getattr(e, 'msg', e)}") from None
+        if batch:
+            store.extend(batch)
+        nbytes = fileobj.tell()
+    finally:
+        if fileobj is not source:
+            fileobj.close()
+    stats = {
+        "format": layout.get("format"),
+        "records": seen,
+        "imported": len(store),
+        "error_count": error_count,
+        "errors": errors,
+        "bytes": nbytes,
+        "seconds": time.perf_counter() - start,
+    }
+    if progress is not None:
+        progress(stats["bytes"], seen)
+    return store, stats
@@ -0,0 +1,337 @@
+"""Columnar course store: the single source of truth for a student's courses.
+
+Data lives in two tables, each a dict of equal-length column lists:
+
+- courses:    name, credits, grade, breakdown_raw
+- components: course (owning course row), name, weight, grade
+
+Components are kept grouped by course in course order, so a course's
+components are one contiguous slice and the compute paths can take whole
+columns at once instead of walking per-course session keys.
+"""
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from breakdown import components_by_course, parse_breakdowns
+from grade_engine import effective_grades, summarize_effective
+
+SCHEMA_VERSION = 1
+COURSE_COLUMNS = ("name", "credits", "grade", "breakdown_raw")
+COMPONENT_COLUMNS = ("course", "name", "weight", "grade")
+
+_COURSE_DEFAULTS = {"name": "", "credits": 0, "grade": 0.0, "breakdown_raw": ""}
+_COMPONENT_DEFAULTS = {"name": "", "weight": 0.0, "grade": 0.0}
+_COERCE = {
+    "name": lambda v: "" if v is None else str(v),
+    "breakdown_raw": lambda v: "" if v is None else str(v),
+    "credits": lambda v: int(v or 0),
+    "grade": lambda v: float(v or 0.0),
+    "weight": lambda v: float(v or 0.0),
+}
+
+
+class CourseStore:
+    """Courses and components tables plus change counters.
+
+    `version` increases on every mutation and `course_versions[i]` records the
+    version at which course i (or one of its components) last changed, so
+    derived data can be refreshed per course. `generation` increases only when
+    the whole dataset is replaced (load, import, reset), which tells widgets
+    bound to the store to re-seed themselves. `breakdown_rejects[i]` lists the
+    lines of course i's raw breakdown that could not be parsed, with reasons.
+    """
+
+    def __init__(self):
+        self.schema_version = SCHEMA_VERSION
+        self.courses = {c: [] for c in COURSE_COLUMNS}
+        self.components = {c: [] for c in COMPONENT_COLUMNS}
+        self.version = 0
+        self.course_versions = []
+        self.generation = 0
+        self._hidden = []
+        self.breakdown_rejects = {}
+        self._arrays = None
+        self._derived = None
+
+    def __len__(self):
+        return len(self.courses["name"])
+
+    def _touch(self, i=None):
+        self.version += 1
+        self._arrays = None
+        if i is not None:
+            self.course_versions[i] = self.version
+
+    # --- components slices ---
+
+    def _span(self, i):
+        col = self.components["course"]
+        return bisect_left(col, i), bisect_right(col, i)
+
+    def component_count(self, i):
+        lo, hi = self._span(i)
+        return hi - lo
+
+    def get_components(self, i):
+        lo, hi = self._span(i)
+        c = self.components
+        return [{"name": c["name"][k], "weight": c["weight"][k], "grade": c["grade"][k]} for k in range(lo, hi)]
+
+    def _parse_raw(self, i):
+        parsed, rejected = parse_breakdowns([self.courses["breakdown_raw"][i]])
+        self._set_rejects(i, rejected)
+        return components_by_course(parsed, 1)[0]
+
+    def _set_rejects(self, i, rejected):
+        if rejected:
+            self.breakdown_rejects[i] = [{k: r[k] for k in ("line", "text", "reason")} for r in rejected]
+        else:
+            self.breakdown_rejects.pop(i, None)
+
+    def set_components(self, i, comps):
+        """Replace course `i`'s components. An empty list re-imports from the raw breakdown."""
+        if not comps and self.courses["breakdown_raw"][i]:
+            comps = self._parse_raw(i)
+        lo, hi = self._span(i)
+        for col in COMPONENT_COLUMNS:
+            if col == "course":
+                new = [i] * len(comps)
+            else:
+                new = [_COERCE[col](comp.get(col, _COMPONENT_DEFAULTS[col])) for comp in comps]
+            self.components[col][lo:hi] = new
+        self._touch(i)
+
+    def set_component_field(self, i, j, col, value):
+        lo, hi = self._span(i)
+        if lo + j >= hi:
+            raise IndexError(f"Course {i} has no component {j}")
+        self.components[col][lo + j] = _COERCE[col](value)
+        self._touch(i)
+
+    def resize_components(self, i, n):
+        comps = self.get_components(i)[:n]
+        comps += [dict(_COMPONENT_DEFAULTS) for _ in range(n - len(comps))]
+        self.set_components(i, comps)
+
+    # --- courses ---
+
+    def get_course(self, i):
+        return {col: self.courses[col][i] for col in COURSE_COLUMNS}
+
+    def set_field(self, i, col, value):
+        self.courses[col][i] = _COERCE[col](value)
+        self._touch(i)
+
+    def append(self, record, parsed=None):
+        """Append one course record ({name, credits, grade, breakdown_raw, components}).
+
+        Without components the raw breakdown is parsed, unless `parsed` already
+        holds that result.
+        """
+        i = len(self)
+        for col in COURSE_COLUMNS:
+            self.courses[col].append(_COERCE[col](record.get(col, _COURSE_DEFAULTS[col])))
+        comps = record.get("components")
+        if not comps:
+            comps = self._parse_raw(i) if parsed is None else parsed
+        self.components["course"].extend([i] * len(comps))
+        for col in ("name", "weight", "grade"):
+            self.components[col].extend(_COERCE[col](comp.get(col, _COMPONENT_DEFAULTS[col])) for comp in comps)
+        self.course_versions.append(0)
+        self._touch(i)
+
+    def resize(self, n):
+        """Grow or shrink to `n` courses. Dropped courses are kept in memory and
+        restored first when growing again, like the old per-row session keys."""
+        while len(self) > n:
+            i = len(self) - 1
+            record = dict(self.get_course(i), components=self.get_components(i))
+            lo, _ = self._span(i)
+            for col in COURSE_COLUMNS:
+                del self.courses[col][i]
+            for col in COMPONENT_COLUMNS:
+                del self.components[col][lo:]
+            del self.course_versions[i]
+            self.breakdown_rejects.pop(i, None)
+            self._hidden.append(record)
+            self._touch()
+        while len(self) < n:
+            self.append(self._hidden.pop() if self._hidden else {})
+
+    def extend(self, records):
+        """Append many course records column by column; raw breakdowns are parsed in one bulk call."""
+        records = list(records)
+        base = len(self)
+        raws = ["" if r.get("components") else _COERCE["breakdown_raw"](r.get("breakdown_raw")) for r in records]
+        parsed, rejected = parse_breakdowns(raws)
+        parsed = components_by_course(parsed, len(records))
+        comps = [r.get("components") or parsed[k] for k, r in enumerate(records)]
+        for col in COURSE_COLUMNS:
+            default = _COURSE_DEFAULTS[col]
+            self.courses[col].extend(map(_COERCE[col], [r.get(col, default) for r in records]))
+        flat = [comp for course in comps for comp in course]
+        self.components["course"].extend(np.repeat(np.arange(base, base + len(records)), [len(c) for c in comps]).tolist())
+        for col in ("name", "weight", "grade"):
+            default = _COMPONENT_DEFAULTS[col]
+            self.components[col].extend(map(_COERCE[col], [comp.get(col, default) for comp in flat]))
+        for r in rejected:
+            self.breakdown_rejects.setdefault(base + r["course"], []).append({k: r[k] for k in ("line", "text", "reason")})
+        self._touch()
+        self.course_versions.extend([self.version] * len(records))
+
+    def replace(self, records):
+        """Replace every course with `records` (course_data-style dicts)."""
+        self.courses = {c: [] for c in COURSE_COLUMNS}
+        self.components = {c: [] for c in COMPONENT_COLUMNS}
+        self.course_versions = []
+        self._hidden = []
+        self.breakdown_rejects = {}
+        self.extend(records)
+        self.generation += 1
+        self._touch()
+
+    def adopt(self, other):
+        """Replace every course with the tables of `other`, a store built off to the side (e.g. by an import)."""
+        self.courses = other.courses
+        self.components = other.components
+        self.breakdown_rejects = other.breakdown_rejects
+        self._hidden = []
+        self.generation += 1
+        self._touch()
+        self.course_versions = [self.version] * len(self)
+
+    # --- whole-table views ---
+
+    def component_arrays(self):
+        """(comp_course, comp_weight, comp_grade) NumPy arrays, cached per version."""
+        if self._arrays is None:
+            c = self.components
+            self._arrays = (
+                np.asarray(c["course"], dtype=np.int64),
+                np.asarray(c["weight"], dtype=np.float64),
+                np.asarray(c["grade"], dtype=np.float64),
+            )
+        return self._arrays
+
+    def derived(self):
+        """Derived frame and grade summary, refreshed incrementally (see DerivedCourseData)."""
+        if self._derived is None:
+            self._derived = DerivedCourseData()
+        return self._derived.refresh(self)
+
+    def to_records(self):
+        """Course list in the export/cookie format: one dict per course with nested components."""
+        return [dict(self.get_course(i), components=self.get_components(i)) for i in range(len(self))]
+
+    def to_dict(self):
+        return {
+            "schema_version": self.schema_version,
+            "courses": {col: list(v) for col, v in self.courses.items()},
+            "components": {col: list(v) for col, v in self.components.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a store from `to_dict()` output, or from a plain list of course records."""
+        store = cls()
+        if isinstance(data, list):
+            store.replace(data)
+            return store
+        version = data.get("schema_version", 0)
+        if version > SCHEMA_VERSION:
+            raise ValueError(f"Course store schema {version} is newer than supported ({SCHEMA_VERSION})")
+        courses = data.get("courses") or {}
+        comps = data.get("components") or {}
+        n = len(courses.get("name", []))
+        for col in COURSE_COLUMNS:
+            values = courses.get(col) or [_COURSE_DEFAULTS[col]] * n
+            store.courses[col] = [_COERCE[col](v) for v in values]
+        m = len(comps.get("course", []))
+        order = sorted(range(m), key=lambda k: comps["course"][k])
+        store.components["course"] = [int(comps["course"][k]) for k in order]
+        for col in ("name", "weight", "grade"):
+            values = comps.get(col) or [_COMPONENT_DEFAULTS[col]] * m
+            store.components[col] = [_COERCE[col](values[k]) for k in order]
+        store.generation += 1
+        store._touch()
+        store.course_versions = [store.version] * n
+        return store
+
+
+class DerivedCourseData:
+    """Per-course effective grades, GPA summary and DataFrame memoized across reruns.
+
+    On refresh, effective grades are recomputed only for courses whose stamp in
+    `store.course_versions` changed; the other courses reuse cached values and
+    the totals are re-aggregated from the cached array. If the store did not
+    change at all, the previous frame and summary are returned untouched.
+    The DataFrame (and the pandas import) is only built when `frame` is first
+    read after a change. `last_run` and `totals` count the work done and skipped.
+    """
+
+    def __init__(self):
+        self.version = -1
+        self.stamps = np.empty(0, dtype=np.int64)
+        self.effective = np.empty(0, dtype=np.float64)
+        self.summary = None
+        self._frame = None
+        self._frame_version = -1
+        self._columns = None
+        self.last_run = {}
+        self.totals = {"refreshes": 0, "skipped_refreshes": 0, "courses_recomputed": 0, "courses_reused": 0}
+
+    def refresh(self, store):
+        n = len(store)
+        self.totals["refreshes"] += 1
+        if store.version == self.version and self.summary is not None:
+            self.last_run = {"frame": "reused", "courses_recomputed": 0, "courses_reused": n}
+            self.totals["skipped_refreshes"] += 1
+            self.totals["courses_reused"] += n
+            return self
+
+        stamps = np.asarray(store.course_versions, dtype=np.int64)
+        grades = np.asarray(store.courses["grade"], dtype=np.float64)
+        m = min(n, len(self.stamps))
+        dirty = np.ones(n, dtype=bool)
+        dirty[:m] = stamps[:m] != self.stamps[:m]
+        idx = np.flatnonzero(dirty)
+        if len(idx) == n:
+            effective = effective_grades(grades, *store.component_arrays())
+        else:
+            effective = np.empty(n, dtype=np.float64)
+            effective[:m] = self.effective[:m]
+            if len(idx):
+                c = store.components
+                spans = [store._span(i) for i in idx]
+                local = np.repeat(np.arange(len(idx)), [hi - lo for lo, hi in spans])
+                w = np.array([x for lo, hi in spans for x in c["weight"][lo:hi]], dtype=np.float64)
+                g = np.array([x for lo, hi in spans for x in c["grade"][lo:hi]], dtype=np.float64)
+                effective[idx] = effective_grades(grades[idx], local, w, g)
+
+        self.summary = summarize_effective(effective, store.courses["credits"])
+        self.summary["effective_grade"] = effective
+        # snapshot the columns now; the frame is built from them on first access
+        self._columns = {
+            "name": list(store.courses["name"]),
+            "credits": list(store.courses["credits"]),
+            "grade": list(store.courses["grade"]),
+            "effective_grade": effective,
+        }
+        self.effective = effective
+        self.stamps = stamps
+        self.version = store.version
+        self.last_run = {"frame": "stale", "courses_recomputed": int(len(idx)), "courses_reused": int(n - len(idx))}
+        self.totals["courses_recomputed"] += int(len(idx))
+        self.totals["courses_reused"] += int(n - len(idx))
+        return self
+
+    @property
+    def frame(self):
+        """name/credits/grade/effective_grade DataFrame for the last refresh."""
+        if self._frame_version != self.version:
+            import pandas as pd
+            self._frame = pd.DataFrame(self._columns)
+            self._frame_version = self.version
+            self.last_run["frame"] = "rebuilt"
+        return self._frame
@@ -0,0 +1,427 @@
+"""Model downloads: one engine for resumable, verified, optionally parallel HTTP downloads.
+
+Data is written to ``<dest>.part``. A ``<dest>.part.json`` sidecar records the
+URL, the server's validators (size, ETag, Last-Modified) and how far each byte
+range got, so an interrupted download resumes with HTTP Range requests instead
+of starting over. When the server supports ranges and the file is large
+enough, it is fetched as several ranged segments in parallel. Reads go into
+one large buffer per segment that is written with a single unbuffered write.
+A finished file is checked against an optional SHA-256 before it is moved to
+``dest``.
+
+DownloadJob runs the engine on a worker thread and is tracked in a
+process-wide registry, so any Streamlit rerun can poll its progress.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_SEGMENTS = 4
+DEFAULT_BUFFER_BYTES = 4 * 1024 * 1024
+# files smaller than two of these are fetched over a single connection
+MIN_SEGMENT_BYTES = 8 * 1024 * 1024
+READ_BYTES = 256 * 1024
+STATE_SAVE_INTERVAL = 1.0
+SEGMENT_RETRIES = 3
+USER_AGENT = "StudentDashboard/1.0"
+MAX_TRACKED_JOBS = 20
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+def filename_from_url(url, default="model.bin"):
+    return os.path.basename(urllib.parse.urlparse(url).path) or default
+
+
+def _request(url, start=None, end=None):
+    headers = {"User-Agent": USER_AGENT}
+    if start is not None:
+        headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+    return urllib.request.Request(url, headers=headers)
+
+
+def probe(url, timeout=30):
+    """Ask for the first byte to learn the final URL, size, range support and validators."""
+    with urllib.request.urlopen(_request(url, 0, 0), timeout=timeout) as resp:
+        headers = resp.headers
+        total, ranges = None, False
+        if resp.status == 206:
+            m = re.match(r"bytes\s+0-0/(\d+)", headers.get("Content-Range", ""))
+            if m:
+                total, ranges = int(m.group(1)), True
+        elif headers.get("Content-Length"):
+            total = int(headers["Content-Length"])
+        return {
+            "url": resp.geturl(),
+            "total": total,
+            "ranges": ranges,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+
+
+def _plan_segments(total, ranges, segments):
+    """[[start, end, done], ...] byte ranges (end inclusive, -1 when the size is unknown)."""
+    if not total:
+        return [[0, -1, 0]]
+    n = max(1, min(int(segments), total // MIN_SEGMENT_BYTES)) if ranges else 1
+    size = -(-total // n)
+    return [[k * size, min(total, (k + 1) * size) - 1, 0] for k in range(n)]
+
+
+def _load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _save_state(path, state):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _can_resume(state, info, url, part):
+    if not state or not os.path.exists(part):
+        return False
+    if state.get("url") != url or state.get("total") != info["total"]:
+        return False
+    for key in ("etag", "last_modified"):
+        if state.get(key) and info.get(key) and state[key] != info[key]:
+            return False
+    # resuming needs ranges unless nothing was downloaded yet
+    return info["ranges"] or all(seg[2] == 0 for seg in state["segments"])
+
+
+def hash_file(path, upto=None, chunk_bytes=DEFAULT_BUFFER_BYTES):
+    """SHA-256 of a file (or of its first `upto` bytes) as a hashlib object."""
+    h = hashlib.sha256()
+    remaining = upto
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            block = f.read(chunk_bytes if remaining is None else min(chunk_bytes, remaining))
+            if not block:
+                break
+            h.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return h
+
+
+class _Transfer:
+    """Shared bookkeeping for the segments of one download."""
+
+    def __init__(self, state, state_path, progress, cancel):
+        self.state = state
+        self.state_path = state_path
+        self.progress = progress
+        self.cancel = cancel
+        # set when one segment fails for good so the others stop early
+        self.abort = threading.Event()
+        self.done = sum(seg[2] for seg in state["segments"])
+        # read from the network but not yet written; counted in progress only
+        self.buffered = 0
+        self._lock = threading.Lock()
+        self._saved_at = time.monotonic()
+
+    def tick(self, seg, n):
+        """Record `n` buffered bytes of `seg` as written to the part file."""
+        with self._lock:
+            seg[2] += n
+            self.done += n
+            self.buffered -= n
+            if time.monotonic() - self._saved_at > STATE_SAVE_INTERVAL:
+                _save_state(self.state_path, self.state)
+                self._saved_at = time.monotonic()
+
+    def receive(self, n):
+        """Count `n` bytes read into a buffer (negative when a buffer is dropped)."""
+        with self._lock:
+            self.buffered += n
+            if self.progress is not None:
+                self.progress(self.done + self.buffered, self.state["total"])
+
+    def check(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise DownloadCancelled("Download cancelled")
+        if self.abort.is_set():
+            raise DownloadCancelled("Download aborted")
+
+    def save(self):
+        with self._lock:
+            _save_state(self.state_path, self.state)
+
+
+def _fill(resp, view, transfer):
+    """Read into `view` until it is full or the body ends. Returns the byte count."""
+    got = 0
+    try:
+        while got < len(view):
+            transfer.check()
+            n = resp.readinto(view[got:got + READ_BYTES])
+            if not n:
+                break
+            got += n
+            transfer.receive(n)
+    except BaseException:
+        transfer.receive(-got)
+        raise
+    return got
+
+
+def _fetch_segment(url, part, seg, transfer, buffer_bytes, timeout, hasher=None):
+    start, end, _ = seg
+    length = None if end < 0 else end - start + 1
+    if length is not None and seg[2] >= length:
+        return
+    offset = start + seg[2]
+    ranged = offset > 0 or end >= 0 and len(transfer.state["segments"]) > 1
+    req = _request(url, offset, end if end >= 0 else None) if ranged else _request(url)
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        if ranged and resp.status != 206:
+            raise IOError("Server ignored the byte range request")
+        buf = bytearray(buffer_bytes)
+        view = memoryview(buf)
+        with open(part, "r+b", buffering=0) as f:
+            f.seek(offset)
+            while True:
+                want = len(view) if length is None else min(len(view), length - seg[2])
+                if want <= 0:
+                    break
+                n = _fill(resp, view[:want], transfer)
+                if not n:
+                    break
+                written = 0
+                try:
+                    while written < n:
+                        written += f.write(view[written:n])
+                except BaseException:
+                    transfer.receive(-n)
+                    raise
+                if hasher is not None:
+                    hasher.update(view[:n])
+                transfer.tick(seg, n)
+    if length is not None and seg[2] < length:
+        raise IOError(f"Connection closed after {seg[2]} of {length} bytes")
+
+
+def _fetch_with_retries(url, part, seg, transfer, buffer_bytes, timeout, retries, hasher=None):
+    """Fetch one segment, resuming from its last written byte after transient errors.
+
+    The hash (single-stream downloads) only ever covers bytes that reached the
+    file, so a retry continues it cleanly.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return _fetch_segment(url, part, seg, transfer, buffer_bytes, timeout, hasher)
+        except DownloadCancelled:
+            raise
+        except Exception:
+            if attempt == retries:
+                transfer.abort.set()
+                raise
+            time.sleep(min(2 ** attempt, 10) * 0.5)
+
+
+def download_file(url, dest, sha256=None, segments=DEFAULT_SEGMENTS, buffer_bytes=DEFAULT_BUFFER_BYTES,
+                  progress=None, cancel=None, timeout=30, retries=SEGMENT_RETRIES):
+    """Download `url` to `dest`, resuming a previous partial download when possible.
+
+    `segments` caps the number of parallel ranged connections. `progress` is
+    called as progress(done_bytes, total_bytes or None) from the download
+    threads, and setting the `cancel` threading.Event stops the download with
+    the partial file kept for a later resume. Returns (dest, error_message).
+    """
+    part, state_path = f"{dest}.part", f"{dest}.part.json"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        info = probe(url, timeout=timeout)
+        state = _load_state(state_path)
+        if not _can_resume(state, info, url, part):
+            state = {
+                "url": url,
+                "total": info["total"],
+                "etag": info["etag"],
+                "last_modified": info["last_modified"],
+                "segments": _plan_segments(info["total"], info["ranges"], segments),
+            }
+            with open(part, "wb") as f:
+                if len(state["segments"]) > 1:
+                    f.truncate(info["total"])
+        elif len(state["segments"]) == 1:
+            # a single stream is appended in order, so the file size is the truth
+            state["segments"][0][2] = min(os.path.getsize(part), info["total"] or os.path.getsize(part))
+        _save_state(state_path, state)
+
+        transfer = _Transfer(state, state_path, progress, cancel)
+        fetch_url = info["url"]
+        segs = state["segments"]
+        hasher = None
+        try:
+            if len(segs) == 1:
+                # one stream: hash while downloading (after re-reading any resumed prefix)
+                if sha256:
+                    hasher = hash_file(part, upto=segs[0][2]) if segs[0][2] else hashlib.sha256()
+                # without range support a failed stream cannot be continued, so it is not retried
+                _fetch_with_retries(fetch_url, part, segs[0], transfer, buffer_bytes, timeout, retries if info["ranges"] else 0, hasher)
+            else:
+                with ThreadPoolExecutor(max_workers=len(segs), thread_name_prefix="download") as pool:
+                    futures = [
+                        pool.submit(_fetch_with_retries, fetch_url, part, seg, transfer, buffer_bytes, timeout, retries)
+                        for seg in segs
+                    ]
+                    errors = [f.exception() for f in futures]
+                # report the root failure rather than the segments it stopped
+                errors = [e for e in errors if e is not None]
+                if errors:
+                    raise next((e for e in errors if not isinstance(e, DownloadCancelled)), errors[0])
+        finally:
+            transfer.save()
+
+        if sha256:
+            digest = (hasher or hash_file(part)).hexdigest()
+            if digest.lower() != sha256.strip().lower():
+                os.remove(part)
+                os.remove(state_path)
+                return None, f"SHA-256 mismatch: expected {sha256.strip().lower()}, got {digest}"
+        os.replace(part, dest)
+        os.remove(state_path)
+        return dest, None
+    except DownloadCancelled as e:
+        return None, str(e)
+    except Exception as e:
+        return None, str(e)
+
+
+class DownloadJob:
+    """One download running on a worker thread, pollable from any rerun.
+
+    Progress, throughput (over the last few seconds) and ETA are computed
+    from the engine's progress callback. `cancel()` stops the transfer and
+    keeps the partial file; `resume()` starts it again from there.
+    """
+
+    SPEED_WINDOW = 5.0
+
+    def __init__(self, url, dest, sha256=None, segments=DEFAULT_SEGMENTS):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.dest = dest
+        self.sha256 = sha256
+        self.segments = segments
+        self.created = time.time()
+        self.done_bytes = 0
+        self.total_bytes = None
+        self.path = None
+        self.error = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._samples = deque()
+        self._cancel = threading.Event()
+        self._thread = None
+        self._start()
+
+    def _start(self):
+        self._cancel.clear()
+        with self._lock:
+            self.error = None
+            self.finished_at = None
+            self._samples.clear()
+        self._thread = threading.Thread(target=self._run, name=f"download-{self.id[:8]}", daemon=True)
+        self._thread.start()
+
+    def _progress(self, done, total):
+        now = time.monotonic()
+        with self._lock:
+            self.done_bytes, self.total_bytes = done, total
+            self._samples.append((now, done))
+            while len(self._samples) > 2 and now - self._samples[0][0] > self.SPEED_WINDOW:
+                self._samples.popleft()
+
+    def _run(self):
+        path, error = download_file(
+            self.url, self.dest, sha256=self.sha256, segments=self.segments, progress=self._progress, cancel=self._cancel
+        )
+        with self._lock:
+            self.path, self.error = path, error
+            if path:
+                self.done_bytes = self.total_bytes = os.path.getsize(path)
+            self.finished_at = time.time()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def resume(self):
+        """Restart a cancelled or failed job; the engine picks up the partial file."""
+        if self.running or self.path:
+            return
+        self._start()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def status(self):
+        if self.running:
+            return "cancelling" if self._cancel.is_set() else "running"
+        if self.path:
+            return "finished"
+        return "cancelled" if self._cancel.is_set() else "failed"
+
+    def snapshot(self):
+        """Dict with status, done/total bytes, fraction, bytes_per_second, eta_seconds, path and error."""
+        with self._lock:
+            speed = 0.0
+            if len(self._samples) >= 2:
+                (t0, d0), (t1, d1) = self._samples[0], self._samples[-1]
+                speed = (d1 - d0) / (t1 - t0) if t1 > t0 else 0.0
+            total, done = self.total_bytes, self.done_bytes
+            eta = (total - done) / speed if total and speed > 0 else None
+            return {
+                "status": self.status,
+                "done_bytes": done,
+                "total_bytes": total,
+                "fraction": min(1.0, done / total) if total else None,
+                "bytes_per_second": speed,
+                "eta_seconds": eta,
+                "path": self.path,
+                "error": self.error,
+            }
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def start_download_job(url, dest, sha256=None, segments=DEFAULT_SEGMENTS):
+    """Start (or return the already running) download job for `dest`."""
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.dest == dest and job.running:
+                return job
+        job = DownloadJob(url, dest, sha256=sha256, segments=segments)
+        _jobs[job.id] = job
+        # forget the oldest finished jobs so the registry stays small
+        finished = sorted((j for j in _jobs.values() if not j.running), key=lambda j: j.created)
+        for old in finished[: max(0, len(_jobs) - MAX_TRACKED_JOBS)]:
+            _jobs.pop(old.id, None)
+    return job
+
+
+def get_download_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
@@ -0,0 +1,124 @@
+"""Course exports in JSON, Parquet, Arrow IPC and CSV.
+
+JSON is the nested Export format ({"courses": [...]} with components inside
+each course) that the importer reads back. The columnar formats hold one of
+the two store tables:
+
+- courses:    course, name, credits, grade, breakdown_raw
+- components: course, name, weight, grade
+
+where `course` is the course's row number. Every export is written in chunks
+of rows straight into a binary file, so nothing builds the whole payload as
+one string; Parquet and Arrow get one row group / record batch per chunk.
+pyarrow is only imported for those two formats.
+"""
+import csv
+import io
+import json
+
+CHUNK_ROWS = 65_536
+# format -> (label, file extension, MIME type, exports one table)
+EXPORT_FORMATS = {
+    "json": ("JSON (courses with components)", "json", "application/json", False),
+    "parquet": ("Parquet", "parquet", "application/vnd.apache.parquet", True),
+    "arrow": ("Arrow IPC", "arrow", "application/vnd.apache.arrow.file", True),
+    "csv": ("CSV", "csv", "text/csv", True),
+}
+TABLES = ("courses", "components")
+
+
+def _columns(store, table):
+    """Column name -> list for `table`, including the course row number."""
+    if table == "courses":
+        return dict(course=range(len(store)), **store.courses)
+    if table == "components":
+        return dict(store.components)
+    raise ValueError(f"Unknown table {table!r}; expected one of {', '.join(TABLES)}")
+
+
+def _arrow_schema(table):
+    import pyarrow as pa
+
+    if table == "courses":
+        fields = [("course", pa.int64()), ("name", pa.string()), ("credits", pa.int64()), ("grade", pa.float64()), ("breakdown_raw", pa.string())]
+    else:
+        fields = [("course", pa.int64()), ("name", pa.string()), ("weight", pa.float64()), ("grade", pa.float64())]
+    return pa.schema(fields)
+
+
+def iter_chunks(store, table, chunk_rows=CHUNK_ROWS):
+    """Yield {column: list} slices of `table` with at most `chunk_rows` rows each."""
+    cols = _columns(store, table)
+    n = len(cols["course"])
+    for lo in range(0, n, chunk_rows):
+        yield {name: list(values[lo:lo + chunk_rows]) for name, values in cols.items()}
+
+
+def _write_json(store, out, chunk_rows):
+    out.write(b'{"courses": [')
+    n = len(store)
+    for lo in range(0, n, chunk_rows):
+        hi = min(n, lo + chunk_rows)
+        records = [dict(store.get_course(i), components=store.get_components(i)) for i in range(lo, hi)]
+        # one encoder call per chunk; the list brackets are dropped to splice chunks together
+        text = json.dumps(records, separators=(",", ":"))[1:-1]
+        out.write((",\n" if lo else "\n").encode("utf-8") + text.encode("utf-8"))
+    out.write(b"\n]}\n")
+
+
+def _write_csv(store, table, out, chunk_rows):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    try:
+        writer = csv.writer(text)
+        writer.writerow(list(_columns(store, table)))
+        for chunk in iter_chunks(store, table, chunk_rows):
+            writer.writerows(zip(*chunk.values()))
+    finally:
+        # leave `out` open for the caller
+        text.detach()
+
+
+def _write_arrow(store, table, out, fmt, chunk_rows):
+    import pyarrow as pa
+
+    schema = _arrow_schema(table)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(out, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(out, schema)
+    try:
+        for chunk in iter_chunks(store, table, chunk_rows):
+            batch = pa.record_batch([pa.array(chunk[f.name], type=f.type) for f in schema], schema=schema)
+            writer.write_batch(batch)
+    finally:
+        writer.close()
+
+
+def write_export(store, fmt, out, table="courses", chunk_rows=CHUNK_ROWS):
+    """Write `store` as `fmt` into the binary file `out`, `chunk_rows` rows at a time.
+
+    `table` picks the courses or components table for the columnar formats
+    and is ignored for JSON.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    if fmt == "json":
+        _write_json(store, out, chunk_rows)
+    elif fmt == "csv":
+        _write_csv(store, table, out, chunk_rows)
+    else:
+        _write_arrow(store, table, out, fmt, chunk_rows)
+
+
+def export_bytes(store, fmt, table="courses", chunk_rows=CHUNK_ROWS):
+    """The export as an in-memory binary file (for download buttons)."""
+    out = io.BytesIO()
+    write_export(store, fmt, out, table=table, chunk_rows=chunk_rows)
+    out.seek(0)
+    return out
+
+
+def export_file_name(fmt, table="courses"):
+    ext = EXPORT_FORMATS[fmt][1]
+    return f"courses.{ext}" if fmt == "json" else f"{table}.{ext}"
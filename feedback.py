@@ -0,0 +1,142 @@
+"""Improvement feedback: prompt building, heuristic tips and background batch jobs.
+
+Batch jobs run on worker threads and are tracked in a process-wide registry so a
+Streamlit rerun (or a navigation away and back) can pick up finished results.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from local_llm import response_cache, response_cache_key, run_local_llm
+
+MAX_TRACKED_JOBS = 20
+
+
+def build_feedback_prompt(name, credits, effective_grade, components, target):
+    prompt_lines = [f"Course: {name}", f"Credits: {int(credits)}", f"Effective grade: {effective_grade:.2f}", f"Target GPA: {target:.2f}"]
+    if components:
+        prompt_lines.append("Components:")
+        for c in components:
+            prompt_lines.append(f"- {c.get('name')}: weight={c.get('weight')} grade={c.get('grade')}")
+    return "\n".join(prompt_lines) + "\n\nProvide concise suggestions to improve grades, prioritizing high-impact, actionable steps."
+
+
+def heuristic_feedback(name, credits, effective_grade, components, target):
+    tips = []
+    # If overall below target, suggest high-impact components
+    if effective_grade < target:
+        tips.append(f"Current effective grade {effective_grade:.2f} is below target {target:.2f}.")
+        # rank components by weight
+        if components:
+            comps_sorted = sorted(components, key=lambda c: -abs(c.get("weight", 0)))
+            top = comps_sorted[0]
+            tips.append(f"Focus on '{top.get('name')}' (weight {top.get('weight')}) — improving it yields biggest GPA impact.")
+        else:
+            tips.append("No component breakdown — focus on assignments/exams with largest credit or re-assess study time.")
+    else:
+        tips.append("You're on track for this course — maintain current performance and keep an eye on high-weight items.")
+    # low-grade components
+    for c in components or []:
+        if c.get("grade", 0) < effective_grade and c.get("weight", 0) > 0:
+            tips.append(f"Component '{c.get('name')}' grade {c.get('grade'):.2f} is below course effective grade — investigate remediation.")
+    return "\n".join(tips)
+
+
+class FeedbackJob:
+    """Generates feedback for many courses on a bounded thread pool.
+
+    `courses` is a list of dicts with index, name, credits, effective_grade and
+    components. `llm` is None for heuristic-only feedback, or a dict with
+    backend, model_path and max_tokens. Heuristic tasks run in parallel; LLM
+    calls for the same model serialize on the model's generation lock.
+    """
+
+    def __init__(self, courses, target, llm=None, max_workers=4):
+        self.id = uuid.uuid4().hex
+        self.total = len(courses)
+        self.target = target
+        self.llm = llm
+        self.results = {}
+        self.created = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="feedback")
+        self._futures = [self._pool.submit(self._run_one, course) for course in courses]
+        # no more work will be queued; let idle workers exit when the queue drains
+        self._pool.shutdown(wait=False)
+        if not courses:
+            self.finished_at = time.time()
+
+    def _run_one(self, course):
+        if self._cancelled.is_set():
+            return
+        start = time.perf_counter()
+        args = (course["name"] or "Unnamed", course["credits"], course["effective_grade"], course["components"], self.target)
+        text, source, error = None, "heuristic", None
+        if self.llm:
+            prompt = build_feedback_prompt(*args)
+            key = response_cache_key(prompt, self.llm["backend"], self.llm["model_path"], self.llm["max_tokens"])
+            cached = response_cache.get(key)
+            if cached:
+                text, source = cached.get("text"), "cache"
+            else:
+                out, error = run_local_llm(prompt, self.llm["backend"], self.llm["model_path"], self.llm["max_tokens"])
+                if out:
+                    text, source = out, "llm"
+                    response_cache.put(key, out, backend=self.llm["backend"], model=self.llm["model_path"], max_tokens=self.llm["max_tokens"])
+        if not text:
+            text = heuristic_feedback(*args)
+        with self._lock:
+            self.results[course["index"]] = {
+                "name": args[0],
+                "text": text,
+                "source": source,
+                "error": error,
+                "seconds": time.perf_counter() - start,
+            }
+            if len(self.results) == self.total:
+                self.finished_at = time.time()
+
+    def cancel(self):
+        self._cancelled.set()
+        for f in self._futures:
+            f.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def done(self):
+        return self.finished_at is not None or all(f.done() for f in self._futures)
+
+    def progress(self):
+        """Return (completed, total) without blocking on running workers."""
+        with self._lock:
+            return len(self.results), self.total
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.results)
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def start_feedback_job(courses, target, llm=None, max_workers=4):
+    job = FeedbackJob(courses, target, llm=llm, max_workers=max_workers)
+    with _jobs_lock:
+        _jobs[job.id] = job
+        # forget the oldest finished jobs so the registry stays small
+        finished = sorted((j for j in _jobs.values() if j.done), key=lambda j: j.created)
+        for old in finished[: max(0, len(_jobs) - MAX_TRACKED_JOBS)]:
+            _jobs.pop(old.id, None)
+    return job
+
+
+def get_feedback_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
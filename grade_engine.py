@@ -0,0 +1,251 @@
+"""Vectorized effective-grade engine.
+
+Courses are described by flat columnar arrays instead of nested dicts:
+
+- per course: ``course_grade`` (expected GPA) and ``credits``
+- per component: ``comp_course`` (index of the owning course), ``comp_weight``
+  and ``comp_grade``
+
+Effective grades, quality points and GPA are then computed in one pass with
+grouped reductions (``np.bincount``), which stays fast for 100k+ courses.
+"""
+import numpy as np
+
+
+def effective_grades(course_grade, comp_course, comp_weight, comp_grade):
+    """Weight-averaged component grade per course.
+
+    Weights are normalised by the sum of their absolute values. Courses with no
+    components, or whose component weights sum to zero, fall back to their
+    course-level grade.
+    """
+    course_grade = np.asarray(course_grade, dtype=np.float64)
+    comp_course = np.asarray(comp_course, dtype=np.int64)
+    comp_weight = np.asarray(comp_weight, dtype=np.float64)
+    comp_grade = np.asarray(comp_grade, dtype=np.float64)
+    n = len(course_grade)
+    total_w = np.bincount(comp_course, weights=np.abs(comp_weight), minlength=n)
+    weighted = np.bincount(comp_course, weights=comp_weight * comp_grade, minlength=n)
+    return effective_from_sums(course_grade, total_w, weighted)
+
+
+def effective_from_sums(course_grade, total_abs_weight, weighted_sum):
+    """Effective grades from per-course sums of |weight| and weight * grade.
+
+    Useful when the sums were accumulated elsewhere (e.g. chunk by chunk);
+    courses without positive total weight keep their course-level grade.
+    """
+    course_grade = np.asarray(course_grade, dtype=np.float64)
+    total_abs_weight = np.asarray(total_abs_weight, dtype=np.float64)
+    weighted_sum = np.asarray(weighted_sum, dtype=np.float64)
+    has_weight = total_abs_weight > 0
+    out = course_grade.copy()
+    out[has_weight] = weighted_sum[has_weight] / total_abs_weight[has_weight]
+    return out
+
+
+def grade_summary(course_grade, credits, comp_course, comp_weight, comp_grade):
+    """Effective grades, quality points and GPA in one pass.
+
+    Returns a dict with ``effective_grade`` and ``quality_points`` arrays plus
+    scalar ``total_credits``, ``total_quality_points`` and ``gpa`` (None when
+    there are no credits).
+    """
+    eff = effective_grades(course_grade, comp_course, comp_weight, comp_grade)
+    return summarize_effective(eff, credits)
+
+
+def summarize_effective(eff, credits):
+    """Quality points and GPA from already-computed effective grades (see grade_summary)."""
+    eff = np.asarray(eff, dtype=np.float64)
+    credits = np.asarray(credits, dtype=np.float64)
+    qp = credits * eff
+    total_credits = float(credits.sum())
+    total_qp = float(qp.sum())
+    return {
+        "effective_grade": eff,
+        "quality_points": qp,
+        "total_credits": total_credits,
+        "total_quality_points": total_qp,
+        "gpa": (total_qp / total_credits) if total_credits > 0 else None,
+    }
+
+
+ALLOCATION_OBJECTIVES = {
+    "min_max_bump": "Smallest largest bump",
+    "min_courses": "Fewest courses touched",
+    "difficulty": "Weighted by difficulty",
+}
+
+
+def _water_fill(caps, slopes, coef, target):
+    """Find x_i = min(caps_i, lam * slopes_i) with sum(coef_i * x_i) == target.
+
+    The left side is piecewise linear and non-decreasing in lam with breakpoints
+    caps_i / slopes_i, so one sort plus prefix/suffix sums locates lam exactly.
+    Entries with slope 0 receive nothing.
+    """
+    x = np.zeros_like(caps)
+    active = (slopes > 0) & (caps > 0) & (coef > 0)
+    if target <= 0 or not active.any():
+        return x
+    u, s, c = caps[active], slopes[active], coef[active]
+    brk = u / s
+    order = np.argsort(brk, kind="stable")
+    u, s, c, brk = u[order], s[order], c[order], brk[order]
+    # prefix[k]: quality points of the k saturated entries; suffix[k]: slope of the rest
+    prefix = np.concatenate(([0.0], np.cumsum(c * u)))[:-1]
+    suffix = np.cumsum((c * s)[::-1])[::-1]
+    reached = prefix + brk * suffix
+    k = int(np.searchsorted(reached, target, side="left"))
+    if k >= len(brk):
+        vals = u
+    else:
+        lam = (target - prefix[k]) / suffix[k]
+        vals = np.minimum(u, lam * s)
+    out = np.empty_like(vals)
+    out[order] = vals
+    x[active] = out
+    return x
+
+
+def allocate_deficit(grades, credits, deficit_qp, objective="min_max_bump", difficulty=None, max_grade=4.33):
+    """Split a quality-point deficit into per-course grade bumps.
+
+    Objectives:
+
+    - ``min_max_bump``: minimise the largest grade increase (water-filling).
+    - ``min_courses``: touch as few courses as possible by filling the courses
+      with the most headroom (credits * (max_grade - grade)) first.
+    - ``difficulty``: minimise sum(difficulty_i * bump_i ** 2), so harder
+      courses are asked for proportionally less; ``difficulty`` defaults to 1.
+
+    Returns an array of grade bumps aligned with ``grades``. Bumps never push a
+    course past ``max_grade``; if the deficit cannot be covered every course is
+    raised to ``max_grade``.
+    """
+    grades = np.asarray(grades, dtype=np.float64)
+    credits = np.asarray(credits, dtype=np.float64)
+    caps = np.clip(max_grade - grades, 0, None)
+    caps[credits <= 0] = 0.0
+    if objective == "min_courses":
+        gain = credits * caps
+        order = np.argsort(-gain, kind="stable")
+        taken = np.minimum(gain[order], np.clip(deficit_qp - (np.cumsum(gain[order]) - gain[order]), 0, None))
+        bumps = np.zeros_like(grades)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bumps[order] = np.where(credits[order] > 0, taken / credits[order], 0.0)
+        return bumps
+    if objective == "difficulty":
+        d = np.ones_like(grades) if difficulty is None else np.clip(np.asarray(difficulty, dtype=np.float64), 1e-6, None)
+        # KKT for the quadratic cost: bump_i = min(cap_i, lam * credits_i / difficulty_i)
+        slopes = credits / d
+    elif objective == "min_max_bump":
+        slopes = np.ones_like(grades)
+    else:
+        raise ValueError(f"Unknown allocation objective: {objective}")
+    return _water_fill(caps, slopes, credits, float(deficit_qp))
+
+
+PROJECTION_SAMPLES = 100_000
+# random draws held in memory at once (samples x uncertain grades); ~16 MB of float32
+SAMPLE_CHUNK_CELLS = 4_000_000
+
+
+def _projection_terms(course_grade, credits, comp_course, comp_weight, comp_grade, course_spread, comp_spread, max_grade):
+    """Per-grade (course, value, GPA coefficient, low end, GPA scale) for simulate_gpa; None without credits."""
+    course_grade = np.asarray(course_grade, dtype=np.float64)
+    credits = np.asarray(credits, dtype=np.float64)
+    comp_course = np.asarray(comp_course, dtype=np.int64)
+    comp_weight = np.asarray(comp_weight, dtype=np.float64)
+    comp_grade = np.asarray(comp_grade, dtype=np.float64)
+    n = len(course_grade)
+    total_credits = float(credits.sum())
+    if total_credits <= 0:
+        return None
+    total_w = np.bincount(comp_course, weights=np.abs(comp_weight), minlength=n)
+    has_weight = total_w > 0
+    # GPA = sum(coef * grade) over components of weighted courses and grades of the others
+    with np.errstate(divide="ignore", invalid="ignore"):
+        comp_coef = np.where(has_weight[comp_course], credits[comp_course] * comp_weight / total_w[comp_course], 0.0)
+    course_coef = np.where(has_weight, 0.0, credits)
+    item_course = np.concatenate([comp_course, np.arange(n, dtype=np.int64)])
+    value = np.concatenate([comp_grade, course_grade])
+    spread = np.clip(np.concatenate([
+        np.broadcast_to(np.asarray(comp_spread, dtype=np.float64), comp_grade.shape),
+        np.broadcast_to(np.asarray(course_spread, dtype=np.float64), course_grade.shape),
+    ]), 0, None)
+    coef = np.concatenate([comp_coef, course_coef]) / total_credits
+    low = np.clip(value - spread, 0, max_grade)
+    high = np.clip(value + spread, 0, max_grade)
+    # grade = low + u * (high - low) with u ~ U(0, 1), so GPA = base + u @ scale
+    return item_course, value, coef, low, coef * (high - low)
+
+
+def uncertain_grade_count(course_grade, credits, comp_course, comp_weight, comp_grade, course_spread, comp_spread, max_grade=4.33):
+    """How many grades simulate_gpa draws per scenario: those whose range moves the GPA at all."""
+    terms = _projection_terms(course_grade, credits, comp_course, comp_weight, comp_grade, course_spread, comp_spread, max_grade)
+    return 0 if terms is None else int(np.count_nonzero(terms[4]))
+
+
+def simulate_gpa(course_grade, credits, comp_course, comp_weight, comp_grade, course_spread, comp_spread,
+                 samples=PROJECTION_SAMPLES, seed=0, max_grade=4.33, chunk_cells=SAMPLE_CHUNK_CELLS):
+    """Monte Carlo GPA when grades are uncertain.
+
+    Every grade that feeds the GPA (the components of courses with weighted
+    components, otherwise the course grade) is drawn uniformly from its range,
+    value +/- ``comp_spread`` / ``course_spread`` cut to [0, max_grade]. The
+    GPA is linear in those grades, so a chunk of scenarios is one float32
+    matrix-vector product of uniform draws with fixed per-grade scales; at
+    most about ``chunk_cells`` draws are held at once.
+
+    Returns None when there are no credits, else a dict with ``samples`` (the
+    sorted GPA of every scenario), ``point`` (GPA at the entered grades),
+    ``mean``, ``std`` and, per course with an uncertain grade, ``course``
+    (indices), ``course_std`` (std of the course's share of the GPA),
+    ``variance_share`` and ``swing`` (GPA change from all its grades at the
+    bottom to all at the top of their ranges). The grades are independent, so
+    the per-course spread is exact rather than estimated from the samples.
+    """
+    terms = _projection_terms(course_grade, credits, comp_course, comp_weight, comp_grade, course_spread, comp_spread, max_grade)
+    if terms is None:
+        return None
+    item_course, value, coef, low, scale = terms
+    point = float(coef @ value)
+    uncertain = scale != 0
+    base = float(coef @ np.where(uncertain, low, value))
+    scale = scale[uncertain]
+    k = len(scale)
+
+    gpa = np.full(samples, base)
+    if k:
+        rng = np.random.default_rng(seed)
+        scale32 = scale.astype(np.float32)
+        rows = max(1, chunk_cells // k)
+        draws = np.empty((min(rows, samples), k), dtype=np.float32)
+        for lo in range(0, samples, rows):
+            r = min(rows, samples - lo)
+            u = rng.random(out=draws[:r], dtype=np.float32)
+            gpa[lo:lo + r] += u @ scale32
+    gpa.sort()
+
+    # per course: a uniform grade's share of the GPA has variance scale**2 / 12
+    courses, inverse = np.unique(item_course[uncertain], return_inverse=True)
+    course_var = np.bincount(inverse, weights=scale * scale / 12.0, minlength=len(courses))
+    total_var = float(course_var.sum())
+    return {
+        "samples": gpa,
+        "point": point,
+        "mean": float(gpa.mean()),
+        "std": float(gpa.std()),
+        "course": courses,
+        "course_std": np.sqrt(course_var),
+        "variance_share": course_var / total_var if total_var > 0 else course_var,
+        "swing": np.bincount(inverse, weights=scale, minlength=len(courses)),
+    }
+
+
+def probability_at_least(sorted_samples, target):
+    """Share of the (sorted) simulated GPAs that reach `target`."""
+    n = len(sorted_samples)
+    return 1.0 - np.searchsorted(sorted_samples, target, side="left") / n if n else 0.0
@@ -0,0 +1,396 @@
+"""Shared local inference worker.
+
+Without it, every Streamlit server process loads its own copy of the model
+(see local_llm.model_cache). The worker is one separate process that keeps the
+loaded models (llama.cpp memory-maps the weights by default) and serves
+generation requests from every session over an authenticated localhost socket:
+
+- requests wait in a bounded queue; a full queue answers "busy" right away and
+  the client retries with backoff until its own deadline
+- `concurrency` worker threads generate (one model still generates one prompt
+  at a time, see local_llm.generation_lock)
+- every request carries a timeout, and a client that cancels or disconnects
+  stops its generation at the next token
+
+Messages are JSON frames over multiprocessing.connection, which also does the
+authkey handshake; the key is kept in a per-user file. `worker_client` starts
+the worker on first use and shuts it down when the server exits, or it can be
+run by hand:
+
+    python inference_worker.py [--port 8765] [--queue 8] [--concurrency 1]
+"""
+import argparse
+import atexit
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+DEFAULT_PORT = int(os.environ.get("LLM_WORKER_PORT", "8765"))
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_CONCURRENCY = 1
+DEFAULT_TIMEOUT = 120.0
+# an idle worker exits (and frees the model memory) after this many seconds
+DEFAULT_IDLE_TIMEOUT = 1800.0
+START_TIMEOUT = 10.0
+POLL_INTERVAL = 0.05
+# pending connections; multiprocessing's default of 1 stalls concurrent clients
+LISTEN_BACKLOG = 64
+# skip the liveness check when the worker answered this recently
+ALIVE_FOR = 5.0
+KEY_PATH = os.environ.get(
+    "LLM_WORKER_KEY",
+    os.path.join(os.path.expanduser("~"), ".cache", "student_dashboard", "inference_worker.key"),
+)
+
+
+def _authkey(path=KEY_PATH):
+    """Shared secret for the worker socket, created on first use (owner-only)."""
+    try:
+        with open(path, "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # another process created it first
+        with open(path, "rb") as f:
+            return f.read().strip()
+    key = os.urandom(32).hex().encode("ascii")
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def _send(conn, msg):
+    conn.send_bytes(json.dumps(msg).encode("utf-8"))
+
+
+def _recv(conn):
+    return json.loads(conn.recv_bytes().decode("utf-8"))
+
+
+class _Request:
+    def __init__(self, msg):
+        self.prompt = msg.get("prompt") or ""
+        self.backend = msg.get("backend")
+        self.model_path = msg.get("model_path")
+        self.max_tokens = int(msg.get("max_tokens") or 150)
+        self.timeout = float(msg.get("timeout") or DEFAULT_TIMEOUT)
+        self.cancel = threading.Event()
+        # generated text pieces (str), then one final dict
+        self.out = queue.Queue()
+        self.stats = {}
+
+
+class InferenceServer:
+    """The worker process: accepts connections and runs queued generations."""
+
+    def __init__(self, port=DEFAULT_PORT, queue_size=DEFAULT_QUEUE_SIZE, concurrency=DEFAULT_CONCURRENCY,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.address = ("127.0.0.1", int(port))
+        self.concurrency = max(1, int(concurrency))
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener = None
+        self.active = 0
+        self.last_activity = time.monotonic()
+        self.counters = {"served": 0, "failed": 0, "rejected": 0, "timeouts": 0, "cancelled": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+            self.last_activity = time.monotonic()
+
+    def serve_forever(self):
+        self._listener = Listener(self.address, backlog=LISTEN_BACKLOG, authkey=_authkey())
+        for i in range(self.concurrency):
+            threading.Thread(target=self._work, name=f"inference-{i}", daemon=True).start()
+        if self.idle_timeout:
+            threading.Thread(target=self._watch_idle, name="inference-idle", daemon=True).start()
+        while not self._stop.is_set():
+            try:
+                conn = self._listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError):
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        self._listener.close()
+
+    def shutdown(self):
+        self._stop.set()
+        # wake the blocking accept()
+        try:
+            Client(self.address, authkey=_authkey()).close()
+        except Exception:
+            pass
+
+    def _watch_idle(self):
+        while not self._stop.wait(5.0):
+            with self._lock:
+                idle = self.active == 0 and self._queue.empty() and time.monotonic() - self.last_activity > self.idle_timeout
+            if idle:
+                self.shutdown()
+
+    def stats(self):
+        from local_llm import model_cache
+
+        cache = model_cache.stats()
+        with self._lock:
+            return dict(
+                self.counters,
+                pid=os.getpid(),
+                queued=self._queue.qsize(),
+                queue_size=self._queue.maxsize,
+                active=self.active,
+                concurrency=self.concurrency,
+                used_bytes=cache["used_bytes"],
+                models=cache["models"],
+            )
+
+    def _handle(self, conn):
+        try:
+            msg = _recv(conn)
+            op = msg.get("op")
+            if op == "generate":
+                self._serve_generate(conn, _Request(msg))
+            elif op == "stats":
+                _send(conn, self.stats())
+            elif op == "shutdown":
+                _send(conn, {"ok": True})
+                self.shutdown()
+            else:
+                _send(conn, {"done": True, "error": f"Unknown op: {op}"})
+        except (EOFError, OSError, ValueError):
+            pass
+        finally:
+            conn.close()
+
+    def _serve_generate(self, conn, req):
+        try:
+            self._queue.put_nowait(req)
+        except queue.Full:
+            self._count("rejected")
+            _send(conn, {"done": True, "busy": True, "error": "Inference worker queue is full"})
+            return
+        deadline = time.monotonic() + req.timeout
+        try:
+            while True:
+                pieces, final = [], None
+                try:
+                    item = req.out.get(timeout=POLL_INTERVAL)
+                    # forward everything generated since the last poll as one frame
+                    while True:
+                        if isinstance(item, dict):
+                            final = item
+                            break
+                        pieces.append(item)
+                        item = req.out.get_nowait()
+                except queue.Empty:
+                    pass
+                if pieces:
+                    _send(conn, {"text": "".join(pieces)})
+                if final is not None:
+                    _send(conn, final)
+                    return
+                if conn.poll(0):
+                    # the only thing a client sends mid-request is a cancel
+                    self._count("cancelled")
+                    return
+                if time.monotonic() > deadline:
+                    self._count("timeouts")
+                    _send(conn, {"done": True, "error": f"Inference timed out after {req.timeout:.0f}s"})
+                    return
+        finally:
+            # whatever ended the conversation, stop generating for it
+            req.cancel.set()
+
+    def _work(self):
+        # generate here: the dispatching stream_local_llm would send the request back to this worker
+        from local_llm import stream_in_process
+
+        while True:
+            req = self._queue.get()
+            if req.cancel.is_set():
+                continue
+            with self._lock:
+                self.active += 1
+            error = None
+            try:
+                tokens, error = stream_in_process(req.prompt, req.backend, req.model_path, req.max_tokens, stats=req.stats)
+                if tokens is not None:
+                    try:
+                        for tok in tokens:
+                            if req.cancel.is_set():
+                                break
+                            req.out.put(tok)
+                    finally:
+                        # releases the model's generation lock
+                        tokens.close()
+            except Exception as e:
+                error = str(e)
+            with self._lock:
+                self.active -= 1
+            self._count("failed" if error else "served")
+            req.out.put({"done": True, "error": error, "stats": req.stats})
+
+
+class WorkerClient:
+    """Client side of the worker, shared by every session of this server process.
+
+    `enabled` switches local_llm over to the worker. The first request starts
+    the worker process if none answers on `port`; `queue_size` and
+    `concurrency` only apply to a worker started from here. These are the
+    operator's settings (environment variables below), not any one session's:
+
+        LLM_WORKER=1  LLM_WORKER_TIMEOUT=120  LLM_WORKER_QUEUE=8  LLM_WORKER_CONCURRENCY=1
+    """
+
+    def __init__(self, port=DEFAULT_PORT):
+        self.port = port
+        self.enabled = os.environ.get("LLM_WORKER") == "1"
+        self.timeout = float(os.environ.get("LLM_WORKER_TIMEOUT", DEFAULT_TIMEOUT))
+        self.queue_size = int(os.environ.get("LLM_WORKER_QUEUE", DEFAULT_QUEUE_SIZE))
+        self.concurrency = int(os.environ.get("LLM_WORKER_CONCURRENCY", DEFAULT_CONCURRENCY))
+        self.last_error = None
+        self._alive_at = float("-inf")
+        self._proc = None
+        self._stop_registered = False
+        self._lock = threading.Lock()
+
+    @property
+    def address(self):
+        return ("127.0.0.1", int(self.port))
+
+    def _call(self, msg):
+        conn = Client(self.address, authkey=_authkey())
+        try:
+            _send(conn, msg)
+            return _recv(conn)
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Return (stats_dict, error_message); stats is None when no worker answers."""
+        try:
+            stats = self._call({"op": "stats"})
+            self._alive_at = time.monotonic()
+            return stats, None
+        except Exception as e:
+            return None, str(e) or type(e).__name__
+
+    def ensure_started(self, wait=START_TIMEOUT):
+        """Make sure a worker answers on `port`, starting one if needed. Returns (ok, error)."""
+        if time.monotonic() - self._alive_at < ALIVE_FOR or self.stats()[0] is not None:
+            return True, None
+        with self._lock:
+            if self.stats()[0] is not None:
+                return True, None
+            if getattr(sys, "frozen", False):
+                return False, "The inference worker cannot be started from a packaged build; run `python inference_worker.py`"
+            if self._proc is None or self._proc.poll() is not None:
+                script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inference_worker.py")
+                env = dict(os.environ)
+                # the worker generates itself; it must not be a client of a worker
+                env.pop("LLM_WORKER", None)
+                self._proc = subprocess.Popen(
+                    [sys.executable, script, "--port", str(self.port), "--queue", str(self.queue_size),
+                     "--concurrency", str(self.concurrency)],
+                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env,
+                )
+                if not self._stop_registered:
+                    atexit.register(self.stop)
+                    self._stop_registered = True
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline:
+                if self.stats()[0] is not None:
+                    return True, None
+                if self._proc.poll() is not None:
+                    return False, f"Inference worker exited with code {self._proc.returncode}"
+                time.sleep(POLL_INTERVAL)
+        return False, f"Inference worker did not start within {wait:.0f}s"
+
+    def stop(self, wait=5.0):
+        """Shut down the worker this process started; runs at server exit. A worker
+        started by hand is left running."""
+        proc = self._proc
+        if proc is None or proc.poll() is not None:
+            return
+        self._alive_at = float("-inf")
+        try:
+            self._call({"op": "shutdown"})
+            proc.wait(timeout=wait)
+        except Exception:
+            proc.kill()
+
+    def stream(self, prompt, backend, model_path, max_tokens=150, cancel=None):
+        """Generate on the worker. Returns (text_iterator, error_message).
+
+        Start-up errors are returned up front; generation errors and timeouts
+        are raised from the iterator. Setting `cancel` (a threading.Event) or
+        closing the iterator early cancels the request on the worker.
+        """
+        ok, error = self.ensure_started()
+        self.last_error = error
+        if not ok:
+            return None, error
+        request = {"op": "generate", "prompt": prompt, "backend": backend, "model_path": model_path, "max_tokens": int(max_tokens)}
+        return self._pieces(request, cancel), None
+
+    def _pieces(self, request, cancel):
+        deadline = time.monotonic() + self.timeout
+        delay = POLL_INTERVAL
+        while True:
+            conn = Client(self.address, authkey=_authkey())
+            finished = False
+            try:
+                _send(conn, dict(request, timeout=max(1.0, deadline - time.monotonic())))
+                while True:
+                    if not conn.poll(POLL_INTERVAL):
+                        if cancel is not None and cancel.is_set():
+                            return
+                        continue
+                    msg = _recv(conn)
+                    self._alive_at = time.monotonic()
+                    if "text" in msg:
+                        yield msg["text"]
+                        continue
+                    finished = True
+                    if msg.get("busy") and time.monotonic() + delay < deadline:
+                        break
+                    if msg.get("error"):
+                        raise RuntimeError(msg["error"])
+                    return
+            finally:
+                if not finished:
+                    try:
+                        _send(conn, {"op": "cancel"})
+                    except Exception:
+                        pass
+                conn.close()
+            # queue was full: back off and try again
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+
+# Process-wide client: module globals survive reruns because main.py imports us.
+worker_client = WorkerClient()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE_SIZE, help="requests waiting beyond the running ones")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="generations running at once")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT, help="exit after this many idle seconds (0: never)")
+    args = parser.parse_args()
+    InferenceServer(port=args.port, queue_size=args.queue, concurrency=args.concurrency, idle_timeout=args.idle_timeout).serve_forever()
@@ -0,0 +1,324 @@
+"""Desktop launcher for packaged (PyInstaller) builds.
+
+`launch(module)` starts the Streamlit server for the app in-process, waits for
+it to become ready and then opens a native window (pywebview) or the browser.
+Readiness is signalled by Streamlit's server-start hook, with the
+/_stcore/health endpoint polled on a short backoff as a fallback, so the
+window opens as soon as the server answers instead of on the next half-second
+poll.
+
+When the app source is only reachable through `inspect.getsource`, it is
+written once to a content-addressed cache and compiled to bytecode there;
+later launches run the cached bytecode through a small loader script.
+
+    python launcher.py --benchmark [--runs 5] [--command "StudentDashboard.exe"]
+
+reports spawn -> server ready -> first paint timings as JSON.
+"""
+import argparse
+import hashlib
+import importlib.util
+import inspect
+import json
+import math
+import os
+import py_compile
+import shlex
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import webbrowser
+
+DEFAULT_PORT = 8501
+DEFAULT_WAIT_TIMEOUT = 15.0
+SOURCE_CACHE_DIR = os.environ.get(
+    "LAUNCHER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "student_dashboard", "launcher"),
+)
+# the previous launcher slept this long between connection attempts
+LEGACY_POLL_INTERVAL = 0.5
+
+_LOADER = '''# Generated by launcher.py: runs the cached bytecode of {source!r}
+import importlib.util
+import marshal
+# asset paths in the app (e.g. the cookie reader component) resolve against its own location
+__file__ = {app_file!r}
+try:
+    with open({pyc!r}, "rb") as _f:
+        if _f.read(4) != importlib.util.MAGIC_NUMBER:
+            raise ValueError("stale bytecode")
+        _f.seek(16)
+        _code = marshal.load(_f)
+except (OSError, ValueError, EOFError):
+    with open({source!r}, encoding="utf-8") as _f:
+        _code = compile(_f.read(), __file__, "exec")
+exec(_code)
+'''
+
+# health checks go straight to localhost, never through an HTTP(S)_PROXY
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def server_is_healthy(port, timeout=0.5):
+    try:
+        with _opener.open(f"http://127.0.0.1:{port}/_stcore/health", timeout=timeout) as resp:
+            return resp.status == 200
+    except Exception:
+        return False
+
+
+def wait_until_ready(port, ready=None, timeout=DEFAULT_WAIT_TIMEOUT, alive=None):
+    """Block until the server is ready. Returns False on timeout or if `alive()` turns False.
+
+    `ready` is an optional threading.Event set by the server-start hook; the
+    health endpoint is checked in between with a 10-100 ms backoff.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while time.monotonic() < deadline:
+        if ready is not None:
+            if ready.wait(delay):
+                return True
+        else:
+            time.sleep(delay)
+        if server_is_healthy(port):
+            return True
+        if alive is not None and not alive():
+            return False
+        delay = min(delay * 2, 0.1)
+    return False
+
+
+def _write_atomic(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _pyc_is_current(pyc):
+    try:
+        with open(pyc, "rb") as f:
+            return f.read(4) == importlib.util.MAGIC_NUMBER
+    except OSError:
+        return False
+
+
+def cached_script_for_source(src, app_file=None, cache_dir=SOURCE_CACHE_DIR):
+    """Write `src` once per content hash (and interpreter) and return a loader script path.
+
+    The source is compiled to a .pyc next to it, and the loader script Streamlit
+    runs just executes that bytecode, so repeat launches neither rewrite a temp
+    file nor recompile the app. The loader runs the code with `__file__` set to
+    `app_file` (where the app's assets live), and compiles the cached source
+    instead if the bytecode is missing or from another interpreter.
+    """
+    app_file = app_file or os.path.join(os.getcwd(), "main.py")
+    digest = hashlib.sha256(importlib.util.MAGIC_NUMBER + app_file.encode("utf-8") + b"\0" + src.encode("utf-8")).hexdigest()[:16]
+    folder = os.path.join(cache_dir, digest)
+    os.makedirs(folder, exist_ok=True)
+    source = os.path.join(folder, "app.py")
+    pyc = os.path.join(folder, "app.pyc")
+    loader = os.path.join(folder, "run.py")
+    if not (os.path.exists(loader) and os.path.exists(source) and _pyc_is_current(pyc)):
+        _write_atomic(source, src)
+        try:
+            py_compile.compile(source, cfile=pyc, dfile=app_file, doraise=True)
+        except Exception:
+            # the loader falls back to compiling the source
+            pass
+        _write_atomic(loader, _LOADER.format(source=source, pyc=pyc, app_file=app_file))
+    return loader
+
+
+def resolve_script_path(module):
+    """A .py path Streamlit can run for `module`, or None if no source is available."""
+    path = getattr(module, "__file__", None)
+    if path and path.endswith(".py") and os.path.exists(path):
+        return os.path.abspath(path)
+    # PyInstaller bundles can ship the script as data next to the extracted modules
+    bundled = os.path.join(getattr(sys, "_MEIPASS", ""), os.path.basename(path or "main.py"))
+    if getattr(sys, "_MEIPASS", None) and bundled.endswith(".py") and os.path.exists(bundled):
+        return bundled
+    try:
+        src = inspect.getsource(module)
+    except Exception:
+        return None
+    # assets ship next to the script: in the bundle directory when frozen
+    base = getattr(sys, "_MEIPASS", None) or os.path.dirname(os.path.abspath(path or "main.py"))
+    try:
+        return cached_script_for_source(src, app_file=os.path.join(base, os.path.basename(path or "main.py")))
+    except Exception:
+        return None
+
+
+def start_server(path, port, ready):
+    """Start Streamlit for `path` and return an `alive()` callable.
+
+    The server runs on a background thread of this process so the main thread
+    stays free for the GUI; `ready` is set from Streamlit's server-start hook.
+    Falls back to a subprocess when the CLI cannot be imported.
+    """
+    # the bundle's working directory has no .streamlit/config.toml, so pass what it sets
+    argv = ["run", path, "--server.port", str(port), "--server.headless", "true", "--server.maxUploadSize", "2048"]
+    try:
+        from streamlit.web import bootstrap
+        from streamlit.web import cli as stcli
+    except Exception:
+        proc = subprocess.Popen([sys.executable, "-m", "streamlit"] + argv, env=os.environ.copy())
+        return lambda: proc.poll() is None
+
+    on_server_start = getattr(bootstrap, "_on_server_start", None)
+    if on_server_start is not None:
+        def _signal_ready(server):
+            on_server_start(server)
+            ready.set()
+
+        bootstrap._on_server_start = _signal_ready
+    # signal handlers can only be installed from the main thread, which belongs to the GUI
+    bootstrap._set_up_signal_handler = lambda server: None
+
+    def run():
+        old_argv = sys.argv
+        sys.argv = [old_argv[0]] + argv
+        try:
+            stcli.main()
+        except BaseException:
+            # click ends with SystemExit; a failed start shows up as alive() == False
+            pass
+        finally:
+            sys.argv = old_argv
+
+    t = threading.Thread(target=run, name="streamlit-server", daemon=True)
+    t.start()
+    return t.is_alive
+
+
+def open_window(url):
+    """Open `url` in a pywebview window (blocking until closed). Returns False if unavailable."""
+    try:
+        import webview
+    except Exception:
+        return False
+    try:
+        webview.create_window("Student Dashboard", url, width=1100, height=800)
+        webview.start()
+        return True
+    except Exception:
+        return False
+
+
+def launch(module):
+    """Run the packaged app: reuse a running server or start one, then show it."""
+    port = int(os.environ.get("STREAMLIT_PORT", str(DEFAULT_PORT)))
+    url = f"http://localhost:{port}"
+    # If the port is already serving the app, open it and exit.
+    if server_is_healthy(port):
+        webbrowser.open(url)
+        sys.exit(0)
+
+    run_path = resolve_script_path(module)
+    if not run_path:
+        return
+    # the server runs this same script in-process; it must not launch again
+    os.environ["LAUNCHED_BY_STREAMLIT"] = "1"
+    ready = threading.Event()
+    alive = start_server(run_path, port, ready)
+    timeout = float(os.environ.get("LAUNCHER_WAIT_TIMEOUT", DEFAULT_WAIT_TIMEOUT))
+    server_ready = wait_until_ready(port, ready=ready, timeout=timeout, alive=alive)
+
+    if os.environ.get("LAUNCHER_NO_WINDOW") != "1":
+        if server_ready and open_window(url):
+            sys.exit(0)
+        # no native window (or the server is slow): the browser can retry on its own
+        try:
+            webbrowser.open(url)
+        except Exception:
+            pass
+    # keep the process (and the server thread) alive until the server stops
+    while alive():
+        time.sleep(1.0)
+    sys.exit(0)
+
+
+def _first_paint(port, timeout=60.0):
+    """Open an app session over the websocket; return (first_delta_s, script_finished_s)."""
+    from websockets.sync.client import connect
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    start = time.perf_counter()
+    first_delta = None
+    with connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"], open_timeout=timeout) as ws:
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        ws.send(msg.SerializeToString())
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(ws.recv(timeout=timeout))
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and first_delta is None:
+                first_delta = time.perf_counter() - start
+            if kind == "script_finished":
+                return first_delta, time.perf_counter() - start
+
+
+def benchmark_startup(command=None, script=None, port=8599, runs=5, timeout=60.0):
+    """Spawn the app `runs` times and time readiness and first paint.
+
+    `command` launches a packaged build (it gets STREAMLIT_PORT and
+    LAUNCHER_NO_WINDOW=1); by default `script` is served with `streamlit run`.
+    Times are seconds from spawn. `legacy_ready_s` is when the previous
+    0.5 s polling loop would have noticed the same server.
+    """
+    script = script or os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    env = dict(os.environ, STREAMLIT_PORT=str(port), LAUNCHER_NO_WINDOW="1")
+    if command is None:
+        env["LAUNCHED_BY_STREAMLIT"] = "1"
+        command = [sys.executable, "-m", "streamlit", "run", script, "--server.port", str(port), "--server.headless", "true"]
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            ready = None
+            while time.perf_counter() - start < timeout and proc.poll() is None:
+                if server_is_healthy(port, timeout=0.2):
+                    ready = time.perf_counter() - start
+                    break
+                time.sleep(0.005)
+            if ready is None:
+                raise RuntimeError(f"Server did not become ready within {timeout:.0f}s")
+            first_delta, finished = _first_paint(port, timeout=timeout)
+            samples.append({
+                "ready_s": ready,
+                "legacy_ready_s": math.ceil(ready / LEGACY_POLL_INTERVAL) * LEGACY_POLL_INTERVAL,
+                "first_paint_s": ready + first_delta,
+                "first_run_done_s": ready + finished,
+            })
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    summary = {k: statistics.median(s[k] for s in samples) for k in samples[0]}
+    return {"runs": runs, "command": command, "median": summary, "samples": samples}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--benchmark", action="store_true", help="time spawn -> ready -> first paint")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--command", help="packaged executable to benchmark instead of `streamlit run main.py`")
+    args = parser.parse_args()
+    if args.benchmark:
+        result = benchmark_startup(command=shlex.split(args.command) if args.command else None, port=args.port, runs=args.runs)
+        print(json.dumps(result, indent=2))
+    else:
+        parser.print_help()
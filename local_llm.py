@@ -0,0 +1,508 @@
+"""Local LLM helpers shared by every Streamlit rerun and browser session.
+
+Streamlit re-executes main.py on each interaction, so state that has to outlive
+a rerun (loaded model weights in particular) lives in this imported module.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from inference_worker import worker_client
+
+DEFAULT_CACHE_BUDGET_MB = int(os.environ.get("MODEL_CACHE_BUDGET_MB", "8192"))
+DEFAULT_RESPONSE_CACHE_DIR = os.environ.get(
+    "LLM_RESPONSE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "student_dashboard", "llm_responses"),
+)
+# the response cache is shared by every session, so its limits are the operator's
+DEFAULT_RESPONSE_CACHE_TTL_DAYS = float(os.environ.get("LLM_CACHE_TTL_DAYS", "30"))
+DEFAULT_RESPONSE_CACHE_MAX_MB = float(os.environ.get("LLM_CACHE_MAX_MB", "50"))
+
+
+def _estimate_model_bytes(backend, model_path):
+    """Best-effort on-disk size of a model, used to charge the cache budget."""
+    candidates = [model_path]
+    if backend == "gpt4all" and model_path and not os.path.isabs(model_path):
+        # gpt4all resolves bare model names against its download folder
+        candidates.append(os.path.join(os.path.expanduser("~"), ".cache", "gpt4all", model_path))
+    for p in candidates:
+        try:
+            if p and os.path.isfile(p):
+                return os.path.getsize(p)
+        except OSError:
+            pass
+    return 0
+
+
+def _load_model(backend, model_path, options):
+    if backend == "gpt4all":
+        from gpt4all import GPT4All
+        # model_path may be a model name or path depending on gpt4all installation
+        return GPT4All(model_name=model_path or "", **options)
+    if backend == "llama_cpp":
+        from llama_cpp import Llama
+        return Llama(model_path=model_path, **options)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def _close_model(model):
+    close = getattr(model, "close", None)
+    if callable(close):
+        try:
+            close()
+        except Exception:
+            pass
+
+
+def _close_models(models):
+    # called outside the cache lock: closing can take a while
+    for model in models:
+        _close_model(model)
+
+
+class ModelCache:
+    """Thread-safe LRU cache of loaded models, bounded by a memory budget.
+
+    Entries are keyed by (backend, model_path, load options). When the summed
+    size of cached models exceeds the budget, least recently used models are
+    evicted; the model that was just requested is always kept.
+
+    `get` checks a model out; callers hand it back with `release` once they
+    are done generating. An evicted model that is still checked out is closed
+    by its last `release` rather than under a running generation.
+    """
+
+    def __init__(self, budget_mb=DEFAULT_CACHE_BUDGET_MB):
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._entries = OrderedDict()
+        # id(model) -> checkouts not yet released, and evicted models waiting for them
+        self._users = {}
+        self._retired = {}
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def _lookup_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            entry["last_used"] = time.time()
+            self.hits += 1
+            self._checkout_locked(entry["model"])
+        return entry
+
+    def _checkout_locked(self, model):
+        self._users[id(model)] = self._users.get(id(model), 0) + 1
+
+    def get(self, backend, model_path, **options):
+        """Check out a loaded model, loading (and caching) it on a miss. Pair with release()."""
+        key = (backend, model_path or "", tuple(sorted(options.items())))
+        with self._lock:
+            entry = self._lookup_locked(key)
+            if entry is not None:
+                return entry["model"]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        # Only one thread loads a given model; others wait and then hit the cache.
+        with load_lock:
+            with self._lock:
+                entry = self._lookup_locked(key)
+                if entry is not None:
+                    return entry["model"]
+                self.misses += 1
+            try:
+                start = time.perf_counter()
+                model = _load_model(backend, model_path, options)
+                elapsed = time.perf_counter() - start
+            finally:
+                with self._lock:
+                    self._load_locks.pop(key, None)
+            with self._lock:
+                self.load_seconds += elapsed
+                self._entries[key] = {
+                    "model": model,
+                    "bytes": _estimate_model_bytes(backend, model_path),
+                    "load_seconds": elapsed,
+                    "last_used": time.time(),
+                }
+                self._checkout_locked(model)
+                idle = self._evict_locked(keep=key)
+        _close_models(idle)
+        return model
+
+    def release(self, model):
+        """Hand back a model from get(); closes it if it was evicted meanwhile."""
+        with self._lock:
+            left = self._users.get(id(model), 0) - 1
+            if left > 0:
+                self._users[id(model)] = left
+                return
+            self._users.pop(id(model), None)
+            retired = self._retired.pop(id(model), None)
+        if retired is not None:
+            _close_model(retired)
+
+    def _evict_locked(self, keep=None):
+        """Drop least recently used entries until the budget fits. Returns the idle models to close."""
+        used = sum(e["bytes"] for e in self._entries.values())
+        idle = []
+        for key in list(self._entries.keys()):
+            if used <= self.budget_bytes:
+                break
+            if key == keep:
+                continue
+            entry = self._entries.pop(key)
+            used -= entry["bytes"]
+            self.evictions += 1
+            self._retire_locked(entry["model"], idle)
+        return idle
+
+    def _retire_locked(self, model, idle):
+        if self._users.get(id(model)):
+            self._retired[id(model)] = model
+        else:
+            idle.append(model)
+
+    def clear(self):
+        idle = []
+        with self._lock:
+            for entry in self._entries.values():
+                self._retire_locked(entry["model"], idle)
+            self._entries.clear()
+        _close_models(idle)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "load_seconds": self.load_seconds,
+                "avg_load_seconds": (self.load_seconds / self.misses) if self.misses else 0.0,
+                "used_bytes": sum(e["bytes"] for e in self._entries.values()),
+                "budget_bytes": self.budget_bytes,
+                "models": [
+                    {
+                        "backend": key[0],
+                        "model": key[1],
+                        "size_mb": round(e["bytes"] / (1024 * 1024), 1),
+                        "load_seconds": round(e["load_seconds"], 2),
+                    }
+                    for key, e in reversed(self._entries.items())
+                ],
+            }
+
+
+# Process-wide cache: module globals survive reruns because main.py imports us.
+model_cache = ModelCache()
+
+_generation_locks = {}
+_generation_locks_guard = threading.Lock()
+
+
+def generation_lock(backend, model_path):
+    """Lock serializing generation on one loaded model; backends are not thread-safe."""
+    key = ((backend or "").lower(), model_path or "")
+    with _generation_locks_guard:
+        return _generation_locks.setdefault(key, threading.Lock())
+
+
+def _model_identity(backend, model_path):
+    """Identify the model file so a replaced/re-downloaded model invalidates responses."""
+    candidates = [model_path]
+    if backend == "gpt4all" and model_path and not os.path.isabs(model_path):
+        candidates.append(os.path.join(os.path.expanduser("~"), ".cache", "gpt4all", model_path))
+    for p in candidates:
+        try:
+            if p and os.path.isfile(p):
+                st_ = os.stat(p)
+                return f"{os.path.abspath(p)}:{st_.st_size}:{st_.st_mtime_ns}"
+        except OSError:
+            pass
+    return model_path or ""
+
+
+def response_cache_key(prompt, backend, model_path, max_tokens):
+    ident = json.dumps([prompt, (backend or "").lower(), _model_identity(backend, model_path), int(max_tokens)])
+    return hashlib.sha256(ident.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """On-disk prompt -> response cache with TTL and size-based eviction.
+
+    Each entry is one small JSON file named by its key. File mtimes double as
+    last-access times, so eviction drops the least recently read entries first.
+    """
+
+    def __init__(self, directory=DEFAULT_RESPONSE_CACHE_DIR, ttl_days=DEFAULT_RESPONSE_CACHE_TTL_DAYS,
+                 max_mb=DEFAULT_RESPONSE_CACHE_MAX_MB):
+        self.directory = directory
+        self.ttl_seconds = ttl_days * 86400
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached entry dict ({"text", "created", ...}) or None."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except Exception:
+            with self._lock:
+                self.misses += 1
+            return None
+        if time.time() - entry.get("created", 0) > self.ttl_seconds:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key, text, **meta):
+        entry = dict(meta, text=text, created=time.time())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self._path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, self._path(key))
+            self.evict()
+        except Exception:
+            # caching is best-effort; never fail the feedback request over it
+            pass
+
+    def _scan(self):
+        files = []
+        try:
+            with os.scandir(self.directory) as it:
+                for de in it:
+                    if de.name.endswith(".json"):
+                        try:
+                            s = de.stat()
+                            files.append((s.st_mtime, s.st_size, de.path))
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+        return files
+
+    def evict(self):
+        """Drop expired entries, then the least recently used until under the size cap."""
+        now = time.time()
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            if total <= self.max_bytes and now - mtime <= self.ttl_seconds:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for _, _, path in self._scan():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        files = self._scan()
+        with self._lock:
+            return {
+                "entries": len(files),
+                "bytes": sum(size for _, size, _ in files),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def run_local_llm(prompt, backend, model_path, max_tokens=150):
+    """Run a local LLM backend. Returns (output, error_message).
+    Tries gpt4all first if selected, then llama_cpp if selected.
+    Loaded models are reused from `model_cache`, or from the shared inference
+    worker process when `worker_client` is enabled.
+    """
+    if not backend:
+        return None, "No backend selected"
+    if worker_client.enabled:
+        pieces, error = worker_client.stream(prompt, backend, model_path, max_tokens)
+        if pieces is None:
+            return None, error
+        try:
+            return "".join(pieces), None
+        except Exception as e:
+            return None, str(e)
+    backend = backend.lower()
+    if backend == "gpt4all":
+        try:
+            from gpt4all import GPT4All  # noqa: F401
+        except Exception as e:
+            return None, f"gpt4all import failed: {e}"
+        try:
+            model = model_cache.get("gpt4all", model_path)
+            try:
+                # many gpt4all wrappers provide .generate
+                with generation_lock("gpt4all", model_path):
+                    out = model.generate(prompt)
+            finally:
+                model_cache.release(model)
+            if isinstance(out, (list, tuple)):
+                out = out[0]
+            return str(out), None
+        except Exception as e:
+            return None, str(e)
+    elif backend == "llama_cpp":
+        try:
+            from llama_cpp import Llama  # noqa: F401
+        except Exception as e:
+            return None, f"llama_cpp import failed: {e}"
+        try:
+            llm = model_cache.get("llama_cpp", model_path)
+            try:
+                with generation_lock("llama_cpp", model_path):
+                    resp = llm.create(prompt=prompt, max_tokens=max_tokens)
+            finally:
+                model_cache.release(llm)
+            if isinstance(resp, dict) and resp.get("choices"):
+                out = resp["choices"][0].get("text")
+            else:
+                out = str(resp)
+            return out, None
+        except Exception as e:
+            return None, str(e)
+    else:
+        return None, f"Unknown backend: {backend}"
+
+
+def _timed_tokens(tokens, stats, start, lock=None, on_close=None):
+    """Yield from `tokens`, recording time-to-first-token and throughput into `stats`.
+    If `lock` is given it is held for as long as the stream is being consumed;
+    `on_close` is called once the stream is finished or abandoned. Consumers
+    should close() the stream when they stop early so both happen right away.
+    """
+    first = None
+    if lock is not None:
+        lock.acquire()
+    try:
+        for tok in tokens:
+            if not tok:
+                continue
+            if first is None:
+                first = time.perf_counter()
+                stats["ttft_seconds"] = first - start
+            stats["tokens"] += 1
+            yield tok
+    finally:
+        close = getattr(tokens, "close", None)
+        if callable(close):
+            # e.g. cancels a worker request that is still generating
+            try:
+                close()
+            except Exception:
+                pass
+        end = time.perf_counter()
+        stats["total_seconds"] = end - start
+        if first is not None and end > first:
+            stats["tokens_per_second"] = stats["tokens"] / (end - first)
+        if lock is not None:
+            lock.release()
+        if on_close is not None:
+            on_close()
+
+
+def _llama_chunk_text(chunk):
+    if isinstance(chunk, dict) and chunk.get("choices"):
+        return chunk["choices"][0].get("text") or ""
+    return str(chunk)
+
+
+def stream_local_llm(prompt, backend, model_path, max_tokens=150, stats=None):
+    """Streaming variant of run_local_llm. Returns (token_iterator, error_message).
+
+    Import and model-load errors are reported up front; the iterator yields text
+    pieces as the backend generates them. If `stats` is a dict it is filled with
+    ttft_seconds, tokens, tokens_per_second and total_seconds while iterating.
+    """
+    if stats is None:
+        stats = {}
+    stats.update({"ttft_seconds": None, "tokens": 0, "tokens_per_second": 0.0, "total_seconds": 0.0})
+    start = time.perf_counter()
+    if not backend:
+        return None, "No backend selected"
+    if worker_client.enabled:
+        pieces, error = worker_client.stream(prompt, backend, model_path, max_tokens)
+        if pieces is None:
+            return None, error
+        return _timed_tokens(pieces, stats, start), None
+    return stream_in_process(prompt, backend, model_path, max_tokens, stats, start)
+
+
+def stream_in_process(prompt, backend, model_path, max_tokens=150, stats=None, start=None):
+    """stream_local_llm on this process's own model cache, never through the worker.
+
+    This is what the inference worker itself runs.
+    """
+    if stats is None:
+        stats = {}
+    stats.update({"ttft_seconds": None, "tokens": 0, "tokens_per_second": 0.0, "total_seconds": 0.0})
+    if start is None:
+        start = time.perf_counter()
+    if not backend:
+        return None, "No backend selected"
+    backend = backend.lower()
+    if backend == "gpt4all":
+        try:
+            from gpt4all import GPT4All  # noqa: F401
+        except Exception as e:
+            return None, f"gpt4all import failed: {e}"
+        model = None
+        try:
+            model = model_cache.get("gpt4all", model_path)
+            tokens = model.generate(prompt, max_tokens=max_tokens, streaming=True)
+        except Exception as e:
+            if model is not None:
+                model_cache.release(model)
+            return None, str(e)
+    elif backend == "llama_cpp":
+        try:
+            from llama_cpp import Llama  # noqa: F401
+        except Exception as e:
+            return None, f"llama_cpp import failed: {e}"
+        model = None
+        try:
+            model = model_cache.get("llama_cpp", model_path)
+            chunks = model.create_completion(prompt=prompt, max_tokens=max_tokens, stream=True)
+            tokens = (_llama_chunk_text(c) for c in chunks)
+        except Exception as e:
+            if model is not None:
+                model_cache.release(model)
+            return None, str(e)
+    else:
+        return None, f"Unknown backend: {backend}"
+    return _timed_tokens(tokens, stats, start, lock=generation_lock(backend, model_path), on_close=lambda: model_cache.release(model)), None
@@ -1,234 +1,145 @@
-import base64
-import json
 import streamlit as st
-import pandas as pd
 from streamlit.components.v1 import html as components_html
-import re
 import os
-import urllib.request
-import urllib.parse
+import statistics
 import sys
-import tempfile
 import subprocess
 import time
-import webbrowser
-import inspect
-import socket
 
-
-# Launcher: when run directly (or from a PyInstaller bundle), spawn a Streamlit server
-# that serves this file and open the browser. The spawned process receives
-# environment variable `LAUNCHED_BY_STREAMLIT=1` so the app doesn't re-spawn itself.
+from assets import inject_theme
+from course_store import CourseStore
+from downloader import DEFAULT_SEGMENTS, filename_from_url, get_download_job, start_download_job
+from feedback import build_feedback_prompt, get_feedback_job, heuristic_feedback, start_feedback_job
+from grade_engine import ALLOCATION_OBJECTIVES, allocate_deficit, probability_at_least, simulate_gpa, uncertain_grade_count
+from inference_worker import worker_client
+from local_llm import model_cache, response_cache, response_cache_key, run_local_llm, stream_local_llm
+from persistence import (
+    CLIENT_COOKIE_NAME,
+    COOKIE_CHUNK_SIZE,
+    COOKIE_NAME,
+    MAX_COOKIE_CHUNKS,
+    ProfileConflict,
+    client_id_from_cookies,
+    decode_data_from_cookie,
+    encode_data_for_cookie,
+    encode_data_for_cookie_v1,
+    get_sqlite_store,
+    join_cookie_chunks,
+    NO_REVISION_CHECK,
+    migrate_cookie_payload,
+    new_client_id,
+    split_cookie_value,
+)
+from profiler import ENABLED_BY_DEFAULT as PROFILE_BY_DEFAULT, LOG_PATH as PROFILE_LOG_PATH, finish_run, phase, section, set_page, start_run
+
+
+# Launcher: when run from a PyInstaller bundle, start a Streamlit server that serves
+# this file and open a window once it is ready (see launcher.py). The server runs with
+# `LAUNCHED_BY_STREAMLIT=1` so the app doesn't re-spawn itself.
 # This makes a packaged executable behave like "double-click to open app".
 if getattr(sys, "frozen", False) and os.environ.get("LAUNCHED_BY_STREAMLIT") != "1":
-    # Only perform the launcher behavior for frozen (PyInstaller) builds.
     try:
-        # Determine a path to run with streamlit. Prefer the current .py file when available.
-        src_path = None
-        try:
-            src_path = os.path.abspath(__file__)
-        except Exception:
-            src_path = None
-
-        if src_path and src_path.endswith(".py"):
-            run_path = src_path
-        else:
-            # Try to get source from the loaded module and write to a temp file
-            try:
-                src = inspect.getsource(sys.modules[__name__])
-            except Exception:
-                src = None
-
-            if src:
-                tf = tempfile.NamedTemporaryFile(delete=False, suffix=".py", mode="w", encoding="utf-8")
-                tf.write(src)
-                tf.flush()
-                tf.close()
-                run_path = tf.name
-            else:
-                run_path = None
-
-        env = os.environ.copy()
-        env["LAUNCHED_BY_STREAMLIT"] = "1"
-        port = int(env.get("STREAMLIT_PORT", "8501"))
-
-        # If the port is already serving, assume an existing Streamlit server is present; open browser and exit.
-        try:
-            with socket.create_connection(("127.0.0.1", port), timeout=1):
-                webbrowser.open(f"http://localhost:{port}")
-                sys.exit(0)
-        except Exception:
-            # port not in use — continue to spawn
-            pass
-
-        if run_path:
-            # Prefer running Streamlit in-process when possible (avoids subprocess and module resolution issues in frozen apps)
-            try:
-                import threading
-                try:
-                    from streamlit.web import cli as stcli
-                except Exception:
-                    stcli = None
-
-                def start_streamlit_in_thread(path):
-                    try:
-                        old_argv = sys.argv
-                        sys.argv = [old_argv[0], "run", path, "--server.port", str(port), "--server.headless", "true"]
-                        try:
-                            if stcli is not None:
-                                stcli.main()
-                            else:
-                                # fallback to subprocess inside thread
-                                subprocess.run([sys.executable, "-m", "streamlit", "run", path, "--server.port", str(port), "--server.headless", "true"], env=env)
-                        finally:
-                            sys.argv = old_argv
-                    except Exception:
-                        pass
-
-                # Start Streamlit server in background thread so we can run GUI on main thread
-                t = threading.Thread(target=start_streamlit_in_thread, args=(run_path,), daemon=True)
-                t.start()
-
-                # Wait for the server to be ready (poll) before opening UI to avoid blank webview
-                server_ready = False
-                wait_start = time.time()
-                timeout = float(env.get("LAUNCHER_WAIT_TIMEOUT", 15.0))
-                while time.time() - wait_start < timeout:
-                    try:
-                        with socket.create_connection(("127.0.0.1", port), timeout=1):
-                            server_ready = True
-                            break
-                    except Exception:
-                        time.sleep(0.5)
-
-                # Try to open in native window via pywebview if available and server is ready,
-                # otherwise open system browser once ready. If server never became ready, open browser anyway.
-                try:
-                    import webview
-                except Exception:
-                    webview = None
-
-                if server_ready:
-                    try:
-                        if webview is not None:
-                            win = webview.create_window("Student Dashboard", f"http://localhost:{port}", width=1100, height=800)
-                            webview.start()
-                            sys.exit(0)
-                        else:
-                            webbrowser.open(f"http://localhost:{port}")
-                    except Exception:
-                        try:
-                            webbrowser.open(f"http://localhost:{port}")
-                        except Exception:
-                            pass
-                else:
-                    # Server did not appear; open browser anyway in case it comes up later
-                    try:
-                        webbrowser.open(f"http://localhost:{port}")
-                    except Exception:
-                        pass
-
-                # If the thread is running, exit the launcher process to leave server running
-                if t.is_alive():
-                    sys.exit(0)
-            except Exception:
-                # If any error occurs, fall through and allow normal execution
-                pass
+        from launcher import launch
+        launch(sys.modules[__name__])
     except Exception:
         # If anything goes wrong, continue running — streamlit CLI may have invoked us.
         pass
 
 
+# Opt-in rerun profiler (sidebar "Debug timing panel"): the sections and phases below are timed per run
+start_run(st.session_state.get("debug_profiler", PROFILE_BY_DEFAULT))
+section("header")
 
-# App header (styled) + inject small CSS for contrast, colors, and icon nav styling
-components_html(r"""
-<div style='display:flex; align-items:baseline; justify-content:space-between; margin-bottom:12px'>
-    <div>
-        <h1 style='margin:0; font-family: Inter, system-ui, -apple-system, "Segoe UI", Roboto, "Helvetica Neue", Arial; color:#0f172a;'>Academic Success Dashboard</h1>
-        <div style='color:#475569; margin-top:4px'>Visualize courses, track GPA, and get improvement tips.</div>
-    </div>
-    <div style='color:#64748b; font-size:12px'>Your personal academic dashboard</div>
-</div>
-""", height=80)
-
-components_html(r"""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap');
-/* Apply Inter (fallback to system fonts) globally */
-html, body, .stApp, .main, .block-container, .streamlit-expanderHeader, .st-bk, .reportview-container { font-family: 'Inter', system-ui, -apple-system, 'Segoe UI', Roboto, 'Helvetica Neue', Arial !important; color: #0b1220; }
-.app-header { font-family: 'Inter', Arial, sans-serif !important; }
-.dashboard-card { position:relative; background: linear-gradient(180deg,#ffffff,#fbfdff); border-radius:12px; padding:14px 14px 14px 22px; margin:10px 0; box-shadow: 0 6px 18px rgba(11,17,32,0.06); transition: transform .12s ease, box-shadow .12s ease; border: 1px solid #e6edf3; }
-.dashboard-card:hover { transform: translateY(-4px); box-shadow: 0 12px 30px rgba(11,17,32,0.10); }
-.course-name { font-weight:700; color:#0b1220; }
-.grade-badge { display:inline-block; padding:6px 10px; border-radius:999px; color:#fff; font-weight:700; }
-.badge-good { background:#166534; }
-.badge-bad { background:#b91c1c; }
-.nav-icon { font-size:20px; padding:8px 12px; margin:4px; border-radius:8px; cursor:pointer; }
-.nav-icon.selected { background:#f5f5f5; color:#0b1220; }
-table.course-table { width:100%; border-collapse:collapse; }
-table.course-table th, table.course-table td { padding:8px 6px; text-align:left; border-bottom:1px solid #cbd5e1; }
-.stButton>button { border-radius:10px; padding:8px 10px; }
-</style>
-""", height=0)
+# Theme CSS (static/theme.css) + native header; see assets.py
+inject_theme()
+st.markdown(
+    "<div class='app-header'><div><h1>Academic Success Dashboard</h1>"
+    "<div class='app-subtitle'>Visualize courses, track GPA, and get improvement tips.</div></div>"
+    "<div class='app-tagline'>Your personal academic dashboard</div></div>",
+    unsafe_allow_html=True,
+)
 
 # --- Quick templates and page navigation ---
 # Number of course rows is managed in the Edit Courses page and stored in session_state
 
 # (Quick templates removed per request)
 
-# Cookie helpers (encode/decode JSON to base64)
-COOKIE_NAME = "student_dashboard_data"
+# Cookie helpers (encoding lives in persistence.py; these inject the browser side)
+COOKIE_READER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "cookie_reader")
 
-def encode_data_for_cookie(data):
-    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
 
-def decode_data_from_cookie(b64):
-    try:
-        return json.loads(base64.urlsafe_b64decode(b64.encode()).decode())
-    except Exception:
-        return None
+def read_saved_cookie(cookie_name=COOKIE_NAME):
+    """Return (token, source) for the saved cookie payload without reloading the page.
 
-def inject_read_cookie_on_load(cookie_name=COOKIE_NAME):
-        # If query param `data` is missing, read cookie and set it into query string to pass it to Streamlit on reload
-        js = rf"""
-        <script>
-        (function() {{
-            function getCookie(n) {{
-                const v = document.cookie.match('(^|;)\\s*' + n + '\\s*=\\s*([^;]+)');
-                return v ? v.pop() : null;
-            }}
-            const params = new URLSearchParams(window.location.search);
-            if (!params.has('data')) {{
-                const c = getCookie('{COOKIE_NAME}');
-                if (c) {{
-                    params.set('data', c);
-                    window.location.search = params.toString();
-                }}
-            }}
-        }})();
-        </script>
-        """
-        components_html(js, height=0)
-
-def inject_set_cookie_and_reload(data_b64, cookie_name=COOKIE_NAME):
+    Streamlit 1.37+ exposes the request cookies as `st.context.cookies`, so the
+    payload is available on the very first run. Older versions render a small
+    bidirectional component that posts `document.cookie` back to the script;
+    its value arrives on the next rerun, so source is "pending" until then.
+    """
+    cookies = getattr(getattr(st, "context", None), "cookies", None)
+    if cookies is not None:
+        return join_cookie_chunks(dict(cookies), cookie_name), "request"
+    from streamlit.components.v1 import declare_component
+    reader = declare_component("cookie_reader", path=COOKIE_READER_DIR)
+    value = reader(prefix=cookie_name, key="cookie_reader", default=None)
+    if value is None:
+        return None, "pending"
+    return join_cookie_chunks(value, cookie_name), "component"
+
+_CLEAR_CHUNK_COOKIES_JS = rf"""
+      document.cookie.split(';').forEach(function(kv) {{
+        var k = kv.split('=')[0].trim();
+        if (k.indexOf('{COOKIE_NAME}_') === 0) {{
+          document.cookie = k + '=;expires=Thu, 01 Jan 1970 00:00:00 UTC;path=/';
+        }}
+      }});
+"""
+
+def inject_set_cookie(data_b64, cookie_name=COOKIE_NAME):
     days = st.session_state.get("cookie_ttl", 365)
+    sets = "\n".join(
+        f"      document.cookie = '{name}=' + '{value}' + ';expires=' + d.toUTCString() + ';path=/';"
+        for name, value in split_cookie_value(data_b64, cookie_name)
+    )
     js = rf"""
     <script>
     (function(){{
       var d = new Date(); d.setTime(d.getTime() + ({days}*24*60*60*1000));
-      document.cookie = '{COOKIE_NAME}=' + '{data_b64}' + ';expires=' + d.toUTCString() + ';path=/';
-      // reload without data param so the read-on-load picks cookie
-      window.location = window.location.pathname;
+{_CLEAR_CHUNK_COOKIES_JS}
+{sets}
+    }})();
+    </script>
+    """
+    components_html(js, height=0)
+
+def inject_client_cookie(client_id):
+    js = rf"""
+    <script>
+    (function(){{
+      document.cookie = '{CLIENT_COOKIE_NAME}={client_id};max-age={10 * 365 * 24 * 60 * 60};path=/;SameSite=Lax';
     }})();
     </script>
     """
     components_html(js, height=0)
 
+
+def browser_client_id():
+    """This browser's random id, kept in a cookie; a new browser gets one on its first run."""
+    client_id = st.session_state.get("client_id")
+    if client_id is None:
+        client_id = client_id_from_cookies(getattr(getattr(st, "context", None), "cookies", None))
+        if client_id is None:
+            client_id = new_client_id()
+            inject_client_cookie(client_id)
+        st.session_state["client_id"] = client_id
+    return client_id
+
 def inject_clear_cookie_and_reload(cookie_name=COOKIE_NAME):
     js = rf"""
     <script>
     (function(){{
         document.cookie = '{COOKIE_NAME}=;expires=Thu, 01 Jan 1970 00:00:00 UTC;path=/';
+{_CLEAR_CHUNK_COOKIES_JS}
         window.location = window.location.pathname;
     }})();
     </script>
@@ -238,12 +149,17 @@ def inject_clear_cookie_and_reload(cookie_name=COOKIE_NAME):
 
 def safe_rerun():
     """Compatibility wrapper for Streamlit rerun across versions.
-    Tries to call `st.experimental_rerun()` if present. If not available,
-    attempt to raise Streamlit's internal RerunException. As a last resort,
-    call `st.stop()` to halt execution (changes to session state will persist).
+    Tries `st.rerun()` (a full-app rerun, also from inside a fragment), then
+    `st.experimental_rerun()`. If neither is available, attempt to raise
+    Streamlit's internal RerunException. As a last resort, call `st.stop()`
+    to halt execution (changes to session state will persist).
     """
+    rerun = getattr(st, "rerun", None)
+    if rerun is not None:
+        # raises Streamlit's rerun control-flow exception, which must propagate
+        rerun()
     try:
-        # Preferred API when available
+        # Preferred API on older versions
         st.experimental_rerun()
         return
     except Exception:
@@ -265,56 +181,244 @@ def safe_rerun():
                 # If even st.stop() isn't available, raise a generic exception
                 raise RuntimeError("Could not trigger Streamlit rerun or stop")
 
-# Breakdown parser (moved up so Edit Courses can auto-import)
-def parse_breakdown_lines(raw):
-    comps = []
-    if not raw:
-        return comps
-    for line in raw.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        parts = re.split(r'[:;,]', line)
-        if len(parts) >= 3:
-            name = parts[0].strip()
-            try:
-                weight = float(parts[1].strip())
-                grade = float(parts[2].strip())
-            except Exception:
-                continue
-            comps.append({"name": name, "weight": weight, "grade": grade})
-    return comps
+PROFILE_HISTORY = 20
+
+
+def format_bytes(n):
+    n = float(n or 0)
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def open_folder(path):
+    """Open `path` in the system file manager. Returns an error message or None."""
+    try:
+        if sys.platform.startswith("win"):
+            os.startfile(path)
+        else:
+            subprocess.run(["open" if sys.platform == "darwin" else "xdg-open", path], check=True)
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def lazy_download_button(label, make_data, file_name, mime, key):
+    """Download button whose payload is only built when it is clicked.
+    Streamlit versions with deferred downloads take `make_data` as the data;
+    older ones get a "Prepare" button so the payload is not rebuilt on every render.
+    """
+    try:
+        from streamlit.runtime.media_file_manager import MediaFileManager
+        deferred = hasattr(MediaFileManager, "add_deferred")
+    except Exception:
+        deferred = False
+    if deferred:
+        return st.download_button(label, make_data, file_name=file_name, mime=mime, key=key)
+    if st.button(f"Prepare: {label}", key=f"{key}_prepare"):
+        data = make_data()
+        # a file object can only be read once; keep its contents across reruns
+        st.session_state[f"{key}_payload"] = data.read() if hasattr(data, "read") else data
+    if f"{key}_payload" in st.session_state:
+        return st.download_button(label, st.session_state[f"{key}_payload"], file_name=file_name, mime=mime, key=key)
+    return False
+
+
+def cookie_payload_sizes():
+    """Cookie payload sizes for the Settings caption, recomputed only when the store changes."""
+    cached = st.session_state.get("cookie_payload_sizes")
+    if cached is None or cached["version"] != store.version:
+        records = store.to_records()
+        token = encode_data_for_cookie({"courses": records})
+        cached = {
+            "version": store.version,
+            "bytes": len(token),
+            "cookies": len(split_cookie_value(token)),
+            "legacy_bytes": len(encode_data_for_cookie_v1({"courses": records})),
+        }
+        st.session_state["cookie_payload_sizes"] = cached
+    return cached
+
+
+def render_profile_panel(profile):
+    """Sidebar table of a finished run's phase timings, with totals of the last PROFILE_HISTORY runs."""
+    history = st.session_state.setdefault("rerun_profiles", [])
+    history.append(profile)
+    del history[:-PROFILE_HISTORY]
+    with st.sidebar.expander("Rerun timings", expanded=True):
+        widgets = "?" if profile["widgets"] is None else profile["widgets"]
+        st.caption(f"{profile['page']}: {profile['total_ms']:.0f} ms — {widgets} widgets — {profile['state_reads']} session-state reads")
+        phases = sorted(profile["phases_ms"].items(), key=lambda kv: -kv[1])
+        st.dataframe([{"phase": name, "ms": round(ms, 1)} for name, ms in phases], hide_index=True)
+        totals = [p["total_ms"] for p in history]
+        st.caption(f"Last {len(totals)} run(s): median {statistics.median(totals):.0f} ms, slowest {max(totals):.0f} ms")
+        if st.checkbox("Append runs to the profile log", key="debug_profiler_log"):
+            st.caption(f"Logging to {PROFILE_LOG_PATH}")
+
+
+def fragment(run_every=None):
+    """Compatibility wrapper for Streamlit fragments across versions.
+    Uses `st.fragment` (or `st.experimental_fragment`) when present so the
+    decorated function can rerun on its own; otherwise the function simply
+    runs inline as part of the full script.
+    """
+    frag = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
 
-# Attempt to load data from query param (populated by cookie-read JS) or show read-cookie injector
-loaded_from_cookie = False
-params = st.query_params
+    def decorate(func):
+        if frag is None:
+            return func
+        try:
+            return frag(run_every=run_every)(func)
+        except TypeError:
+            return frag(func)
+
+    return decorate
+
+section("hydrate")
+# Hydrate saved cookie data once per session, straight into the running script (no page reload)
+session_started = st.session_state.setdefault("session_started", time.perf_counter())
 initial_courses = None
-if "data" in params:
-    parsed = decode_data_from_cookie(params.get("data")[0])
+hydration = st.session_state.get("cookie_hydration")
+if hydration is None or hydration["source"] == "pending":
+    params = st.query_params
+    if "data" in params:
+        # links from the old reload-based reader carry the payload in the URL; keep accepting them
+        data_param = params.get("data")
+        # older Streamlit returned a list per query param, newer returns the string
+        token, source = (data_param[0] if isinstance(data_param, list) else data_param), "url"
+        del st.query_params["data"]
+    else:
+        token, source = read_saved_cookie()
+    parsed = decode_data_from_cookie(token) if token else None
     if parsed and isinstance(parsed, dict) and parsed.get("courses"):
         initial_courses = parsed["courses"]
-        loaded_from_cookie = True
-else:
-    inject_read_cookie_on_load()
-
-# If cookie provided initial courses, populate session_state defaults (do not overwrite existing values)
-if initial_courses:
-    for i, c in enumerate(initial_courses):
-        if f"name_{i}" not in st.session_state:
-            st.session_state[f"name_{i}"] = c.get("name", "")
-        if f"credits_{i}" not in st.session_state:
-            st.session_state[f"credits_{i}"] = int(c.get("credits", 0))
-        if f"grade_{i}" not in st.session_state:
-            st.session_state[f"grade_{i}"] = float(c.get("grade", 0.0))
-        # keep raw breakdown for reference (not auto-parsed)
-        if f"breakdown_raw_{i}" not in st.session_state:
-            st.session_state[f"breakdown_raw_{i}"] = c.get("breakdown_raw", "")
-
-# default rows if not set
-default_rows = max(1, len(initial_courses) if initial_courses else 3)
-if "rows" not in st.session_state:
-    st.session_state["rows"] = default_rows
+    hydration = {"source": source, "found": initial_courses is not None, "ms": (time.perf_counter() - session_started) * 1000}
+    st.session_state["cookie_hydration"] = hydration
+
+def persistence_backend():
+    """"cookie" (browser) or "sqlite" (server store); STUDENT_DASHBOARD_BACKEND sets the default."""
+    return st.session_state.get("persistence_backend", os.environ.get("STUDENT_DASHBOARD_BACKEND", "cookie"))
+
+
+def server_profile():
+    """The typed-in or ?profile= profile name; otherwise one private to this browser."""
+    return st.session_state.get("server_profile") or st.query_params.get("profile") or f"browser-{browser_client_id()}"
+
+
+def mark_server_synced(current, revision):
+    st.session_state["sqlite_saved"] = {"profile": server_profile(), "stamps": list(current.course_versions), "version": current.version, "revision": revision}
 
+
+def save_to_server(full=False, overwrite=False):
+    """Upsert the courses changed since the last server save for the current profile.
+
+    The save is refused if another session saved the profile since this one
+    loaded or saved it (unless `overwrite`). Returns an error message or None.
+    """
+    profile = server_profile()
+    saved = st.session_state.get("sqlite_saved") or {}
+    same_profile = saved.get("profile") == profile
+    stamps = None if full or not same_profile else saved.get("stamps")
+    expected = saved.get("revision") if same_profile and not overwrite else NO_REVISION_CHECK
+    try:
+        stamps, revision = get_sqlite_store().save_changes(profile, store, stamps, expected_revision=expected)
+    except ProfileConflict as e:
+        st.session_state["sqlite_saved"] = dict(saved, conflict=e.revision)
+        return str(e)
+    st.session_state["sqlite_saved"] = {"profile": profile, "stamps": stamps, "version": store.version, "revision": revision}
+    return None
+
+
+def attach_server_profile():
+    """Switch to the server profile: load it if it exists, otherwise seed it from the current courses."""
+    if persistence_backend() != "sqlite":
+        return
+    current = st.session_state["course_store"]
+    records, revision = get_sqlite_store().load_snapshot(server_profile())
+    if records is None:
+        _, revision = get_sqlite_store().save_changes(server_profile(), current)
+    else:
+        current.replace(records or [{}])
+    mark_server_synced(current, revision)
+
+
+section("course_store")
+# The course store is the single source of truth for course data; cookie data only seeds a new session
+previous_generation = 0
+placeholder = st.session_state.get("course_store")
+if initial_courses and placeholder is not None and st.session_state.get("course_store_untouched") == placeholder.version:
+    # the component reader answered after the first run built an empty store; swap it before any edits
+    previous_generation = st.session_state.pop("course_store").generation
+if "course_store" not in st.session_state:
+    seed = initial_courses
+    if persistence_backend() == "sqlite":
+        # first visit with the server store: migrate any cookie payload, then load the profile
+        if initial_courses and migrate_cookie_payload(encode_data_for_cookie({"courses": initial_courses}), get_sqlite_store(), server_profile()):
+            st.toast(f"Moved cookie data into server profile '{server_profile()}'")
+        records, seed_revision = get_sqlite_store().load_snapshot(server_profile())
+        seed = records or seed
+    st.session_state["course_store"] = CourseStore.from_dict(seed or [{} for _ in range(3)])
+    # keep widget keys unique if this replaces a placeholder store
+    st.session_state["course_store"].generation += previous_generation
+    if hydration["source"] == "pending":
+        st.session_state["course_store_untouched"] = st.session_state["course_store"].version
+    if persistence_backend() == "sqlite":
+        # a profile that does not exist yet is created by the first save (revision None)
+        mark_server_synced(st.session_state["course_store"], seed_revision)
+store = st.session_state["course_store"]
+default_rows = max(1, len(store))
+
+
+def autosave_if_changed():
+    """Autosave: server saves are row-level upserts of the changed courses and never reload the page."""
+    if st.session_state.get("autosave", False) and persistence_backend() == "sqlite":
+        saved = st.session_state.get("sqlite_saved") or {}
+        # after a conflict, wait for the user to reload or overwrite (Settings)
+        if saved.get("version") != store.version and "conflict" not in saved:
+            save_to_server()
+
+
+def _write_back(key, on_set):
+    on_set(st.session_state[key])
+
+
+def store_input(widget, label, key, value, on_set, **kwargs):
+    """Render `widget` bound to a course-store value.
+    The widget is seeded from the store the first time its key is seen and
+    writes edits back through `on_set`. Keys carry the store generation so a
+    bulk replacement (import, cookie load) re-seeds every bound widget.
+    """
+    key = f"{key}_g{store.generation}"
+    if key not in st.session_state:
+        st.session_state[key] = value
+    return widget(label, key=key, on_change=_write_back, args=(key, on_set), **kwargs)
+
+
+def course_difficulty():
+    """Per-course difficulty {row: value} for the current store. Rows are only stable
+    within a store generation, so an import or load starts over; rows cut off by
+    shrinking the course count are dropped."""
+    saved = st.session_state.get("course_difficulty")
+    if saved is None or saved[0] != store.generation:
+        saved = (store.generation, {})
+        st.session_state["course_difficulty"] = saved
+    values = saved[1]
+    for i in [i for i in values if i >= len(store)]:
+        del values[i]
+    return values
+
+
+def _set_comp_count(i, n):
+    store.resize_components(i, int(n))
+    if store.component_count(i) != int(n):
+        # an emptied course re-imported its raw breakdown; drop stale component widget state
+        prefixes = tuple(f"{field}_{i}_" for field in ("comp_name", "comp_weight", "comp_grade"))
+        for k in [k for k in st.session_state.keys() if k.startswith(prefixes)]:
+            del st.session_state[k]
+        st.session_state[f"comp_count_{i}_g{store.generation}"] = store.component_count(i)
+
+section("navigation")
 # Sidebar page navigation as icon buttons
 if "page" not in st.session_state:
     st.session_state["page"] = "Dashboard"
@@ -326,276 +430,381 @@ if st.sidebar.button("✏️ Edit Courses"):
     st.session_state["page"] = "Edit Courses"
 if st.sidebar.button("🔎 Deep Dive"):
     st.session_state["page"] = "Deep Dive"
+if st.sidebar.button("👥 Cohort"):
+    st.session_state["page"] = "Cohort"
 if st.sidebar.button("⚙️ Settings"):
     st.session_state["page"] = "Settings"
 
 page = st.session_state.get("page", "Dashboard")
+set_page(page)
+
+# Streamlit drops a widget's session_state entry on the first rerun in which the widget
+# is not rendered. Re-assigning settings while another page is shown keeps them alive.
+PERSISTENT_KEYS = {
+    "Settings": (
+        "default_target_gpa", "default_rows", "autosave", "cookie_ttl", "persistence_backend", "server_profile",
+        "use_breakdowns", "enable_local_llm", "local_llm_backend", "local_llm_model_path", "local_llm_max_tokens",
+        "feedback_workers", "local_llm_stream",
+        "local_llm_download_url", "local_llm_download_sha256", "local_llm_download_segments",
+        "export_format", "export_table",
+    ),
+    "Cohort": ("cohort_target", "cohort_chunk_rows"),
+    "Dashboard": ("allocation_objective", "projection_mode", "projection_spread", "projection_samples", "projection_target", "projection_edit_courses", "projection_edit_components"),
+}
+for owner, keys in PERSISTENT_KEYS.items():
+    if owner != page:
+        for k in keys:
+            if k in st.session_state:
+                st.session_state[k] = st.session_state[k]
+
+section("page")
+
+@fragment()
+def render_course_editor(i):
+    """One course's expander. Depends only on course `i` in the store, so an edit
+    here reruns this fragment (plus autosave) instead of the whole script."""
+    course = store.get_course(i)
+    pre_break_raw = course["breakdown_raw"]
+    with st.expander(f"Course {i+1}", expanded=(i == 0)):
+        col_name, col_credits, col_grade = st.columns([3, 1, 1])
+        # no quick templates — enter values manually or import via Settings
+
+        store_input(col_name.text_input, "Name", f"name_{i}", course["name"], lambda v, i=i: store.set_field(i, "name", v))
+        store_input(col_credits.number_input, "Credits", f"credits_{i}", int(course["credits"]), lambda v, i=i: store.set_field(i, "credits", v), min_value=0, max_value=10, step=1)
+        store_input(col_grade.number_input, "Expected GPA", f"grade_{i}", float(course["grade"]), lambda v, i=i: store.set_field(i, "grade", v), min_value=0.00, max_value=4.33, step=0.01, format="%.2f")
+
+        st.markdown("**Grade breakdown** — add labeled components (label, weight, grade)")
+        # Raw breakdowns are parsed into structured components when they enter the store
+        comp_count = store_input(st.number_input, "Number of components", f"comp_count_{i}", store.component_count(i), lambda v, i=i: _set_comp_count(i, v), min_value=0, max_value=12)
+        if pre_break_raw:
+            st.caption("Imported breakdown (read-only):")
+            st.text_area("Imported breakdown", value=pre_break_raw, key=f"breakdown_raw_view_{i}_g{store.generation}")
+            rejects = store.breakdown_rejects.get(i)
+            if rejects:
+                st.warning(f"{len(rejects)} line(s) were skipped:\n" + "\n".join(f"- line {r['line']}: {r['text']!r} — {r['reason']}" for r in rejects[:10]))
+        comps = store.get_components(i)
+        for j, comp in enumerate(comps[: int(comp_count)]):
+            c1, c2, c3 = st.columns([2, 1, 1])
+            store_input(c1.text_input, "Component name", f"comp_name_{i}_{j}", comp["name"], lambda v, i=i, j=j: store.set_component_field(i, j, "name", v))
+            store_input(c2.number_input, "Weight", f"comp_weight_{i}_{j}", float(comp["weight"]), lambda v, i=i, j=j: store.set_component_field(i, j, "weight", v), min_value=0.0, max_value=1000.0, step=0.1)
+            store_input(c3.number_input, "Grade", f"comp_grade_{i}_{j}", float(comp["grade"]), lambda v, i=i, j=j: store.set_component_field(i, j, "grade", v), min_value=0.0, max_value=4.33, step=0.01, format="%.2f")
+        eff = store.derived().summary["effective_grade"][i]
+        st.caption(f"Effective grade {eff:.2f} — {eff * store.courses['credits'][i]:.2f} quality points")
+    autosave_if_changed()
+
 
 if page == "Edit Courses":
     st.header("Edit Courses")
-    rows = st.slider("Number of courses", min_value=1, max_value=12, step=1, value=st.session_state.get("rows", default_rows))
-    st.session_state["rows"] = rows
-    for i in range(rows):
-        pre_name = st.session_state.get(f"name_{i}", "")
-        pre_credits = st.session_state.get(f"credits_{i}", 0)
-        pre_grade = st.session_state.get(f"grade_{i}", 0.0)
-        pre_break_raw = st.session_state.get(f"breakdown_raw_{i}", "")
-        with st.expander(f"Course {i+1}", expanded=(i == 0)):
-            col_name, col_credits, col_grade = st.columns([3, 1, 1])
-            # no quick templates — enter values manually or import via Settings
-
-            course_name = col_name.text_input("Name", value=pre_name, key=f"name_{i}")
-            course_credits = col_credits.number_input("Credits", min_value=0, max_value=10, step=1, value=int(pre_credits), key=f"credits_{i}")
-            course_grade = col_grade.number_input("Expected GPA", min_value=0.00, max_value=4.33, step=0.01, format="%.2f", value=float(pre_grade), key=f"grade_{i}")
-
-            st.markdown("**Grade breakdown** — add labeled components (label, weight, grade)")
-            # Auto-import raw breakdown into structured components if available and no components set yet
-            if pre_break_raw and (f"comp_count_{i}" not in st.session_state or st.session_state.get(f"comp_count_{i}", 0) == 0):
-                parsed_comps = parse_breakdown_lines(pre_break_raw)
-                if parsed_comps:
-                    st.session_state[f"comp_count_{i}"] = len(parsed_comps)
-                    for j, comp in enumerate(parsed_comps):
-                        st.session_state[f"comp_name_{i}_{j}"] = comp.get("name", "")
-                        st.session_state[f"comp_weight_{i}_{j}"] = comp.get("weight", 0.0)
-                        st.session_state[f"comp_grade_{i}_{j}"] = comp.get("grade", 0.0)
-
-            comp_count = st.number_input("Number of components", min_value=0, max_value=12, value=st.session_state.get(f"comp_count_{i}", 0), key=f"comp_count_{i}")
-            if pre_break_raw:
-                st.caption("Imported breakdown (read-only):")
-                st.text_area("Imported breakdown", value=pre_break_raw, key=f"breakdown_raw_view_{i}")
-            for j in range(int(comp_count)):
-                c1, c2, c3 = st.columns([2, 1, 1])
-                cname = c1.text_input("Component name", value=st.session_state.get(f"comp_name_{i}_{j}", ""), key=f"comp_name_{i}_{j}")
-                cweight = c2.number_input("Weight", min_value=0.0, max_value=1000.0, step=0.1, value=float(st.session_state.get(f"comp_weight_{i}_{j}", 0.0)), key=f"comp_weight_{i}_{j}")
-                cgrade = c3.number_input("Grade", min_value=0.0, max_value=4.33, step=0.01, format="%.2f", value=float(st.session_state.get(f"comp_grade_{i}_{j}", 0.0)), key=f"comp_grade_{i}_{j}")
-
-# Build course_data from session_state so other pages can consume it
-course_data = []
-rows_current = st.session_state.get("rows", default_rows)
-for i in range(rows_current):
-    name = st.session_state.get(f"name_{i}", "")
-    credits = st.session_state.get(f"credits_{i}", 0)
-    grade = st.session_state.get(f"grade_{i}", 0.0)
-    comp_count = st.session_state.get(f"comp_count_{i}", 0)
-    comps = []
-    for j in range(int(comp_count)):
-        comps.append({
-            "name": st.session_state.get(f"comp_name_{i}_{j}", ""),
-            "weight": float(st.session_state.get(f"comp_weight_{i}_{j}", 0.0)),
-            "grade": float(st.session_state.get(f"comp_grade_{i}_{j}", 0.0)),
-        })
-    # also include any imported raw breakdown for reference
-    raw = st.session_state.get(f"breakdown_raw_{i}", "")
-    course_data.append({"name": name, "credits": credits, "grade": grade, "components": comps, "breakdown_raw": raw})
-
-courses_df = pd.DataFrame(course_data)
-
-# --- Parse breakdowns and compute effective grades ---
-
-effective_grades = []
-parsed_breakdowns = []
-for _, row in courses_df.iterrows():
-    # Prefer structured components if provided
-    comps = row.get("components") if isinstance(row.get("components"), list) and row.get("components") else None
-    if not comps:
-        # fallback to parsing raw breakdown text
-        comps = parse_breakdown_lines(row.get("breakdown_raw", ""))
-    parsed_breakdowns.append(comps or [])
-    if comps:
-        total_w = sum([abs(c["weight"]) for c in comps])
-        if total_w > 0:
-            weighted = sum([c["weight"] * c["grade"] for c in comps]) / total_w
-            effective_grades.append(weighted)
-        else:
-            effective_grades.append(row.get("grade", 0.0))
-    else:
-        effective_grades.append(row.get("grade", 0.0))
+    store_input(st.slider, "Number of courses", "rows", len(store), lambda v: store.resize(int(v)), min_value=1, max_value=max(12, len(store)), step=1)
+    for i in range(len(store)):
+        with phase("course_editor"):
+            render_course_editor(i)
+
+# Derived data is not built up front: pages call store.derived(), which refreshes only the
+# courses that changed on first access in a rerun and builds the DataFrame only when read.
+
+with phase("autosave"):
+    autosave_if_changed()
+    if st.session_state.get("autosave", False) and "conflict" in (st.session_state.get("sqlite_saved") or {}):
+        st.warning("Autosave paused: another session saved this server profile. Resolve it under Settings → Persistence.")
+
+
+# Dashboard sections are fragments with explicit inputs: each reads the course store
+# (whose derived data is memoized per version) and its own widgets, so changing the
+# target or the suggestion strategy reruns only the analysis, not the cards or the script.
+@fragment()
+def render_course_cards():
+    """Course cards. Depends on the derived course frame only."""
+    frame = store.derived().frame
+    if frame.empty:
+        st.info("No courses yet — add some in Edit Courses.")
+        return
+    # Display courses as responsive cards (2 per row)
+    per_row = 2
+    items = frame.reset_index().to_dict('records')
+    for i in range(0, len(items), per_row):
+        row_items = items[i:i+per_row]
+        cols_row = st.columns(len(row_items))
+        for col, item in zip(cols_row, row_items):
+            name = item.get('name') or 'Unnamed'
+            credits = int(item.get('credits', 0))
+            eff = float(item.get('effective_grade', 0.0))
+            pct = min(100.0, (eff / 4.33) * 100.0) if eff else 0.0
+            with col:
+                col.markdown(
+                    f"""
+                    <div class='dashboard-card' style='padding-left:36px;'>
+                        <div style='position:absolute; left:0; top:0; bottom:0; width:8px; border-radius:12px 0 0 12px; background: linear-gradient(180deg,#7c3aed,#06b6d4);'></div>
+                        <div style='display:flex; justify-content:space-between; align-items:center; padding-bottom:8px; border-bottom:1px solid #eef2f6;'>
+                            <div style='font-size:16px; font-weight:700;'>{name}</div>
+                            <div style='color:#475569; font-size:13px;'>Credits: {credits}</div>
+                        </div>
+                        <div style='margin-top:10px; display:flex; align-items:center; gap:12px; padding-top:10px;'>
+                            <div style='flex:1'>
+                                <div style='font-size:12px; color:#64748b;'>Effective GPA</div>
+                                <div style='font-size:22px; font-weight:800; color:#0b1220;'>{eff:.2f}</div>
+                            </div>
+                            <div style='width:140px'>
+                                <div style='height:12px; background:#f3f4f6; border-radius:999px; overflow:hidden;'>
+                                    <div style='width:{pct:.1f}%; height:12px; background:#111827; border-radius:999px;'></div>
+                                </div>
+                                <div style='font-size:11px; color:#64748b; margin-top:6px'>{pct:.0f}% of 4.33</div>
+                            </div>
+                        </div>
+                    </div>
+                    """,
+                    unsafe_allow_html=True,
+                )
+                if col.button("Deep Dive", key=f"deep_{item['index']}"):
+                    st.session_state["page"] = "Deep Dive"
+                    st.session_state["deep_dive_index"] = int(item['index'])
+                    safe_rerun()
+
+
+@fragment()
+def render_gpa_analysis():
+    """Target GPA, GPA vs target and improvement suggestions. Depends on the derived
+    summary/frame and on the target, strategy and difficulty widgets inside it."""
+    import pandas as pd
+    derived = store.derived()
+    frame, summary = derived.frame, derived.summary
+    target_col, gpa_col, badge_col = st.columns([1, 1, 1])
+    target_gpa = target_col.number_input("Target GPA", min_value=0.00, max_value=4.33, step=0.01, format="%.2f")
 
-courses_df["effective_grade"] = effective_grades
+    # Risk analysis and improvement suggestions
+    if frame.empty or frame["credits"].sum() == 0:
+        st.info("Enter at least one course with credits > 0 to analyze risk.")
+        return
+    total_credits = summary["total_credits"]
+    # use effective grade (from structured components or breakdown)
+    current_qp = summary["total_quality_points"]
+    current_gpa = summary["gpa"]
 
+    # Summary labels
+    gpa_col.metric("Current GPA", f"{current_gpa:.2f}", delta=f"{(current_gpa - target_gpa):+.2f}")
+    badge_class = "badge-good" if current_gpa >= target_gpa else "badge-bad"
+    badge_col.markdown(f"**Target GPA**: <span class='grade-badge {badge_class}'>{target_gpa:.2f}</span>", unsafe_allow_html=True)
 
-def run_local_llm(prompt, backend, model_path, max_tokens=150):
-    """Run a local LLM backend. Returns (output, error_message).
-    Tries gpt4all first if selected, then llama_cpp if selected.
-    """
-    if not backend:
-        return None, "No backend selected"
-    backend = backend.lower()
-    if backend == "gpt4all":
-        try:
-            from gpt4all import GPT4All
-        except Exception as e:
-            return None, f"gpt4all import failed: {e}"
-        try:
-            # model_path may be a model name or path depending on gpt4all installation
-            model = GPT4All(model_name=model_path or "")
-            # many gpt4all wrappers provide .generate
-            out = model.generate(prompt)
-            if isinstance(out, (list, tuple)):
-                out = out[0]
-            return str(out), None
-        except Exception as e:
-            return None, str(e)
-    elif backend == "llama_cpp":
-        try:
-            from llama_cpp import Llama
-        except Exception as e:
-            return None, f"llama_cpp import failed: {e}"
-        try:
-            llm = Llama(model_path=model_path)
-            resp = llm.create(prompt=prompt, max_tokens=max_tokens)
-            if isinstance(resp, dict) and resp.get("choices"):
-                out = resp["choices"][0].get("text")
-            else:
-                out = str(resp)
-            return out, None
-        except Exception as e:
-            return None, str(e)
+    required_qp = target_gpa * total_credits
+    deficit_qp = required_qp - current_qp
+
+    if deficit_qp <= 0:
+        st.success(f"On track — projected GPA meets/exceeds target by {(current_gpa - target_gpa):.2f}.")
+        return
+    st.error(f"Shortfall: {deficit_qp:.2f} quality points needed to reach target.")
+
+    # Compute maximum possible gain per course (if raised to 4.33)
+    analysis = frame.copy()
+    # use effective_grade as base for possible gains
+    analysis["grade"] = analysis["effective_grade"]
+    analysis["max_gain_qp"] = analysis["credits"] * (4.33 - analysis["grade"]).clip(lower=0)
+    total_possible_gain = analysis["max_gain_qp"].sum()
+
+    if total_possible_gain + 1e-9 < deficit_qp:
+        st.warning("Even raising all courses to 4.33 will not reach the target.")
+        st.write(f"Maximum possible extra quality points: {total_possible_gain:.2f}")
     else:
-        return None, f"Unknown backend: {backend}"
+        objective = st.selectbox(
+            "Suggestion strategy",
+            options=list(ALLOCATION_OBJECTIVES.keys()),
+            format_func=lambda k: ALLOCATION_OBJECTIVES[k],
+            key="allocation_objective",
+        )
+        difficulty = None
+        if objective == "difficulty":
+            # higher difficulty = harder to raise
+            saved_difficulty = course_difficulty()
+            diff_df = pd.DataFrame({
+                "name": analysis["name"],
+                "difficulty": [saved_difficulty.get(i, 1.0) for i in range(len(analysis))],
+            })
+            edited = st.data_editor(
+                diff_df,
+                disabled=["name"],
+                column_config={"difficulty": st.column_config.NumberColumn("Difficulty", min_value=0.1, max_value=10.0, step=0.1)},
+                hide_index=True,
+                key=f"difficulty_editor_g{store.generation}",
+            )
+            difficulty = edited["difficulty"].to_numpy(dtype=float)
+            saved_difficulty.clear()
+            saved_difficulty.update({i: float(d) for i, d in enumerate(difficulty) if d != 1.0})
+        bumps = allocate_deficit(analysis["grade"].to_numpy(dtype=float), analysis["credits"].to_numpy(dtype=float), deficit_qp, objective=objective, difficulty=difficulty)
+        picked = analysis.assign(bump=bumps)[bumps > 1e-9].sort_values("bump", ascending=False)
+        suggestions = pd.DataFrame({
+            "name": picked["name"],
+            "credits": picked["credits"].astype(int),
+            "current_grade": picked["grade"].round(2),
+            "suggested_grade": (picked["grade"] + picked["bump"]).clip(upper=4.33).round(2),
+        })
 
+        st.subheader("Suggested course bumps to hit target")
+        st.table(suggestions.reset_index(drop=True))
+
+    # High-risk courses: high-credit courses below target
+    credit_threshold = frame["credits"].quantile(0.66) if len(frame) > 1 else 0
+    high_risk = frame[(frame["credits"] >= credit_threshold) & (frame["grade"] < target_gpa)]
+    if not high_risk.empty:
+        st.subheader("High-risk courses (high credit & below target)")
+        st.table(high_risk[["name", "credits", "grade"]].assign(grade=lambda d: d["grade"].round(2)))
+    else:
+        st.write("No high-credit courses are below the target GPA.")
+
+
+PROJECTION_SAMPLE_OPTIONS = (10_000, 100_000, 250_000, 1_000_000)
+# scenarios x uncertain grades drawn per projection (about 2 s); larger stores get fewer scenarios
+MAX_PROJECTION_CELLS = 500_000_000
+# below this many scenarios the percentiles are too noisy to show, so the projection is refused
+MIN_PROJECTION_SAMPLES = 1_000
+
+
+def projection_spreads(default_spread, course_ranges, component_ranges):
+    """Per-course and per-component +/- ranges: the default, then course, then component overrides."""
+    import numpy as np
+    n = len(store)
+    comp_course = store.component_arrays()[0]
+    course_spread = np.full(n, float(default_spread))
+    for i, v in course_ranges.items():
+        if i < n:
+            course_spread[i] = v
+    comp_spread = course_spread[comp_course]
+    if component_ranges:
+        first = np.searchsorted(comp_course, np.arange(n))
+        for (i, j), v in component_ranges.items():
+            k = first[i] + j if i < n else len(comp_course)
+            if k < len(comp_course) and comp_course[k] == i:
+                comp_spread[k] = v
+    return course_spread, comp_spread
+
+
+@fragment()
+def render_gpa_projection():
+    """Monte Carlo GPA projection. Depends on the course store, the range inputs and the
+    target slider; the simulation is memoized on everything except the target, so moving
+    the slider only re-reads the sorted scenarios."""
+    import numpy as np
+    import pandas as pd
+    if not st.checkbox("Projection mode — uncertain grades", key="projection_mode"):
+        return
+    derived = store.derived()
+    frame, summary = derived.frame, derived.summary
+    if frame.empty or summary["total_credits"] <= 0:
+        st.info("Enter at least one course with credits > 0 to project a GPA.")
+        return
+    st.caption("Each grade is drawn uniformly from its value ± range (kept within 0–4.33). Courses with weighted components vary per component, others on the course grade.")
+    c1, c2, c3 = st.columns(3)
+    default_spread = c1.number_input("Default ± range", min_value=0.0, max_value=4.33, value=0.30, step=0.05, format="%.2f", key="projection_spread")
+    samples = c2.selectbox("Scenarios", PROJECTION_SAMPLE_OPTIONS, index=1, format_func=lambda v: f"{v:,}", key="projection_samples")
+    target = c3.slider("Target GPA", min_value=0.0, max_value=4.33, value=float(st.session_state.get("default_target_gpa", 3.0)), step=0.01, key="projection_target")
+
+    # overrides: {course: range} and {(course, component): range}; blank cells use the default
+    course_ranges = st.session_state.setdefault("course_uncertainty", {})
+    component_ranges = st.session_state.setdefault("component_uncertainty", {})
+    range_column = st.column_config.NumberColumn("± range", min_value=0.0, max_value=4.33, step=0.05, format="%.2f")
+    if st.checkbox("Set ranges per course", key="projection_edit_courses"):
+        edited = st.data_editor(
+            pd.DataFrame({"name": frame["name"], "range": [course_ranges.get(i) for i in range(len(frame))]}, dtype=object),
+            disabled=["name"], column_config={"range": range_column}, hide_index=True, key="course_uncertainty_editor",
+        )
+        course_ranges.clear()
+        course_ranges.update({i: float(v) for i, v in enumerate(edited["range"]) if pd.notna(v)})
+    if st.checkbox("Set ranges per component", key="projection_edit_components"):
+        comp_course, _, comp_grade = store.component_arrays()
+        first = np.searchsorted(comp_course, np.arange(len(store)))
+        slots = [(int(i), int(k - first[i])) for k, i in enumerate(comp_course)]
+        edited = st.data_editor(
+            pd.DataFrame({
+                "course": [store.courses["name"][i] or f"Course {i + 1}" for i, _ in slots],
+                "component": store.components["name"],
+                "grade": comp_grade,
+                "range": [component_ranges.get(slot) for slot in slots],
+            }, dtype=object),
+            disabled=["course", "component", "grade"], column_config={"range": range_column}, hide_index=True, key="component_uncertainty_editor",
+        )
+        component_ranges.clear()
+        component_ranges.update({slot: float(v) for slot, v in zip(slots, edited["range"]) if pd.notna(v)})
+
+    course_spread, comp_spread = projection_spreads(default_spread, course_ranges, component_ranges)
+    grades = np.asarray(store.courses["grade"], dtype=np.float64)
+    credits = np.asarray(store.courses["credits"], dtype=np.float64)
+    uncertain = uncertain_grade_count(grades, credits, *store.component_arrays(), course_spread, comp_spread)
+    run_samples = min(samples, MAX_PROJECTION_CELLS // max(uncertain, 1))
+    if run_samples < MIN_PROJECTION_SAMPLES:
+        st.warning(f"{uncertain:,} uncertain grades are too many to project: even {MIN_PROJECTION_SAMPLES:,} scenarios would take too long. Set some ranges to 0 to leave those grades fixed.")
+        return
+    key = (store.generation, store.version, run_samples, hash(course_spread.tobytes()), hash(comp_spread.tobytes()))
+    cached = st.session_state.get("gpa_projection")
+    if cached is None or cached[0] != key:
+        with st.spinner(f"Simulating {run_samples:,} scenarios…"):
+            result = simulate_gpa(grades, credits, *store.component_arrays(), course_spread, comp_spread, samples=run_samples)
+            counts, edges = np.histogram(result["samples"], bins=40)
+            result["histogram"] = pd.DataFrame({"share": counts / run_samples}, index=pd.Index(((edges[:-1] + edges[1:]) / 2).round(3), name="GPA"))
+        cached = (key, result)
+        st.session_state["gpa_projection"] = cached
+    result = cached[1]
+    if run_samples < samples:
+        st.caption(f"Ran {run_samples:,} scenarios: {uncertain:,} uncertain grades would make {samples:,} too slow.")
+
+    gpa = result["samples"]
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Expected GPA", f"{result['mean']:.2f}", delta=f"{result['mean'] - result['point']:+.2f} vs entered grades")
+    m2.metric("90% of scenarios", f"{gpa[int(0.05 * (len(gpa) - 1))]:.2f} – {gpa[int(0.95 * (len(gpa) - 1))]:.2f}")
+    m3.metric(f"P(GPA ≥ {target:.2f})", f"{probability_at_least(gpa, target):.1%}")
+    st.bar_chart(result["histogram"], y="share")
+
+    if len(result["course"]):
+        idx = result["course"]
+        sensitivity = pd.DataFrame({
+            "name": frame["name"].to_numpy()[idx],
+            "credits": frame["credits"].to_numpy()[idx].astype(int),
+            "effective_grade": frame["effective_grade"].to_numpy()[idx].round(2),
+            "gpa_sd": result["course_std"].round(4),
+            "variance_share": result["variance_share"],
+            "gpa_swing": result["swing"].round(3),
+        }).sort_values("variance_share", ascending=False).head(20)
+        st.subheader("Which courses move the GPA most")
+        st.dataframe(
+            sensitivity,
+            hide_index=True,
+            column_config={
+                "gpa_sd": st.column_config.NumberColumn("GPA ± (1 sd)"),
+                "variance_share": st.column_config.ProgressColumn("Share of spread", min_value=0.0, max_value=1.0, format="percent"),
+                "gpa_swing": st.column_config.NumberColumn("Low → high swing"),
+            },
+        )
 
-def download_model(url, dest_dir):
-    """Download model from URL into dest_dir. Returns (dest_path, error_message)."""
-    try:
-        os.makedirs(dest_dir, exist_ok=True)
-        filename = os.path.basename(urllib.parse.urlparse(url).path) or "model.bin"
-        dest = os.path.join(dest_dir, filename)
-        # simple download; urllib handles basic redirects
-        urllib.request.urlretrieve(url, dest)
-        return dest, None
-    except Exception as e:
-        return None, str(e)
 
 # place dataframe and target GPA nicely on Dashboard
 if page == "Dashboard":
+    with phase("derived"):
+        grade_stats = store.derived().summary
     left, right = st.columns([3, 1])
-
-    # Target input and summary column
-    target_gpa = right.number_input("Target GPA", min_value=0.00, max_value=4.33, step=0.01, format="%.2f")
+    with left, phase("cards"):
+        render_course_cards()
+    # totals have no widgets, so they only change on full reruns (i.e. after course edits)
+    right.metric("Total credits", f"{grade_stats['total_credits']:.0f}")
+    right.metric("Quality points", f"{grade_stats['total_quality_points']:.2f}")
     right.markdown("---")
 
-    # Pretty course cards using Streamlit elements (bubbly, rounded, friendly)
-    if courses_df.empty:
-        left.info("No courses yet — add some in Edit Courses.")
-    else:
-        # Display courses as responsive cards (2 per row)
-        per_row = 2
-        items = courses_df.reset_index().to_dict('records')
-        for i in range(0, len(items), per_row):
-            row_items = items[i:i+per_row]
-            cols_row = left.columns(len(row_items))
-            for col, item in zip(cols_row, row_items):
-                name = item.get('name') or 'Unnamed'
-                credits = int(item.get('credits', 0))
-                eff = float(item.get('effective_grade', 0.0))
-                pct = min(100.0, (eff / 4.33) * 100.0) if eff else 0.0
-                with col:
-                    col.markdown(
-                        f"""
-                        <div class='dashboard-card' style='padding-left:36px;'>
-                            <div style='position:absolute; left:0; top:0; bottom:0; width:8px; border-radius:12px 0 0 12px; background: linear-gradient(180deg,#7c3aed,#06b6d4);'></div>
-                            <div style='display:flex; justify-content:space-between; align-items:center; padding-bottom:8px; border-bottom:1px solid #eef2f6;'>
-                                <div style='font-size:16px; font-weight:700;'>{name}</div>
-                                <div style='color:#475569; font-size:13px;'>Credits: {credits}</div>
-                            </div>
-                            <div style='margin-top:10px; display:flex; align-items:center; gap:12px; padding-top:10px;'>
-                                <div style='flex:1'>
-                                    <div style='font-size:12px; color:#64748b;'>Effective GPA</div>
-                                    <div style='font-size:22px; font-weight:800; color:#0b1220;'>{eff:.2f}</div>
-                                </div>
-                                <div style='width:140px'>
-                                    <div style='height:12px; background:#f3f4f6; border-radius:999px; overflow:hidden;'>
-                                        <div style='width:{pct:.1f}%; height:12px; background:#111827; border-radius:999px;'></div>
-                                    </div>
-                                    <div style='font-size:11px; color:#64748b; margin-top:6px'>{pct:.0f}% of 4.33</div>
-                                </div>
-                            </div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True,
-                    )
-                    if col.button("Deep Dive", key=f"deep_{item['index']}"):
-                        st.session_state["page"] = "Deep Dive"
-                        st.session_state["deep_dive_index"] = int(item['index'])
-                        safe_rerun()
+    with phase("gpa_analysis"):
+        render_gpa_analysis()
 
-    # Risk analysis and improvement suggestions
-    if courses_df.empty or courses_df["credits"].sum() == 0:
-        st.info("Enter at least one course with credits > 0 to analyze risk.")
-    else:
-        total_credits = float(courses_df["credits"].sum())
-        # use effective grade (from structured components or breakdown)
-        current_qp = (courses_df["credits"] * courses_df["effective_grade"]).sum()
-        current_gpa = current_qp / total_credits
+    with phase("projection"):
+        render_gpa_projection()
 
-        # Summary labels
-        right.metric("Current GPA", f"{current_gpa:.2f}", delta=f"{(current_gpa - target_gpa):+.2f}")
-        badge_class = "badge-good" if current_gpa >= target_gpa else "badge-bad"
-        right.markdown(f"**Target GPA**: <span class='grade-badge {badge_class}'>{target_gpa:.2f}</span>", unsafe_allow_html=True)
-
-        required_qp = target_gpa * total_credits
-        deficit_qp = required_qp - current_qp
-
-        if deficit_qp <= 0:
-            st.success(f"On track — projected GPA meets/exceeds target by {(current_gpa - target_gpa):.2f}.")
-        else:
-            st.error(f"Shortfall: {deficit_qp:.2f} quality points needed to reach target.")
-
-            # Compute maximum possible gain per course (if raised to 4.33)
-            analysis = courses_df.copy()
-            # use effective_grade as base for possible gains
-            analysis["grade"] = analysis["effective_grade"]
-            analysis["max_gain_qp"] = analysis["credits"] * (4.33 - analysis["grade"]).clip(lower=0)
-            total_possible_gain = analysis["max_gain_qp"].sum()
-
-            if total_possible_gain + 1e-9 < deficit_qp:
-                st.warning("Even raising all courses to 4.33 will not reach the target.")
-                st.write(f"Maximum possible extra quality points: {total_possible_gain:.2f}")
-            else:
-                # Greedy selection: bump courses with largest potential gain first
-                analysis = analysis.sort_values("max_gain_qp", ascending=False)
-                remaining = deficit_qp
-                suggestions = []
-                for _, row in analysis.iterrows():
-                    if remaining <= 0:
-                        break
-                    if row["max_gain_qp"] <= 0:
-                        continue
-                    take_qp = min(row["max_gain_qp"], remaining)
-                    needed_grade_increase = take_qp / row["credits"]
-                    suggested_grade = min(row["grade"] + needed_grade_increase, 4.33)
-                    suggestions.append(
-                        {
-                            "name": row["name"],
-                            "credits": int(row["credits"]),
-                            "current_grade": round(row["grade"], 2),
-                            "suggested_grade": round(suggested_grade, 2),
-                        }
-                    )
-                    remaining -= take_qp
-
-                st.subheader("Suggested course bumps to hit target")
-                st.table(pd.DataFrame(suggestions))
-
-            # High-risk courses: high-credit courses below target
-            credit_threshold = courses_df["credits"].quantile(0.66) if len(courses_df) > 1 else 0
-            high_risk = courses_df[(courses_df["credits"] >= credit_threshold) & (courses_df["grade"] < target_gpa)]
-            if not high_risk.empty:
-                st.subheader("High-risk courses (high credit & below target)")
-                st.table(high_risk[["name", "credits", "grade"]].assign(grade=lambda d: d["grade"].round(2)))
-            else:
-                st.write("No high-credit courses are below the target GPA.")
-
-        # Visual: course grades vs target
-        st.subheader("Course grades vs target")
-        viz = courses_df[["name", "effective_grade"]].copy()
-        viz = viz.set_index("name")["effective_grade"].rename("grade")
-        st.bar_chart(viz)
+    if len(store) and grade_stats["total_credits"] > 0:
+        with phase("chart"):
+            courses_df = store.derived().frame
+            # Visual: course grades vs target
+            st.subheader("Course grades vs target")
+            viz = courses_df[["name", "effective_grade"]].copy()
+            viz = viz.set_index("name")["effective_grade"].rename("grade")
+            st.bar_chart(viz)
 
 # Deep Dive page shows per-course breakdown and contribution
 if page == "Deep Dive":
+    import pandas as pd
     st.header("Deep Dive")
+    courses_df = store.derived().frame
     if courses_df.empty:
         st.info("No courses to inspect. Add courses on the Edit Courses page.")
     else:
@@ -618,7 +827,7 @@ if page == "Deep Dive":
         sel = courses_df.iloc[idx]
         st.markdown(f"**{sel['name']}** — Credits: {int(sel['credits'])} — Effective grade: {sel['effective_grade']:.2f}")
         st.write(f"Contribution to GPA (quality points): {sel['credits'] * sel['effective_grade']:.2f}")
-        comps = parsed_breakdowns[idx] if idx < len(parsed_breakdowns) else []
+        comps = store.get_components(idx)
         if comps:
             st.subheader("Components")
             st.table(pd.DataFrame(comps))
@@ -632,49 +841,161 @@ if page == "Deep Dive":
         else:
             st.caption("Using built-in heuristic feedback (no local LLM configured)")
 
-        def heuristic_feedback(name, credits, effective_grade, components, target):
-            tips = []
-            # If overall below target, suggest high-impact components
-            if effective_grade < target:
-                tips.append(f"Current effective grade {effective_grade:.2f} is below target {target:.2f}.")
-                # rank components by weight
-                if components:
-                    comps_sorted = sorted(components, key=lambda c: -abs(c.get("weight", 0)))
-                    top = comps_sorted[0]
-                    tips.append(f"Focus on '{top.get('name')}' (weight {top.get('weight')}) — improving it yields biggest GPA impact.")
+        # we'll call the generic run_local_llm helper (see local_llm.py)
+
+        fb_col, regen_col = st.columns([1, 1])
+        get_feedback = fb_col.button("Get improvement feedback")
+        regenerate = regen_col.button("Regenerate (skip cache)")
+        if get_feedback or regenerate:
+            with phase("llm_feedback"):
+                comps_for_prompt = comps or []
+                prompt = build_feedback_prompt(sel['name'], sel['credits'], sel['effective_grade'], comps_for_prompt, st.session_state.get('default_target_gpa', 3.0))
+
+                if st.session_state.get("enable_local_llm", False) and st.session_state.get("local_llm_model_path"):
+                    model_path = st.session_state.get("local_llm_model_path")
+                    max_t = int(st.session_state.get("local_llm_max_tokens", 150))
+                    backend = st.session_state.get("local_llm_backend", "gpt4all")
+                    cache_key = response_cache_key(prompt, backend, model_path, max_t)
+                    cached = None if regenerate else response_cache.get(cache_key)
+                    if cached:
+                        out, err = cached.get("text"), None
+                        st.caption(f"Cached response from {time.strftime('%Y-%m-%d %H:%M', time.localtime(cached.get('created', 0)))} — use Regenerate for a fresh one.")
+                    elif st.session_state.get("local_llm_stream", True):
+                        out, err = None, None
+                        stream_stats = {}
+                        tokens, err = stream_local_llm(prompt, backend, model_path, max_t, stats=stream_stats)
+                        if tokens is not None:
+                            feedback_box = st.empty()
+                            pieces = []
+                            last_paint = 0.0
+                            try:
+                                for tok in tokens:
+                                    pieces.append(tok)
+                                    # throttle repaints so fast models don't flood the websocket
+                                    if time.perf_counter() - last_paint > 0.05:
+                                        feedback_box.markdown("".join(pieces) + " ▌")
+                                        last_paint = time.perf_counter()
+                            except Exception as e:
+                                err = str(e)
+                            finally:
+                                # a rerun or stop mid-stream raises past the except above;
+                                # closing hands back the generation lock and the model now
+                                tokens.close()
+                            out = "".join(pieces)
+                            if out:
+                                feedback_box.empty()
+                            else:
+                                err = err or "Model returned no output"
+                        if out and stream_stats.get("ttft_seconds") is not None:
+                            st.caption(f"Time to first token: {stream_stats['ttft_seconds']:.2f}s — {stream_stats['tokens_per_second']:.1f} tokens/s ({stream_stats['tokens']} tokens in {stream_stats['total_seconds']:.1f}s)")
+                    else:
+                        out, err = run_local_llm(prompt, backend, model_path, max_t)
+                    if out and not err and not cached:
+                        response_cache.put(cache_key, out, backend=backend, model=model_path, max_tokens=max_t)
+                    if out:
+                        st.text_area("LLM feedback", value=out, height=200)
+                    else:
+                        st.error(f"LLM feedback failed: {err}. Showing heuristic feedback instead.")
+                        st.write(heuristic_feedback(sel['name'], sel['credits'], sel['effective_grade'], comps_for_prompt, st.session_state.get('default_target_gpa', 3.0)))
                 else:
-                    tips.append("No component breakdown — focus on assignments/exams with largest credit or re-assess study time.")
-            else:
-                tips.append("You're on track for this course — maintain current performance and keep an eye on high-weight items.")
-            # low-grade components
-            for c in components or []:
-                if c.get("grade", 0) < effective_grade and c.get("weight", 0) > 0:
-                    tips.append(f"Component '{c.get('name')}' grade {c.get('grade'):.2f} is below course effective grade — investigate remediation.")
-            return "\n".join(tips)
-
-        # we'll call the generic run_local_llm helper defined earlier
-
-        if st.button("Get improvement feedback"):
-            comps_for_prompt = comps or []
-            prompt_lines = [f"Course: {sel['name']}", f"Credits: {int(sel['credits'])}", f"Effective grade: {sel['effective_grade']:.2f}", f"Target GPA: {st.session_state.get('default_target_gpa', 3.0):.2f}"]
-            if comps_for_prompt:
-                prompt_lines.append("Components:")
-                for c in comps_for_prompt:
-                    prompt_lines.append(f"- {c.get('name')}: weight={c.get('weight')} grade={c.get('grade')}")
-            prompt = "\n".join(prompt_lines) + "\n\nProvide concise suggestions to improve grades, prioritizing high-impact, actionable steps."
+                    st.write(heuristic_feedback(sel['name'], sel['credits'], sel['effective_grade'], comps_for_prompt, st.session_state.get('default_target_gpa', 3.0)))
 
+        # Batch feedback: every course is queued onto background workers so the page stays responsive
+        st.markdown("---")
+        st.subheader("Feedback for all courses")
+        batch_job = get_feedback_job(st.session_state.get("feedback_job_id", ""))
+        b1, b2 = st.columns([1, 1])
+        if b1.button("Generate feedback for all courses", disabled=bool(batch_job and not batch_job.done)):
+            llm_cfg = None
             if st.session_state.get("enable_local_llm", False) and st.session_state.get("local_llm_model_path"):
-                model_path = st.session_state.get("local_llm_model_path")
-                max_t = int(st.session_state.get("local_llm_max_tokens", 150))
-                backend = st.session_state.get("local_llm_backend", "gpt4all")
-                out, err = run_local_llm(prompt, backend, model_path, max_t)
-                if out:
-                    st.text_area("LLM feedback", value=out, height=200)
-                else:
-                    st.error(f"LLM feedback failed: {err}. Showing heuristic feedback instead.")
-                    st.write(heuristic_feedback(sel['name'], sel['credits'], sel['effective_grade'], comps_for_prompt, st.session_state.get('default_target_gpa', 3.0)))
-            else:
-                st.write(heuristic_feedback(sel['name'], sel['credits'], sel['effective_grade'], comps_for_prompt, st.session_state.get('default_target_gpa', 3.0)))
+                llm_cfg = {
+                    "backend": st.session_state.get("local_llm_backend", "gpt4all"),
+                    "model_path": st.session_state.get("local_llm_model_path"),
+                    "max_tokens": int(st.session_state.get("local_llm_max_tokens", 150)),
+                }
+            effective = store.derived().summary["effective_grade"]
+            batch_courses = [
+                {
+                    "index": i,
+                    "name": store.courses["name"][i],
+                    "credits": store.courses["credits"][i],
+                    "effective_grade": float(effective[i]),
+                    "components": store.get_components(i),
+                }
+                for i in range(len(store))
+            ]
+            batch_job = start_feedback_job(batch_courses, st.session_state.get("default_target_gpa", 3.0), llm=llm_cfg, max_workers=st.session_state.get("feedback_workers", 4))
+            st.session_state["feedback_job_id"] = batch_job.id
+        if batch_job and not batch_job.done and b2.button("Cancel batch"):
+            batch_job.cancel()
+
+        @fragment(run_every=1.0 if batch_job and not batch_job.done else None)
+        def render_batch_feedback():
+            job = get_feedback_job(st.session_state.get("feedback_job_id", ""))
+            if job is None:
+                st.caption("No batch run yet.")
+                return
+            completed, total = job.progress()
+            st.progress(completed / total if total else 1.0)
+            state = "cancelled" if job.cancelled else ("finished" if job.done else "running")
+            st.caption(f"{completed}/{total} courses — {state}")
+            if job.done and st.session_state.get("feedback_job_seen_done") != job.id:
+                # one full rerun so the page stops polling and re-enables the start button
+                st.session_state["feedback_job_seen_done"] = job.id
+                safe_rerun()
+            for i, res in sorted(job.snapshot().items()):
+                with st.expander(f"{i+1}: {res['name']} ({res['source']}, {res['seconds']:.1f}s)"):
+                    if res["error"]:
+                        st.caption(f"LLM failed: {res['error']} — heuristic shown")
+                    st.write(res["text"])
+
+        with phase("batch_feedback"):
+            render_batch_feedback()
+
+# Cohort page: bulk analytics for many students loaded from CSV/Parquet
+if page == "Cohort":
+    # pandas/pyarrow are only needed once someone opens this page
+    from cohort import DEFAULT_CHUNK_ROWS, analyze_cohort
+    st.header("Cohort")
+    st.write("Load many students' courses and components to compute effective GPA, distance to target and high-risk courses with the Dashboard rules.")
+    st.caption("Columns: student_id, course, credits, grade — optional weight, component_grade (one row per component) and target_gpa.")
+    cohort_file = st.file_uploader("Cohort file", type=["csv", "parquet", "pq"], key="cohort_upload")
+    cc1, cc2 = st.columns(2)
+    cohort_target = cc1.number_input("Default target GPA", min_value=0.00, max_value=4.33, step=0.01, value=float(st.session_state.get("default_target_gpa", 3.0)), key="cohort_target")
+    cohort_chunk = cc2.number_input("Rows per chunk", min_value=1000, max_value=5_000_000, step=50_000, value=DEFAULT_CHUNK_ROWS, key="cohort_chunk_rows")
+    if st.button("Analyze cohort"):
+        source = cohort_file
+        if source is None:
+            st.error("Upload a cohort file.")
+        else:
+            status = st.empty()
+            try:
+                students, cohort_courses, cohort_stats = analyze_cohort(
+                    source,
+                    name=getattr(source, "name", None),
+                    default_target=cohort_target,
+                    chunk_rows=int(cohort_chunk),
+                    progress=lambda n: status.caption(f"Processed {n:,} rows…"),
+                )
+                st.session_state["cohort_result"] = (students, cohort_courses, cohort_stats)
+                status.empty()
+            except Exception as e:
+                status.empty()
+                st.error(f"Cohort analysis failed: {e}")
+
+    cohort_result = st.session_state.get("cohort_result")
+    if cohort_result:
+        students, cohort_courses, cohort_stats = cohort_result
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Students", f"{cohort_stats['students']:,}")
+        m2.metric("Rows read", f"{cohort_stats['rows']:,}")
+        m3.metric("Mean GPA", f"{students['gpa'].mean():.2f}")
+        m4.metric("At/above target", f"{(students['distance_to_target'] >= 0).mean() * 100:.0f}%")
+        st.caption(f"Computed {cohort_stats['courses']:,} courses in {cohort_stats['seconds']:.2f}s")
+        st.subheader("Students furthest below target")
+        st.dataframe(students.sort_values("distance_to_target").head(500), hide_index=True)
+        lazy_download_button("Download student results (CSV)", lambda: students.to_csv(index=False), file_name="cohort_students.csv", mime="text/csv", key="cohort_students_csv")
+        lazy_download_button("Download high-risk courses (CSV)", lambda: cohort_courses[cohort_courses["high_risk"]].to_csv(index=False), file_name="cohort_high_risk.csv", mime="text/csv", key="cohort_high_risk_csv")
 
 # Settings page
 if page == "Settings":
@@ -684,34 +1005,125 @@ if page == "Settings":
     # Defaults
     st.subheader("Defaults")
     st.number_input("Default target GPA", min_value=0.00, max_value=4.33, step=0.01, value=st.session_state.get("default_target_gpa", 3.00), key="default_target_gpa")
-    st.number_input("Default number of course rows", min_value=1, max_value=20, step=1, value=st.session_state.get("default_rows", st.session_state.get("rows", 3)), key="default_rows")
+    st.number_input("Default number of course rows", min_value=1, max_value=20, step=1, value=st.session_state.get("default_rows", min(len(store), 20)), key="default_rows")
 
     # Persistence
     st.subheader("Persistence")
-    st.checkbox("Autosave to cookies on edit", value=st.session_state.get("autosave", False), key="autosave")
+    backend_labels = {"cookie": "Browser cookie", "sqlite": "Server store (SQLite)"}
+    st.selectbox("Persistence backend", options=list(backend_labels.keys()), format_func=lambda k: backend_labels[k], index=list(backend_labels.keys()).index(persistence_backend()), key="persistence_backend", on_change=attach_server_profile)
+    st.checkbox("Autosave on edit", value=st.session_state.get("autosave", False), key="autosave")
+    if persistence_backend() == "sqlite":
+        st.text_input("Server profile", value=server_profile(), key="server_profile", on_change=attach_server_profile)
+        server_db = get_sqlite_store()
+        st.caption(f"Database: {server_db.path}")
+        last = server_db.last_save
+        if last:
+            st.caption(f"Last server save: {last['courses_written']} course(s) in {last['seconds'] * 1000:.2f} ms")
+        if "conflict" in (st.session_state.get("sqlite_saved") or {}):
+            st.warning(f"Profile '{server_profile()}' was saved by another session, so autosave stopped. Load it to pick up those changes, or overwrite it with this session's courses.")
+            if st.button("Overwrite the server copy"):
+                save_to_server(full=True, overwrite=True)
+                safe_rerun()
+        sp1, sp2, sp3 = st.columns(3)
+        if sp1.button("Save to server now"):
+            err = save_to_server(full=True)
+            if err:
+                st.error(err)
+            else:
+                st.success(f"Saved {len(store)} courses to profile '{server_profile()}'.")
+        if sp2.button("Load from server"):
+            records, revision = server_db.load_snapshot(server_profile())
+            if records is None:
+                st.warning(f"No saved data for profile '{server_profile()}'.")
+            else:
+                store.replace(records or [{}])
+                mark_server_synced(store, revision)
+                safe_rerun()
+        if sp3.button("Import cookie data to server"):
+            # the ?data= link payload is consumed by hydration, so read the browser cookie itself
+            token, _ = read_saved_cookie()
+            if token and migrate_cookie_payload(token, server_db, server_profile()):
+                st.success(f"Cookie data copied into profile '{server_profile()}'.")
+            else:
+                st.info("No cookie data to import, or the profile already has data.")
+    elif st.session_state.get("autosave", False):
+        st.caption("Autosave needs the server store; save cookies manually below.")
     st.number_input("Cookie TTL (days)", min_value=1, max_value=3650, step=1, value=st.session_state.get("cookie_ttl", 365), key="cookie_ttl")
+    sizes = cookie_payload_sizes()
+    st.caption(f"Cookie payload: {sizes['bytes']:,} bytes in {sizes['cookies']} cookie(s) — the previous format would need {sizes['legacy_bytes']:,} bytes.")
+    hydration = st.session_state.get("cookie_hydration") or {}
+    if hydration.get("found"):
+        st.caption(f"Saved data loaded via {hydration['source']} {hydration['ms']:.0f} ms into the session; first full render after {hydration.get('first_render_ms', 0):.0f} ms.")
 
     # Display / calculation toggles
     st.subheader("Display & Calculations")
     st.checkbox("Use component breakdowns for effective grade calculation", value=st.session_state.get("use_breakdowns", True), key="use_breakdowns")
+    derived = store.derived()
+    lr, tot = derived.last_run, derived.totals
+    st.caption(
+        f"Recompute on this rerun: frame {lr.get('frame')}, {lr.get('courses_recomputed', 0)} course grades recomputed, "
+        f"{lr.get('courses_reused', 0)} reused. Session totals: {tot['skipped_refreshes']}/{tot['refreshes']} reruns skipped all work, "
+        f"{tot['courses_recomputed']} recomputed vs {tot['courses_reused']} reused."
+    )
 
     # Local LLM settings
     st.subheader("Local LLM (optional)")
     st.checkbox("Enable local LLM feedback", value=st.session_state.get("enable_local_llm", False), key="enable_local_llm")
     st.selectbox("Local LLM backend", options=["gpt4all", "llama_cpp"], index=0, key="local_llm_backend")
+    if "downloaded_model_path" in st.session_state:
+        # a finished download sets the path here, before the widget exists in this run
+        st.session_state["local_llm_model_path"] = st.session_state.pop("downloaded_model_path")
     st.text_input("Local LLM model name/path", value=st.session_state.get("local_llm_model_path", ""), key="local_llm_model_path")
     st.number_input("Local LLM max tokens", min_value=16, max_value=2048, step=1, value=st.session_state.get("local_llm_max_tokens", 150), key="local_llm_max_tokens")
+    st.number_input("Batch feedback workers", min_value=1, max_value=16, step=1, value=st.session_state.get("feedback_workers", 4), key="feedback_workers")
+    st.checkbox("Stream LLM feedback as it is generated", value=st.session_state.get("local_llm_stream", True), key="local_llm_stream")
+    # the worker serves every session, so it is configured by the operator (LLM_WORKER* env vars)
+    if worker_client.enabled:
+        worker_stats, _ = worker_client.stats()
+        if worker_stats is None:
+            st.caption("Shared inference worker not running — it starts with the first LLM request." + (f" Last error: {worker_client.last_error}" if worker_client.last_error else ""))
+        else:
+            st.caption(
+                f"Shared inference worker pid {worker_stats['pid']}: {worker_stats['active']} running, {worker_stats['queued']}/{worker_stats['queue_size']} queued, "
+                f"{worker_stats['served']} served, {worker_stats['failed']} failed, {worker_stats['rejected']} rejected (queue full), "
+                f"{worker_stats['timeouts']} timed out, {worker_stats['cancelled']} cancelled — {worker_stats['used_bytes'] / (1024 * 1024):.0f} MB of models loaded"
+            )
+            if worker_stats["models"]:
+                st.table(worker_stats["models"])
+    else:
+        st.caption("Models run in this server process (set LLM_WORKER=1 to share one inference worker between server processes).")
+    # Loaded models are shared by every session of this server process, so the budget is the
+    # operator's (MODEL_CACHE_BUDGET_MB) rather than a per-session setting
+    cache_stats = model_cache.stats()
+    st.caption("Loaded model cache (shared across sessions; budget set with MODEL_CACHE_BUDGET_MB)")
+    mc1, mc2, mc3, mc4 = st.columns(4)
+    mc1.metric("Hits", cache_stats["hits"])
+    mc2.metric("Misses", cache_stats["misses"])
+    mc3.metric("Hit rate", f"{cache_stats['hit_rate'] * 100:.0f}%")
+    mc4.metric("Avg load time", f"{cache_stats['avg_load_seconds']:.1f}s")
+    st.write(f"Cache memory: {cache_stats['used_bytes'] / (1024 * 1024):.0f} MB of {cache_stats['budget_bytes'] / (1024 * 1024):.0f} MB — evictions: {cache_stats['evictions']}")
+    if cache_stats["models"]:
+        st.table(cache_stats["models"])
+    if st.button("Unload cached models"):
+        model_cache.clear()
+        safe_rerun()
+
+    # Prompt -> response cache (persists across restarts)
+    st.caption("Feedback response cache (on disk, shared across sessions; limits set with LLM_CACHE_TTL_DAYS and LLM_CACHE_MAX_MB)")
+    rc_stats = response_cache.stats()
+    st.write(f"{rc_stats['entries']} cached responses ({rc_stats['bytes'] / 1024:.0f} KB of {response_cache.max_bytes / (1024 * 1024):.0f} MB, kept {response_cache.ttl_seconds / 86400:.0f} days) — {rc_stats['hits']} hits / {rc_stats['misses']} misses this server session")
+    if st.button("Clear response cache"):
+        response_cache.clear()
+        safe_rerun()
 
     # If user recently downloaded a model, offer quick-open
     last_dir = st.session_state.get("last_downloaded_dir")
     if last_dir:
         st.info(f"Last downloaded model folder: {last_dir}")
-        if st.button("Open last downloaded folder"):
-            try:
-                import subprocess
-                subprocess.run(["open", last_dir])
-            except Exception as e:
-                st.error(f"Could not open folder: {e}")
+        if st.button("Open downloaded folder"):
+            err = open_folder(last_dir)
+            if err:
+                st.error(f"Could not open folder: {err}")
 
     st.markdown("---")
     st.caption("If you don't have a local model file, select an example source below, then paste a direct file URL or use the Download button.")
@@ -728,97 +1140,138 @@ if page == "Settings":
         safe_rerun()
     # URL input
     st.text_input("Model download URL", value=st.session_state.get("local_llm_download_url", ""), key="local_llm_download_url")
+    dl_sha, dl_conns = st.columns([3, 1])
+    dl_sha.text_input("Expected SHA-256 (optional)", value=st.session_state.get("local_llm_download_sha256", ""), key="local_llm_download_sha256")
+    dl_conns.number_input("Connections", min_value=1, max_value=16, step=1, value=st.session_state.get("local_llm_download_segments", DEFAULT_SEGMENTS), key="local_llm_download_segments")
     if st.button("Download model into app"):
         url = st.session_state.get("local_llm_download_url", "").strip()
         backend = st.session_state.get("local_llm_backend", "gpt4all")
         if not url:
             st.error("Please provide a download URL for the model.")
         else:
-            dest_dir = os.path.join(os.getcwd(), "models", backend)
-            os.makedirs(dest_dir, exist_ok=True)
-            filename = os.path.basename(urllib.parse.urlparse(url).path) or "model.bin"
-            dest = os.path.join(dest_dir, filename)
-            # Try streaming download with requests to show progress, fall back to urllib
-            try:
-                import requests
-                with st.spinner("Downloading model — this may take a while depending on file size and connection..."):
-                    resp = requests.get(url, stream=True, timeout=30)
-                    resp.raise_for_status()
-                    total = int(resp.headers.get("content-length", 0))
-                    chunk_size = 8192
-                    downloaded = 0
-                    prog = st.progress(0)
-                    with open(dest, "wb") as f:
-                        for chunk in resp.iter_content(chunk_size=chunk_size):
-                            if chunk:
-                                f.write(chunk)
-                                downloaded += len(chunk)
-                                if total:
-                                    prog.progress(min(100, int(downloaded * 100 / total)))
-                    st.session_state["local_llm_model_path"] = dest
-                    st.session_state["last_downloaded_dir"] = dest_dir
-                    st.success(f"Model downloaded to {dest}")
-                    st.markdown(f"Downloaded to: {dest}")
-                    if st.button("Open downloaded folder", key=f"open_folder_{filename}"):
-                        try:
-                            import subprocess
-                            subprocess.run(["open", dest_dir])
-                        except Exception as _e:
-                            st.error(f"Could not open folder: {_e}")
-            except Exception as e:
-                # fallback
-                try:
-                    with st.spinner("Downloading model (fallback)..."):
-                        urllib.request.urlretrieve(url, dest)
-                    st.session_state["local_llm_model_path"] = dest
-                    st.session_state["last_downloaded_dir"] = dest_dir
-                    st.success(f"Model downloaded to {dest}")
-                    st.markdown(f"Downloaded to: {dest}")
-                    if st.button("Open downloaded folder", key=f"open_folder_fb_{filename}"):
-                        try:
-                            import subprocess
-                            subprocess.run(["open", dest_dir])
-                        except Exception as _e:
-                            st.error(f"Could not open folder: {_e}")
-                except Exception as e2:
-                    st.error(f"Model download failed: {e2}")
+            # the transfer runs on a worker thread; reruns and navigation only poll it
+            dest = os.path.join(os.getcwd(), "models", backend, filename_from_url(url))
+            job = start_download_job(
+                url,
+                dest,
+                sha256=st.session_state.get("local_llm_download_sha256", "").strip() or None,
+                segments=int(st.session_state.get("local_llm_download_segments", DEFAULT_SEGMENTS)),
+            )
+            st.session_state["download_job_id"] = job.id
+
+    download_job = get_download_job(st.session_state.get("download_job_id", ""))
+    download_polling = bool(download_job and download_job.running)
+
+    @fragment(run_every=1.0 if download_polling else None)
+    def render_download_job():
+        job = get_download_job(st.session_state.get("download_job_id", ""))
+        if job is None:
+            return
+        snap = job.snapshot()
+        if snap["status"] == "finished" and st.session_state.get("download_job_applied") != job.id:
+            st.session_state["download_job_applied"] = job.id
+            st.session_state["downloaded_model_path"] = snap["path"]
+            st.session_state["last_downloaded_dir"] = os.path.dirname(snap["path"])
+            # full rerun so the model path field and the open-folder button pick up the file
+            safe_rerun()
+        if download_polling and not job.running:
+            # stopped on its own: a full rerun turns polling off
+            safe_rerun()
+        st.caption(f"Model download: {os.path.basename(job.dest)}")
+        st.progress(snap["fraction"] or 0.0)
+        size = f"{format_bytes(snap['done_bytes'])} of {format_bytes(snap['total_bytes'])}" if snap["total_bytes"] else format_bytes(snap["done_bytes"])
+        if snap["status"] in ("running", "cancelling"):
+            eta = f", {snap['eta_seconds']:.0f}s left" if snap["eta_seconds"] is not None else ""
+            st.write(f"{size} — {format_bytes(snap['bytes_per_second'])}/s{eta}")
+            if st.button("Cancel download", key=f"cancel_download_{job.id}", disabled=snap["status"] == "cancelling"):
+                job.cancel()
+        elif snap["status"] == "finished":
+            st.success(f"Model downloaded to {snap['path']}")
+        else:
+            if snap["status"] == "cancelled":
+                st.info(f"Download paused at {size}.")
+            else:
+                st.warning(f"Download failed: {snap['error']} ({size} kept for resuming).")
+            if st.button("Resume download", key=f"resume_download_{job.id}"):
+                job.resume()
+                safe_rerun()
+
+    render_download_job()
 
     # Export / Import
     st.subheader("Export / Import")
-    export_json = json.dumps({"courses": course_data}, indent=2)
-    st.download_button("Export courses JSON", export_json, file_name="courses.json", mime="application/json")
+    from exporter import EXPORT_FORMATS, TABLES, export_bytes, export_file_name
+    ec1, ec2 = st.columns(2)
+    export_format = ec1.selectbox("Export format", list(EXPORT_FORMATS), format_func=lambda f: EXPORT_FORMATS[f][0], key="export_format")
+    _, _, export_mime, per_table = EXPORT_FORMATS[export_format]
+    export_table = ec2.selectbox("Table", TABLES, key="export_table", disabled=not per_table)
+    export_name = export_file_name(export_format, export_table)
+    # the payload is only built when the button is clicked
+    lazy_download_button(
+        f"Export {export_name}",
+        lambda: export_bytes(store, export_format, table=export_table),
+        file_name=export_name,
+        mime=export_mime,
+        key=f"export_{export_format}_{export_table}",
+    )
+
+    uploaded = st.file_uploader("Import courses (JSON export, JSON array or NDJSON)", type=["json", "ndjson", "jsonl"])
+    import_source = None
+    if uploaded is not None and st.session_state.get("imported_file_id") != getattr(uploaded, "file_id", uploaded.name):
+        import_source = uploaded
+    if import_source is not None:
+        from course_import import import_courses
+
+        total = getattr(import_source, "size", None)
+        bar = st.progress(0.0, text="Importing courses…")
+
+        def show_import_progress(nbytes, records):
+            bar.progress(min(1.0, nbytes / total) if total else 0.0, text=f"Read {records:,} records ({format_bytes(nbytes)})…")
 
-    uploaded = st.file_uploader("Import courses JSON", type=["json"])
-    if uploaded is not None:
         try:
-            payload = json.load(uploaded)
-            cats = payload.get("courses") if isinstance(payload, dict) and payload.get("courses") is not None else payload
-            if not isinstance(cats, list):
-                st.error("Imported JSON must contain a top-level `courses` list or be a list of courses.")
-            else:
-                # populate session_state with imported data
-                for i, c in enumerate(cats):
-                    st.session_state[f"name_{i}"] = c.get("name", "")
-                    st.session_state[f"credits_{i}"] = int(c.get("credits", 0))
-                    st.session_state[f"grade_{i}"] = float(c.get("grade", 0.0))
-                    # components if present
-                    comps = c.get("components") or parse_breakdown_lines(c.get("breakdown_raw", ""))
-                    st.session_state[f"comp_count_{i}"] = len(comps)
-                    for j, comp in enumerate(comps):
-                        st.session_state[f"comp_name_{i}_{j}"] = comp.get("name", "")
-                        st.session_state[f"comp_weight_{i}_{j}"] = float(comp.get("weight", 0.0))
-                        st.session_state[f"comp_grade_{i}_{j}"] = float(comp.get("grade", 0.0))
-                st.session_state["rows"] = max(len(cats), 1)
-                st.success("Imported courses into session state. Check Edit Courses to review.")
+            # the file is streamed into a new store; the current courses stay until it succeeds
+            imported, report = import_courses(import_source, progress=show_import_progress)
+            st.session_state["imported_file_id"] = getattr(uploaded, "file_id", uploaded.name)
+            if len(imported) or not report["error_count"]:
+                if not len(imported):
+                    imported.replace([{}])
+                # bound widgets re-seed from the store's new generation
+                store.adopt(imported)
+            st.session_state["import_report"] = report
         except Exception as e:
-            st.error(f"Failed to import JSON: {e}")
+            st.session_state.pop("import_report", None)
+            st.error(f"Failed to import: {e}")
+        finally:
+            bar.empty()
+
+    report = st.session_state.get("import_report")
+    if report:
+        if report["imported"] or not report["error_count"]:
+            st.success(f"Imported {report['imported']:,} course(s) from {format_bytes(report['bytes'])} in {report['seconds']:.1f}s. Check Edit Courses to review.")
+        else:
+            st.error("No valid courses found; the current courses were kept.")
+        if report["error_count"]:
+            st.warning(f"{report['error_count']:,} of {report['records']:,} record(s) were skipped.")
+            st.dataframe(report["errors"], hide_index=True)
+            if report["error_count"] > len(report["errors"]):
+                st.caption(f"Showing the first {len(report['errors']):,} errors.")
+        skipped = sum(len(v) for v in store.breakdown_rejects.values())
+        if skipped:
+            st.warning(f"{skipped} breakdown line(s) in {len(store.breakdown_rejects)} course(s) could not be parsed; Edit Courses lists them.")
 
     # Save / Clear cookies
     st.subheader("Persistence Actions")
     if st.button("Save courses to cookies"):
-        payload = {"courses": course_data}
+        payload = {"courses": store.to_records()}
         b64 = encode_data_for_cookie(payload)
-        inject_set_cookie_and_reload(b64)
+        if len(split_cookie_value(b64)) > MAX_COOKIE_CHUNKS:
+            st.error(
+                f"Course data is too large for browser cookies ({len(b64) / 1024:.0f} KB; the limit is about "
+                f"{MAX_COOKIE_CHUNKS * COOKIE_CHUNK_SIZE // 1024} KB). Choose the server (SQLite) store under Persistence backend instead."
+            )
+        else:
+            inject_set_cookie(b64)
+            st.success("Saved courses to cookies.")
 
     if st.button("Clear saved cookie data"):
         inject_clear_cookie_and_reload()
@@ -827,4 +1280,16 @@ if page == "Settings":
     if st.button("Reset all session data"):
         for k in list(st.session_state.keys()):
             del st.session_state[k]
-        safe_rerun()
\ No newline at end of file
+        safe_rerun()
+
+# time-to-first-meaningful-render: the first completed run with saved data in place
+hydration = st.session_state.get("cookie_hydration") or {}
+if hydration.get("source") != "pending" and "first_render_ms" not in hydration:
+    hydration["first_render_ms"] = (time.perf_counter() - session_started) * 1000
+
+# Rerun profiler panel; it is drawn after the run is closed, so it is not part of the timings
+run_profile = finish_run(log=st.session_state.get("debug_profiler_log", False))
+st.sidebar.markdown("---")
+st.sidebar.checkbox("Debug timing panel", value=st.session_state.get("debug_profiler", PROFILE_BY_DEFAULT), key="debug_profiler")
+if run_profile is not None:
+    render_profile_panel(run_profile)
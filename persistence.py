@@ -0,0 +1,356 @@
+"""Persistence helpers: compact cookie encoding and the server-side SQLite store.
+
+Cookie payloads are versioned. The current format (v2) is
+
+    "2.<crc32 hex>.<base64url(zlib(json))>"
+
+where the JSON is a columnar, short-keyed form of the course list. Components
+that can be re-derived from a course's raw breakdown text are not stored
+twice. Tokens larger than one cookie are split into numbered chunk cookies
+announced by a "2m.<count>" manifest in the main cookie. The original
+base64(JSON) format (v1) is still accepted when decoding.
+
+SQLiteCourseStore keeps courses per profile in a WAL-mode database and writes
+only the courses that changed since the last save.
+"""
+import base64
+import json
+import os
+import queue
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from breakdown import components_by_course, parse_breakdowns
+
+COOKIE_NAME = "student_dashboard_data"
+# random per-browser id naming the browser's server profile (not a COOKIE_NAME chunk)
+CLIENT_COOKIE_NAME = "student_dashboard_client"
+_CLIENT_ID = re.compile(r"[A-Za-z0-9_-]{16,64}")
+COOKIE_FORMAT_VERSION = 2
+# stay well under the ~4 KB per-cookie limit once name and attributes are added
+COOKIE_CHUNK_SIZE = 3800
+# every chunk rides along on every request to the app; proxies commonly reject request
+# headers over 8-16 KB (Tornado over 64 KB), which would leave the app unreachable
+MAX_COOKIE_CHUNKS = 4
+DEFAULT_DB_PATH = os.environ.get(
+    "STUDENT_DASHBOARD_DB",
+    os.path.join(os.path.expanduser("~"), ".local", "share", "student_dashboard", "courses.db"),
+)
+
+
+def _same_components(comps, parsed):
+    if len(comps) != len(parsed):
+        return False
+    for a, b in zip(comps, parsed):
+        if a.get("name", "") != b["name"] or float(a.get("weight", 0.0)) != b["weight"] or float(a.get("grade", 0.0)) != b["grade"]:
+            return False
+    return True
+
+
+def pack_courses(courses):
+    """Course records -> compact columnar dict with short keys."""
+    packed = {"n": [], "c": [], "g": [], "r": [], "k": [], "cn": [], "cw": [], "cg": []}
+    parsed, _ = parse_breakdowns([c.get("breakdown_raw", "") or "" for c in courses])
+    parsed = components_by_course(parsed, len(courses))
+    for i, c in enumerate(courses):
+        packed["n"].append(c.get("name", "") or "")
+        packed["c"].append(int(c.get("credits", 0) or 0))
+        packed["g"].append(float(c.get("grade", 0.0) or 0.0))
+        raw = c.get("breakdown_raw", "") or ""
+        comps = c.get("components") or []
+        if raw:
+            packed["r"].append([i, raw])
+        # components equal to the parsed raw text are rebuilt on load instead of stored
+        if comps and not (raw and _same_components(comps, parsed[i])):
+            for comp in comps:
+                packed["k"].append(i)
+                packed["cn"].append(comp.get("name", "") or "")
+                packed["cw"].append(float(comp.get("weight", 0.0) or 0.0))
+                packed["cg"].append(float(comp.get("grade", 0.0) or 0.0))
+    return packed
+
+
+def unpack_courses(packed):
+    """Inverse of pack_courses."""
+    raw = {int(i): r for i, r in packed.get("r", [])}
+    comps = {}
+    for i, name, weight, grade in zip(packed.get("k", []), packed.get("cn", []), packed.get("cw", []), packed.get("cg", [])):
+        comps.setdefault(int(i), []).append({"name": name, "weight": weight, "grade": grade})
+    n = len(packed.get("n", []))
+    parsed, _ = parse_breakdowns([raw.get(i, "") if i not in comps else "" for i in range(n)])
+    parsed = components_by_course(parsed, n)
+    courses = []
+    for i, (name, credits, grade) in enumerate(zip(packed.get("n", []), packed.get("c", []), packed.get("g", []))):
+        r = raw.get(i, "")
+        courses.append({
+            "name": name,
+            "credits": credits,
+            "grade": grade,
+            "components": comps.get(i) or parsed[i],
+            "breakdown_raw": r,
+        })
+    return courses
+
+
+def encode_data_for_cookie(data):
+    """Encode {"courses": [...]} as a v2 cookie token."""
+    packed = dict(pack_courses(data.get("courses") or []), v=COOKIE_FORMAT_VERSION)
+    body = zlib.compress(json.dumps(packed, separators=(",", ":")).encode("utf-8"), 9)
+    b64 = base64.urlsafe_b64encode(body).decode().rstrip("=")
+    return f"{COOKIE_FORMAT_VERSION}.{zlib.crc32(body):08x}.{b64}"
+
+
+def encode_data_for_cookie_v1(data):
+    """The original cookie format, kept for size comparison."""
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def decode_data_from_cookie(b64):
+    """Decode a cookie token (v2 or legacy v1). Returns None if it is corrupt."""
+    try:
+        if b64.startswith(f"{COOKIE_FORMAT_VERSION}."):
+            _, crc, payload = b64.split(".", 2)
+            body = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+            if int(crc, 16) != zlib.crc32(body):
+                return None
+            packed = json.loads(zlib.decompress(body).decode("utf-8"))
+            return {"courses": unpack_courses(packed)}
+        return json.loads(base64.urlsafe_b64decode(b64.encode()).decode())
+    except Exception:
+        return None
+
+
+def split_cookie_value(token, cookie_name=COOKIE_NAME, chunk_size=COOKIE_CHUNK_SIZE):
+    """Split a token into [(cookie_name, value), ...] that each fit in one cookie."""
+    if len(token) <= chunk_size:
+        return [(cookie_name, token)]
+    chunks = [token[i:i + chunk_size] for i in range(0, len(token), chunk_size)]
+    cookies = [(cookie_name, f"{COOKIE_FORMAT_VERSION}m.{len(chunks)}")]
+    cookies += [(f"{cookie_name}_{k}", chunk) for k, chunk in enumerate(chunks, start=1)]
+    return cookies
+
+
+def client_id_from_cookies(cookies):
+    """The browser id from a {name: value} cookie mapping, or None if absent or malformed."""
+    value = (cookies or {}).get(CLIENT_COOKIE_NAME)
+    return value if value and _CLIENT_ID.fullmatch(value) else None
+
+
+def new_client_id():
+    return secrets.token_urlsafe(16)
+
+
+def join_cookie_chunks(cookies, cookie_name=COOKIE_NAME):
+    """Reassemble a token from a {name: value} cookie mapping (inverse of split_cookie_value).
+
+    Returns None if the cookie is absent or a chunk is missing.
+    """
+    head = cookies.get(cookie_name)
+    if not head or not head.startswith(f"{COOKIE_FORMAT_VERSION}m."):
+        return head or None
+    try:
+        n = int(head.split(".")[1])
+    except ValueError:
+        return None
+    parts = [cookies.get(f"{cookie_name}_{k}") for k in range(1, n + 1)]
+    if any(p is None for p in parts):
+        return None
+    return "".join(parts)
+
+
+# save_changes(expected_revision=NO_REVISION_CHECK) writes without a revision check
+NO_REVISION_CHECK = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    profile TEXT PRIMARY KEY,
+    updated REAL NOT NULL,
+    n_courses INTEGER NOT NULL DEFAULT 0,
+    revision INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS courses (
+    profile TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    credits INTEGER NOT NULL,
+    grade REAL NOT NULL,
+    breakdown_raw TEXT NOT NULL,
+    PRIMARY KEY (profile, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS components (
+    profile TEXT NOT NULL,
+    course INTEGER NOT NULL,
+    pos INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    weight REAL NOT NULL,
+    grade REAL NOT NULL,
+    PRIMARY KEY (profile, course, pos)
+) WITHOUT ROWID;
+"""
+
+
+class ProfileConflict(Exception):
+    """The profile was saved by another session since the revision this session last saw."""
+
+    def __init__(self, profile, revision):
+        super().__init__(f"Profile '{profile}' was changed by another session (now at revision {revision}).")
+        self.profile = profile
+        self.revision = revision
+
+
+class SQLiteCourseStore:
+    """Per-profile course persistence in SQLite (WAL mode) with a small connection pool.
+
+    `save_changes` takes a CourseStore plus the per-course version stamps from
+    the previous save and upserts only the courses whose stamps differ, so an
+    autosave after a single edit touches one course row and its components.
+    Every save bumps the profile's revision; a save that names the revision it
+    started from is refused if another session saved in between.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, pool_size=4):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._pool = queue.Queue()
+        for _ in range(max(1, pool_size)):
+            self._pool.put(self._connect())
+        with self.connection() as conn:
+            conn.executescript(_SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(profiles)")]
+            if "revision" not in columns:
+                # databases created before profile revisions
+                conn.execute("ALTER TABLE profiles ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        self.last_save = {}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only fsyncs at checkpoints, which keeps small saves sub-millisecond
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def has_profile(self, profile):
+        with self.connection() as conn:
+            return conn.execute("SELECT 1 FROM profiles WHERE profile = ?", (profile,)).fetchone() is not None
+
+    def load_snapshot(self, profile):
+        """(records, revision) of the profile read in one transaction; (None, None) if it does not exist."""
+        with self.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                row = conn.execute("SELECT n_courses, revision FROM profiles WHERE profile = ?", (profile,)).fetchone()
+                if row is None:
+                    return None, None
+                courses = conn.execute(
+                    "SELECT idx, name, credits, grade, breakdown_raw FROM courses WHERE profile = ? AND idx < ? ORDER BY idx",
+                    (profile, row[0]),
+                ).fetchall()
+                comps = conn.execute(
+                    "SELECT course, name, weight, grade FROM components WHERE profile = ? ORDER BY course, pos",
+                    (profile,),
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+        by_course = {}
+        for course, name, weight, grade in comps:
+            by_course.setdefault(course, []).append({"name": name, "weight": weight, "grade": grade})
+        records = [
+            {"name": name, "credits": credits, "grade": grade, "breakdown_raw": raw, "components": by_course.get(idx, [])}
+            for idx, name, credits, grade, raw in courses
+        ]
+        return records, row[1]
+
+    def save_changes(self, profile, store, saved_stamps=None, expected_revision=NO_REVISION_CHECK):
+        """Upsert courses of `store` whose version stamps differ from `saved_stamps`.
+
+        Pass None to write everything. If `expected_revision` is given (None
+        for a profile that must not exist yet) and the profile is at another
+        revision, nothing is written and ProfileConflict is raised. Returns (stamps, revision) to hand back on
+        the next call; timing and row counts are kept in `last_save`.
+        """
+        start = time.perf_counter()
+        stamps = list(store.course_versions)
+        old = saved_stamps or []
+        dirty = [i for i, s in enumerate(stamps) if saved_stamps is None or i >= len(old) or old[i] != s]
+        n = len(stamps)
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT revision FROM profiles WHERE profile = ?", (profile,)).fetchone()
+                current = row[0] if row else None
+                if expected_revision is not NO_REVISION_CHECK and current != expected_revision:
+                    raise ProfileConflict(profile, current)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO courses (profile, idx, name, credits, grade, breakdown_raw) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (profile, i, store.courses["name"][i], store.courses["credits"][i], store.courses["grade"][i], store.courses["breakdown_raw"][i])
+                        for i in dirty
+                    ],
+                )
+                conn.executemany("DELETE FROM components WHERE profile = ? AND course = ?", [(profile, i) for i in dirty])
+                conn.executemany(
+                    "INSERT INTO components (profile, course, pos, name, weight, grade) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (profile, i, pos, c["name"], c["weight"], c["grade"])
+                        for i in dirty
+                        for pos, c in enumerate(store.get_components(i))
+                    ],
+                )
+                if saved_stamps is None or len(old) > n:
+                    conn.execute("DELETE FROM courses WHERE profile = ? AND idx >= ?", (profile, n))
+                    conn.execute("DELETE FROM components WHERE profile = ? AND course >= ?", (profile, n))
+                revision = (current or 0) + 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO profiles (profile, updated, n_courses, revision) VALUES (?, ?, ?, ?)",
+                    (profile, time.time(), n, revision),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self.last_save = {"courses_written": len(dirty), "seconds": time.perf_counter() - start}
+        return stamps, revision
+
+
+_sqlite_stores = {}
+_sqlite_stores_lock = threading.Lock()
+
+
+def get_sqlite_store(path=DEFAULT_DB_PATH):
+    """Process-wide SQLiteCourseStore per database path (pools survive reruns)."""
+    with _sqlite_stores_lock:
+        if path not in _sqlite_stores:
+            _sqlite_stores[path] = SQLiteCourseStore(path)
+        return _sqlite_stores[path]
+
+
+def migrate_cookie_payload(token, sqlite_store, profile):
+    """Copy a cookie payload (any supported format) into `profile` if it is empty.
+
+    Returns True when data was migrated.
+    """
+    parsed = decode_data_from_cookie(token) if token else None
+    if not parsed or not isinstance(parsed, dict) or not parsed.get("courses"):
+        return False
+    if sqlite_store.has_profile(profile):
+        return False
+    from course_store import CourseStore
+    try:
+        # None: only while the profile still does not exist
+        sqlite_store.save_changes(profile, CourseStore.from_dict(parsed["courses"]), expected_revision=None)
+    except ProfileConflict:
+        return False
+    return True
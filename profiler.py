@@ -0,0 +1,197 @@
+"""Per-rerun phase timings for the app script.
+
+main.py opens each full run with `start_run(enabled)`, marks its top-level
+sections (header, hydration, navigation, the page) with `section(name)`, wraps
+nested blocks such as fragments and LLM calls in `with phase(name):` and
+closes the run with `finish_run()`. A finished run records the total and
+per-phase milliseconds, the widgets registered during the run and the
+st.session_state reads made while it ran.
+
+When profiling is off, `section()` returns at once and `phase()` returns one
+shared no-op context manager, so each marker costs a thread-local lookup.
+Session-state reads are only counted once profiling was first enabled in the
+process.
+
+Runs can be appended to a rotating JSON-lines log (one object per run):
+
+    STUDENT_DASHBOARD_PROFILE=1          profile every session by default
+    STUDENT_DASHBOARD_PROFILE_LOG=path   log file (default ~/.cache/student_dashboard/rerun_profile.jsonl)
+"""
+import contextlib
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+
+LOG_PATH = os.environ.get(
+    "STUDENT_DASHBOARD_PROFILE_LOG",
+    os.path.join(os.path.expanduser("~"), ".cache", "student_dashboard", "rerun_profile.jsonl"),
+)
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+ENABLED_BY_DEFAULT = os.environ.get("STUDENT_DASHBOARD_PROFILE") == "1"
+
+_NOOP = contextlib.nullcontext()
+# the run being profiled on this script thread (each session's script runs on its own thread)
+_local = threading.local()
+_install_lock = threading.Lock()
+_counting_reads = False
+_log_lock = threading.Lock()
+_log_handler = None
+
+
+class RerunProfile:
+    """Timings of one script run.
+
+    The script is split into consecutive top-level sections (each `section()`
+    call ends the previous one); `phase()` times a nested block, recorded as
+    "section/phase" (or "section/outer/inner").
+    """
+
+    def __init__(self, page=None):
+        self.page = page
+        self.started = time.perf_counter()
+        self.timings = []
+        self.state_reads = 0
+        self._section = None
+        self._section_started = None
+        self._stack = []
+
+    def _close_section(self, now):
+        if self._section is not None:
+            self.timings.append((self._section, now - self._section_started))
+        self._section = None
+
+    def section(self, name):
+        now = time.perf_counter()
+        self._close_section(now)
+        self._section, self._section_started = name, now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self._stack.append(name)
+        path = "/".join(([self._section] if self._section else []) + self._stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((path, time.perf_counter() - start))
+            self._stack.pop()
+
+    def record(self):
+        now = time.perf_counter()
+        self._close_section(now)
+        total = now - self.started
+        phases = {}
+        for name, seconds in self.timings:
+            # a phase entered more than once (e.g. per course) is summed
+            phases[name] = phases.get(name, 0.0) + seconds * 1000
+        top = sum(ms for name, ms in phases.items() if "/" not in name)
+        phases["(unlabelled)"] = max(0.0, total * 1000 - top)
+        return {
+            "ts": time.time(),
+            "page": self.page,
+            "total_ms": total * 1000,
+            "phases_ms": phases,
+            "widgets": _widget_count(),
+            "state_reads": self.state_reads,
+        }
+
+
+def _widget_count():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        shared = getattr(ctx, "shared", ctx)
+        return len(shared.widget_ids_this_run.snapshot())
+    except Exception:
+        return None
+
+
+def _count_state_reads():
+    """Wrap SessionStateProxy reads once per process so profiled runs can count them."""
+    global _counting_reads
+    with _install_lock:
+        if _counting_reads:
+            return
+        try:
+            from streamlit.runtime.state.session_state_proxy import SessionStateProxy
+        except Exception:
+            return
+
+        def counted(method):
+            def wrapper(self, *args, **kwargs):
+                run = getattr(_local, "run", None)
+                if run is not None:
+                    run.state_reads += 1
+                return method(self, *args, **kwargs)
+            return wrapper
+
+        # .get() and `in` go through __getitem__ / __contains__ of the mapping
+        for name in ("__getitem__", "__getattr__", "__contains__"):
+            if name in SessionStateProxy.__dict__:
+                setattr(SessionStateProxy, name, counted(SessionStateProxy.__dict__[name]))
+        _counting_reads = True
+
+
+def start_run(enabled, page=None):
+    """Begin profiling this script run if `enabled`. Returns the RerunProfile or None."""
+    if not enabled:
+        _local.run = None
+        return None
+    _count_state_reads()
+    _local.run = RerunProfile(page)
+    return _local.run
+
+
+def section(name):
+    """Start the top-level section `name` of the current run, ending the previous one."""
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.section(name)
+
+
+def phase(name):
+    """Context manager timing `name` in the current run (a no-op when not profiling)."""
+    run = getattr(_local, "run", None)
+    return _NOOP if run is None else run.phase(name)
+
+
+def set_page(page):
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.page = page
+
+
+def finish_run(log=False):
+    """End the current run. Returns its record (see RerunProfile.record) or None when not profiling."""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return None
+    _local.run = None
+    record = run.record()
+    if log:
+        write_log(record)
+    return record
+
+
+def _get_log_handler():
+    global _log_handler
+    with _log_lock:
+        if _log_handler is None:
+            os.makedirs(os.path.dirname(LOG_PATH) or ".", exist_ok=True)
+            _log_handler = logging.handlers.RotatingFileHandler(LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+            _log_handler.setFormatter(logging.Formatter("%(message)s"))
+        return _log_handler
+
+
+def write_log(record):
+    """Append `record` as one JSON line to the rotating profile log. Returns an error message or None."""
+    try:
+        # straight to the handler: the app's logging configuration does not apply to this file
+        _get_log_handler().handle(logging.makeLogRecord({"msg": json.dumps(record, separators=(",", ":"))}))
+        return None
+    except Exception as e:
+        return str(e)
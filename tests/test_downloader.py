@@ -0,0 +1,145 @@
+"""downloader.download_file against a local HTTP server (with and without Range support)."""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import downloader
+
+PAYLOAD = os.urandom(1024 * 1024 + 123)
+PAYLOAD_SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        header = self.headers.get("Range")
+        with server.lock:
+            server.ranges.append(header)
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", header or "")
+        if server.supports_ranges and m:
+            start = int(m.group(1))
+            end = int(m.group(2)) if m.group(2) else len(PAYLOAD) - 1
+            body = PAYLOAD[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+            self.send_header("Accept-Ranges", "bytes")
+        else:
+            body = PAYLOAD
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloadFileTest(unittest.TestCase):
+    supports_ranges = True
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.supports_ranges = self.supports_ranges
+        self.server.ranges = []
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/model.bin"
+        self.dir = tempfile.mkdtemp()
+        self.dest = os.path.join(self.dir, "model.bin")
+        # small reads and segments so a 1 MB file exercises every path
+        for name, value in (("READ_BYTES", 16 * 1024), ("MIN_SEGMENT_BYTES", 128 * 1024)):
+            patcher = mock.patch.object(downloader, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def body_requests(self):
+        """Range headers of the requests after the probe."""
+        return self.server.ranges[1:]
+
+    def read_dest(self):
+        with open(self.dest, "rb") as f:
+            return f.read()
+
+    def test_multi_segment(self):
+        path, err = downloader.download_file(self.url, self.dest, sha256=PAYLOAD_SHA256, segments=4, buffer_bytes=64 * 1024)
+        self.assertIsNone(err)
+        self.assertEqual(path, self.dest)
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertEqual(len(self.body_requests()), 4)
+        self.assertTrue(all(r and r.startswith("bytes=") for r in self.body_requests()))
+        self.assertFalse(os.path.exists(f"{self.dest}.part"))
+        self.assertFalse(os.path.exists(f"{self.dest}.part.json"))
+
+    def test_resume_from_part_file(self):
+        cancel = threading.Event()
+
+        def stop_midway(done, total):
+            if done >= len(PAYLOAD) // 3:
+                cancel.set()
+
+        path, err = downloader.download_file(self.url, self.dest, segments=1, buffer_bytes=32 * 1024, progress=stop_midway, cancel=cancel)
+        self.assertIsNone(path)
+        self.assertIn("cancelled", err)
+        with open(f"{self.dest}.part.json", encoding="utf-8") as f:
+            written = json.load(f)["segments"][0][2]
+        self.assertGreater(written, 0)
+        self.assertLess(written, len(PAYLOAD))
+
+        self.server.ranges.clear()
+        path, err = downloader.download_file(self.url, self.dest, sha256=PAYLOAD_SHA256, segments=1, buffer_bytes=32 * 1024)
+        self.assertIsNone(err)
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        # the second run asked only for the bytes after the saved offset
+        self.assertEqual(self.body_requests(), [f"bytes={written}-{len(PAYLOAD) - 1}"])
+
+    def test_sha256_mismatch_deletes_part(self):
+        path, err = downloader.download_file(self.url, self.dest, sha256="0" * 64, segments=4, buffer_bytes=64 * 1024)
+        self.assertIsNone(path)
+        self.assertIn("SHA-256 mismatch", err)
+        for leftover in (self.dest, f"{self.dest}.part", f"{self.dest}.part.json"):
+            self.assertFalse(os.path.exists(leftover), leftover)
+
+
+class NoRangeServerTest(DownloadFileTest):
+    supports_ranges = False
+
+    def test_multi_segment(self):
+        # the probe gets a 200 instead of a 206, so the file comes over one plain request
+        path, err = downloader.download_file(self.url, self.dest, sha256=PAYLOAD_SHA256, segments=4, buffer_bytes=64 * 1024)
+        self.assertIsNone(err)
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertEqual(self.body_requests(), [None])
+
+    def test_resume_from_part_file(self):
+        # without ranges a partial file cannot be continued: the retry starts over
+        cancel = threading.Event()
+        downloader.download_file(self.url, self.dest, segments=1, buffer_bytes=32 * 1024,
+                                 progress=lambda done, total: done >= len(PAYLOAD) // 3 and cancel.set(), cancel=cancel)
+        self.server.ranges.clear()
+        path, err = downloader.download_file(self.url, self.dest, sha256=PAYLOAD_SHA256, segments=1, buffer_bytes=32 * 1024)
+        self.assertIsNone(err)
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertEqual(self.body_requests(), [None])
+
+
+if __name__ == "__main__":
+    unittest.main()
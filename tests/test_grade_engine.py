@@ -0,0 +1,63 @@
+"""grade_engine's vectorized effective grades against the per-course rules they replaced."""
+import unittest
+
+import numpy as np
+
+from grade_engine import effective_grades, grade_summary
+
+# (course grade, credits, [(weight, grade), ...])
+COURSES = [
+    (3.0, 4, [(60.0, 2.0), (40.0, 3.5)]),
+    (3.7, 3, []),                           # no components: course grade
+    (2.3, 2, [(0.0, 4.0), (0.0, 1.0)]),     # weights sum to zero: course grade
+    (3.3, 3, [(50.0, 4.0), (-20.0, 1.0)]),  # negative weight, normalised by |weight|
+    (1.0, 1, [(-10.0, 2.0)]),
+    (4.0, 0, [(1.0, 3.0)]),                 # no credits: counts for the grade, not the GPA
+]
+
+
+def reference_effective(course_grade, comps):
+    """The Dashboard's per-course loop before the engine."""
+    if comps:
+        total_w = sum(abs(w) for w, _ in comps)
+        if total_w > 0:
+            return sum(w * g for w, g in comps) / total_w
+    return course_grade
+
+
+def columns(courses):
+    comp_course = [i for i, (_, _, comps) in enumerate(courses) for _ in comps]
+    comp_weight = [w for _, _, comps in courses for w, _ in comps]
+    comp_grade = [g for _, _, comps in courses for _, g in comps]
+    return comp_course, comp_weight, comp_grade
+
+
+class GradeEngineTest(unittest.TestCase):
+    def test_effective_grades_match_per_course_rules(self):
+        expected = [reference_effective(grade, comps) for grade, _, comps in COURSES]
+        got = effective_grades([c[0] for c in COURSES], *columns(COURSES))
+        np.testing.assert_allclose(got, expected)
+
+    def test_summary_matches_per_course_gpa(self):
+        effective = [reference_effective(grade, comps) for grade, _, comps in COURSES]
+        credits = [c[1] for c in COURSES]
+        qp = sum(c * e for c, e in zip(credits, effective))
+        summary = grade_summary([c[0] for c in COURSES], credits, *columns(COURSES))
+        self.assertEqual(summary["total_credits"], sum(credits))
+        self.assertAlmostEqual(summary["total_quality_points"], qp)
+        self.assertAlmostEqual(summary["gpa"], qp / sum(credits))
+        np.testing.assert_allclose(summary["quality_points"], [c * e for c, e in zip(credits, effective)])
+
+    def test_no_credits_has_no_gpa(self):
+        summary = grade_summary([3.0, 2.0], [0, 0], [0], [1.0], [4.0])
+        self.assertIsNone(summary["gpa"])
+        np.testing.assert_allclose(summary["effective_grade"], [4.0, 2.0])
+
+    def test_no_courses(self):
+        summary = grade_summary([], [], [], [], [])
+        self.assertEqual(len(summary["effective_grade"]), 0)
+        self.assertIsNone(summary["gpa"])
+
+
+if __name__ == "__main__":
+    unittest.main()
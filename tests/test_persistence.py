@@ -0,0 +1,74 @@
+"""SQLiteCourseStore saves: incremental writes and the profile revision check."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from course_store import CourseStore
+from persistence import NO_REVISION_CHECK, ProfileConflict, SQLiteCourseStore, encode_data_for_cookie, migrate_cookie_payload
+
+COURSES = [
+    {"name": "Math", "credits": 4, "grade": 2.5, "components": [{"name": "Exam", "weight": 60.0, "grade": 2.0}, {"name": "HW", "weight": 40.0, "grade": 3.5}]},
+    {"name": "Art", "credits": 2, "grade": 3.9},
+]
+
+
+class SQLiteCourseStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = SQLiteCourseStore(os.path.join(self.dir, "courses.sqlite3"), pool_size=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_round_trip_and_incremental_save(self):
+        store = CourseStore.from_dict(COURSES)
+        stamps, revision = self.db.save_changes("p", store, expected_revision=None)
+        self.assertEqual(revision, 1)
+        store.set_field(1, "grade", 3.0)
+        stamps, revision = self.db.save_changes("p", store, stamps, expected_revision=revision)
+        self.assertEqual(revision, 2)
+        self.assertEqual(self.db.last_save["courses_written"], 1)
+        records, loaded_revision = self.db.load_snapshot("p")
+        self.assertEqual(loaded_revision, 2)
+        self.assertEqual([r["grade"] for r in records], [2.5, 3.0])
+        self.assertEqual([c["name"] for c in records[0]["components"]], ["Exam", "HW"])
+
+    def test_stale_save_is_refused(self):
+        # two sessions start from the same revision
+        first = CourseStore.from_dict(COURSES)
+        first_stamps, start = self.db.save_changes("p", first, expected_revision=None)
+        _, second_revision = self.db.load_snapshot("p")
+        second = CourseStore.from_dict(COURSES)
+        second_stamps = list(second.course_versions)
+
+        first.set_field(0, "grade", 4.0)
+        _, saved = self.db.save_changes("p", first, first_stamps, expected_revision=start)
+        second.set_field(0, "grade", 1.0)
+        with self.assertRaises(ProfileConflict) as caught:
+            self.db.save_changes("p", second, second_stamps, expected_revision=second_revision)
+        self.assertEqual(caught.exception.revision, saved)
+        records, revision = self.db.load_snapshot("p")
+        self.assertEqual(revision, saved)
+        self.assertEqual(records[0]["grade"], 4.0)
+
+        # an explicit overwrite skips the check and bumps the revision
+        _, revision = self.db.save_changes("p", second, expected_revision=NO_REVISION_CHECK)
+        self.assertEqual(revision, saved + 1)
+        self.assertEqual(self.db.load_snapshot("p")[0][0]["grade"], 1.0)
+
+    def test_new_profile_save_refused_once_it_exists(self):
+        self.db.save_changes("p", CourseStore.from_dict(COURSES), expected_revision=None)
+        with self.assertRaises(ProfileConflict):
+            self.db.save_changes("p", CourseStore.from_dict(COURSES[:1]), expected_revision=None)
+        self.assertEqual(len(self.db.load_snapshot("p")[0]), 2)
+
+    def test_cookie_migration_only_fills_missing_profiles(self):
+        token = encode_data_for_cookie({"courses": COURSES})
+        self.assertTrue(migrate_cookie_payload(token, self.db, "p"))
+        self.assertFalse(migrate_cookie_payload(token, self.db, "p"))
+        self.assertEqual(self.db.load_snapshot("p")[1], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()